@@ -1,40 +1,70 @@
+import os
+import threading
 import psycopg2
-from psycopg2.pool import SimpleConnectionPool
-from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from app.core.config import DB_CONFIG
+from app.core.monitoring import MonitoredCursor
+
+# 요청 스레드풀(run_in_threadpool / sync 라우트)과 백그라운드 스레드가 함께 쓰는 풀.
+# 기본 24 = 요청 스레드 동시 DB 사용 ~16 + 백그라운드 ~8
+#   (embedding cache writer 1, embedding worker 1 + EMBED_WORKER_CONCURRENCY 2, route embedder 1,
+#    waypoint index 1, auto_tag_cache 기록 등 여유 2)
+# 모두 사용 중이면 "pool exhausted" 대신 DB_POOL_TIMEOUT초까지 반납을 기다림
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 24))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # 초
 
 _pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(DB_POOL_MAX)
 
 class PooledConnection:
     def __init__(self, pool, conn):
         self._pool = pool
         self._conn = conn
+        self._closed = False
 
     def __getattr__(self, name):
         return getattr(self._conn, name)
 
     def cursor(self, *args, **kwargs):
-        kwargs['cursor_factory'] = RealDictCursor
+        kwargs['cursor_factory'] = MonitoredCursor  # RealDictCursor + 쿼리 시간 측정
         return self._conn.cursor(*args, **kwargs)
 
     def close(self):
+        if self._closed: return  # 두 번 닫아도 슬롯은 한 번만 반납
+        self._closed = True
         try:
             self._conn.rollback()
         except Exception:
             pass
-        self._pool.putconn(self._conn)
-        
+        try:
+            self._pool.putconn(self._conn)
+        finally:
+            _slots.release()
+
     def __enter__(self):
         return self
-        
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
-def get_db_conn():
+def _get_pool():
     global _pool
     if _pool is None:
-        _pool = SimpleConnectionPool(1, 10, **DB_CONFIG)
-    
-    conn = _pool.getconn()
-    
-    return PooledConnection(_pool, conn)
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **DB_CONFIG)
+    return _pool
+
+def get_db_conn():
+    pool = _get_pool()
+    if not _slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise PoolError(f"connection pool exhausted (waited {DB_POOL_TIMEOUT}s for one of {DB_POOL_MAX})")
+    try:
+        conn = pool.getconn()
+    except Exception:
+        _slots.release()
+        raise
+
+    return PooledConnection(pool, conn)
@@ -0,0 +1,240 @@
+"""
+요청/DB 관측성 (always-on, 로컬 집계)
+
+- RequestMetricsMiddleware: route 템플릿별 응답 시간 히스토그램, 요청당 DB 시간/쿼리 수
+- MonitoredCursor: get_db_conn() 커서의 execute 시간 측정. 임계값을 넘는 쿼리는
+  정규화 SQL의 query_id + 실행 계획 해시(plan_hash)로 집계하고 로그로 남김
+- 메트릭은 GET /metrics (metrics.registry), 요청 로그는 샘플링 (느린 요청은 항상)
+Sentry 트레이싱은 샘플링으로 낮추고, 전체 요청에 대한 분포는 여기서 봄.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from psycopg2 import sql as pgsql
+from psycopg2.extensions import TRANSACTION_STATUS_INTRANS
+from psycopg2.extras import RealDictCursor
+
+from metrics import registry
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 2000))
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", 0.01))
+SLOW_QUERY_LOG_INTERVAL = float(os.getenv("DB_SLOW_QUERY_LOG_INTERVAL", 60))  # query_id별 로그 최소 간격(초)
+PLAN_HASH_TTL = float(os.getenv("DB_PLAN_HASH_TTL", 600))  # query_id별 EXPLAIN 재실행 간격(초)
+EXPLAIN_COMMANDS = {"SELECT", "WITH", "UPDATE", "DELETE", "INSERT"}
+MAX_EXPLAIN_SQL_LENGTH = 20000  # execute_values 등 거대한 VALUES는 계획 확인 생략
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+REQUEST_DB_SECONDS = registry.histogram(
+    "http_request_db_seconds", "DB time spent per HTTP request", ("method", "route"),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+REQUEST_DB_QUERIES = registry.histogram(
+    "http_request_db_queries", "DB queries per HTTP request", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "DB statement latency by command", ("command",))
+SLOW_QUERIES = registry.counter(
+    "db_slow_queries_total", "Statements slower than DB_SLOW_QUERY_MS", ("query_id", "plan_hash"))
+
+
+class RequestStats:
+    __slots__ = ("db_seconds", "db_queries")
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_queries = 0
+
+
+# run_in_threadpool은 context를 복사하므로 동기 엔드포인트의 쿼리도 같은 RequestStats에 누적됨
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_path: ContextVar[str] = ContextVar("request_path", default="-")
+
+
+# --- SQL 정규화 / 계획 해시 ---
+_RE_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_RE_STRING = re.compile(r"(?:E|e)?'(?:[^']|'')*'")
+_RE_PARAM = re.compile(r"%\(\w+\)s|%s")
+_RE_NUMBER = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_RE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_VALUES = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.I)
+_RE_ARRAY = re.compile(r"ARRAY\[[^\]]*\]", re.I)
+_RE_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(query: str) -> str:
+    """리터럴/파라미터를 ?로, IN/VALUES 목록을 (...)로 접어 같은 모양의 쿼리를 하나로 묶음"""
+    q = _RE_COMMENT.sub(" ", query)
+    q = _RE_STRING.sub("?", q)
+    q = _RE_PARAM.sub("?", q)
+    q = _RE_NUMBER.sub("?", q)
+    q = _RE_ARRAY.sub("ARRAY[...]", q)
+    q = _RE_LIST.sub("(...)", q)
+    q = _RE_VALUES.sub(r"\1", q)
+    return _RE_SPACE.sub(" ", q).strip()
+
+
+def query_id(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def plan_hash(plan: Dict[str, Any]) -> str:
+    """EXPLAIN (FORMAT JSON)에서 비용/행 수를 빼고 노드 구조(스캔 방식, 테이블, 인덱스, 조인)만 해시"""
+    def shape(node):
+        own = (node.get("Node Type"), node.get("Relation Name"), node.get("Index Name"), node.get("Join Type"))
+        return (own, tuple(shape(child) for child in node.get("Plans", ())))
+    return hashlib.sha1(repr(shape(plan)).encode("utf-8")).hexdigest()[:12]
+
+
+class _SlowQueryLog:
+    """query_id별 계획 해시 캐시 + 로그 rate limit"""
+    def __init__(self):
+        self._plans: Dict[str, tuple] = {}   # query_id -> (plan_hash, checked_at)
+        self._logged: Dict[str, float] = {}  # query_id -> 마지막 로그 시각
+        self._lock = threading.Lock()
+
+    def cached_plan(self, qid: str) -> Optional[str]:
+        with self._lock:
+            entry = self._plans.get(qid)
+        if entry is None or time.monotonic() - entry[1] > PLAN_HASH_TTL: return None
+        return entry[0]
+
+    def store_plan(self, qid: str, value: str) -> None:
+        with self._lock:
+            self._plans[qid] = (value, time.monotonic())
+
+    def should_log(self, qid: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._logged.get(qid, 0.0) < SLOW_QUERY_LOG_INTERVAL: return False
+            self._logged[qid] = now
+            return True
+
+
+slow_query_log = _SlowQueryLog()
+
+
+class MonitoredCursor(RealDictCursor):
+    """RealDictCursor + 실행 시간 측정 (get_db_conn() 커서 기본값)"""
+
+    def execute(self, query, vars=None):
+        started, ok = time.perf_counter(), False
+        try:
+            result = super().execute(query, vars)
+            ok = True
+            return result
+        finally:
+            # 실패한 쿼리는 트랜잭션이 abort 상태이므로 EXPLAIN 생략
+            self._record(query, vars, time.perf_counter() - started, explain=ok)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, None, time.perf_counter() - started, explain=False)
+
+    def _record(self, query, vars, elapsed: float, explain: bool = True) -> None:
+        text = self._query_text(query)
+        command = text.lstrip().split(None, 1)[0].upper() if text.strip() else "-"
+        QUERY_SECONDS.observe(elapsed, command=command)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_seconds += elapsed
+            stats.db_queries += 1
+        if elapsed * 1000 < SLOW_QUERY_MS: return
+        normalized = normalize_sql(text)
+        qid = query_id(normalized)
+        plan = slow_query_log.cached_plan(qid)
+        if plan is None and explain and command in EXPLAIN_COMMANDS:
+            plan = self._explain(text, vars)
+            if plan is not None: slow_query_log.store_plan(qid, plan)
+        SLOW_QUERIES.inc(query_id=qid, plan_hash=plan or "-")
+        if slow_query_log.should_log(qid):
+            print("[SlowQuery] " + json.dumps({
+                "query_id": qid, "plan_hash": plan, "ms": round(elapsed * 1000, 1),
+                "path": _path.get(), "sql": normalized[:2000],
+            }, ensure_ascii=False))
+
+    def _query_text(self, query) -> str:
+        if isinstance(query, pgsql.Composable): return query.as_string(self.connection)
+        if isinstance(query, bytes): return query.decode("utf-8", "replace")
+        return str(query)
+
+    def _explain(self, text: str, vars) -> Optional[str]:
+        """EXPLAIN(실행 없음)으로 계획 해시 계산. 트랜잭션 중이면 savepoint로 감싸 실패해도 원래 트랜잭션 유지"""
+        if len(text) > MAX_EXPLAIN_SQL_LENGTH or self.connection.closed: return None
+        conn = self.connection
+        in_tx = conn.get_transaction_status() == TRANSACTION_STATUS_INTRANS
+        cur = conn.cursor(cursor_factory=RealDictCursor)  # 측정 대상에서 제외
+        try:
+            if in_tx: cur.execute("SAVEPOINT _monitor_explain")
+            try:
+                cur.execute("EXPLAIN (FORMAT JSON) " + text, vars)
+                row = cur.fetchone()
+                plan = plan_hash(row["QUERY PLAN"][0]["Plan"])
+            except Exception as e:
+                if in_tx: cur.execute("ROLLBACK TO SAVEPOINT _monitor_explain")
+                print(f"[SlowQuery] EXPLAIN failed: {e}")
+                return None
+            if in_tx: cur.execute("RELEASE SAVEPOINT _monitor_explain")
+            return plan
+        except Exception as e:
+            print(f"[SlowQuery] EXPLAIN skipped: {e}")
+            return None
+        finally:
+            cur.close()
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """순수 ASGI 미들웨어 (BaseHTTPMiddleware보다 오버헤드가 적고 스트리밍 응답을 감싸지 않음)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        stats_token = _request_stats.set(stats)
+        path_token = _path.set(scope.get("path", "-"))
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start": status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(stats_token)
+            _path.reset(path_token)
+            self._record(scope, status["code"], elapsed, stats)
+
+    def _record(self, scope, status: int, elapsed: float, stats: RequestStats) -> None:
+        method, route = scope.get("method", "-"), _route_template(scope)
+        if route == "/metrics": return
+        REQUEST_SECONDS.observe(elapsed, method=method, route=route, status=str(status))
+        REQUEST_DB_SECONDS.observe(stats.db_seconds, method=method, route=route)
+        REQUEST_DB_QUERIES.observe(stats.db_queries, method=method, route=route)
+        if elapsed * 1000 >= SLOW_REQUEST_MS or random.random() < REQUEST_LOG_SAMPLE_RATE:
+            print("[Request] " + json.dumps({
+                "method": method, "route": route, "status": status, "ms": round(elapsed * 1000, 1),
+                "db_ms": round(stats.db_seconds * 1000, 1), "db_queries": stats.db_queries,
+            }))
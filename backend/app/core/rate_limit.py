@@ -0,0 +1,48 @@
+"""
+외부 API 호출 속도 제한 (자동 태그 배치, 임베딩 워커 공용)
+
+- TokenBucket: 분당 호출 수 상한 (여러 스레드가 하나의 버킷 공유)
+- call_with_backoff: 시도마다 토큰을 받고, 실패하면 지수 백오프(+jitter) 후 재시도
+"""
+
+import random
+import threading
+import time
+from typing import Callable
+
+MAX_RETRIES = 4              # 호출 1건당 재시도 (백오프 2, 4, 8, 16초 × jitter)
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+
+class TokenBucket:
+    """초당 rate개씩 차고 최대 burst개까지 쌓이는 토큰. acquire()는 토큰이 생길 때까지 대기 (스레드 안전)"""
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+def call_with_backoff(fn: Callable, bucket: TokenBucket, retries: int = MAX_RETRIES):
+    """시도마다 토큰을 받아 fn() 호출. 실패하면 지수 백오프 후 재시도, 마지막 실패는 그대로 raise"""
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries: raise
+            time.sleep(min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0))
@@ -24,6 +24,8 @@ def save_to_storage(content: bytes, folder: str, filename: str):
             content_type = "application/octet-stream"
             if filename.endswith(".png"):
                 content_type = "image/png"
+            elif filename.endswith(".webp"):
+                content_type = "image/webp"
             elif filename.endswith(".json"):
                 content_type = "application/json"
             
@@ -38,3 +40,40 @@ def save_to_storage(content: bytes, folder: str, filename: str):
             raise e
     
     return None
+
+
+def delete_from_storage(folder: str, filename: str):
+    """save_to_storage로 저장한 파일 삭제. 없으면 무시"""
+    if STORAGE_TYPE == "GCS":
+        client = storage.Client()
+        bucket = client.bucket(GCS_BUCKET_NAME)
+        blob = bucket.blob(f"{folder}/{filename}")
+        if blob.exists():
+            blob.delete()
+        return
+
+    file_path = os.path.join(STORAGE_BASE_DIR, folder, filename)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def load_from_storage(rel_path: str):
+    """
+    save_to_storage의 반대. DB에 저장된 상대 경로(data_file_path 등)로 파일 내용을 읽음.
+    Returns bytes, or None if the file does not exist.
+    """
+    if STORAGE_TYPE == "GCS":
+        client = storage.Client()
+        bucket = client.bucket(GCS_BUCKET_NAME)
+        blob = bucket.blob(rel_path.lstrip("/"))
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+
+    file_path = os.path.join(STORAGE_BASE_DIR, rel_path)
+    if not os.path.exists(file_path):
+        if not os.path.exists(rel_path):
+            return None
+        file_path = rel_path
+    with open(file_path, "rb") as f:
+        return f.read()
@@ -6,16 +6,21 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import sentry_sdk
 
+# 트레이싱은 샘플링만 (전체 요청의 latency 분포는 /metrics 로 always-on 집계)
 sentry_sdk.init(
     dsn="https://93e723471fc93415696de14850f21982@o4511017491169280.ingest.us.sentry.io/4511017595961344",
-    traces_sample_rate=1.0,
+    traces_sample_rate=float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", 0.1)),
     send_default_pii=True,
 )
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.routers import auth, routes, thumbnails, export, plan, waypoints
+from app.core.monitoring import RequestMetricsMiddleware
+from valhalla_scheduler import ValhallaOverloaded
+import metrics
 
 app = FastAPI(title="Bike Course Generator API")
 
@@ -45,6 +50,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# route별 latency / 요청당 DB 시간 (가장 바깥에서 측정)
+app.add_middleware(RequestMetricsMiddleware)
+
+# Valhalla 과부하 시 load shedding: 503 + Retry-After
+@app.exception_handler(ValhallaOverloaded)
+async def valhalla_overloaded_handler(request: Request, exc: ValhallaOverloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
 # Include Routers
 app.include_router(auth.router)
 app.include_router(routes.router)
@@ -57,6 +70,11 @@ app.include_router(waypoints.router)
 async def root():
     return {"message": "Bike Course Generator API is running"}
 
+# Prometheus 스타일 메트릭 (route latency, DB 시간, 느린 쿼리, Valhalla 단계별 시간 등). 워커 프로세스별 값
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
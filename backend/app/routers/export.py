@@ -1,38 +1,51 @@
+from itertools import chain
 from urllib.parse import quote
 
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from app.models.route import GpxExportRequest
-from gpx_export import GpxExporter, TcxExporter
+from gpx_export import GpxExporter, TcxExporter, gzip_chunks
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
 @router.post("/gpx")
-async def export_gpx(request: GpxExportRequest):
+async def export_gpx(request: GpxExportRequest, accept_encoding: str = Header(None)):
     try:
         data = request.dict()
         export_format = request.format.lower() if request.format else "gpx"
-        
+
         if export_format == "tcx":
             exporter = TcxExporter(data)
-            xml_content = exporter.to_xml_string()
             media_type = "application/vnd.garmin.tcx+xml"
             ext = "tcx"
         else:
             exporter = GpxExporter(data)
-            xml_content = exporter.to_xml_string()
             media_type = "application/gpx+xml"
             ext = "gpx"
-        
+
         # Sanitize filename
         safe_title = "".join([c for c in request.title if c.isalnum() or c in (' ', '-', '_')]).strip()
         if not safe_title: safe_title = "route"
         filename = f"{safe_title.replace(' ', '_')}.{ext}"
-        
-        return Response(
-            content=xml_content, 
-            media_type=media_type,
-            headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
-        )
+        headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+
+        # Validate and render the first chunk before the 200 goes out, so malformed
+        # input still maps to an HTTP error instead of a truncated stream
+        exporter.validate()
+        chunks = exporter.iter_chunks()
+        first = next(chunks, b"")
+
+        # Stream the rest as it is generated; gzip on the fly when the client accepts it
+        body = chain((first,), chunks)
+        if accept_encoding and "gzip" in accept_encoding.lower():
+            body = gzip_chunks(body)
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+    except ValueError as e:
+        print(f"GPX Export Error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"GPX Export Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,11 +1,19 @@
+import asyncio
 import httpx
+import numpy as np
 import polyline
-import copy
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from math import radians, cos, sin, asin, sqrt
 from fastapi import APIRouter, HTTPException
 from app.core.config import VALHALLA_URL
+from app.models.common import Location
 from app.models.route import RouteRequest
+from app.services.route_leg_cache import leg_cache, leg_key
+from singleflight import payload_key
+from valhalla import valhalla_flight
+from valhalla_scheduler import valhalla_scheduler, ValhallaOverloaded, INTERACTIVE
+from valhalla_resilience import Attempt, valhalla_resilience, collect_degraded, report_degraded
+from valhalla_metrics import record_upstream
 
 router = APIRouter(prefix="/api/route_v2", tags=["plan"])
 
@@ -38,97 +46,260 @@ def haversine(lon1, lat1, lon2, lat2):
     a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
     return 2 * asin(sqrt(a)) * 6371
 
+async def _post(client: httpx.AsyncClient, endpoint: str, payload: dict, max_timeout: float) -> httpx.Response:
+    """Valhalla POST. 동시에 들어온 동일 payload는 ValhallaClient와 같은 single-flight 테이블에서 병합,
+    실제 호출은 INTERACTIVE 우선순위로 스케줄러 슬롯을 받아 breaker/hedging과 함께 실행"""
+    url = f"{VALHALLA_URL}{endpoint}"
+    async def send(timeout: float, hedge: bool, attempt: Attempt) -> httpx.Response:
+        async with valhalla_scheduler.lane(endpoint).slot_async(INTERACTIVE, timeout=0 if hedge else None):
+            attempt.started()
+            try:
+                resp = await client.post(url, json=payload, timeout=timeout)
+            except httpx.HTTPError:
+                record_upstream(endpoint, "planner", None)
+                raise
+        record_upstream(endpoint, "planner", None, resp)
+        return resp
+    call = lambda: valhalla_resilience.call_async(endpoint, payload, send, cap=max_timeout)
+    return await valhalla_flight.do_async(payload_key(url, payload), call, label=endpoint)
+
+TRACE_ATTRIBUTES = ["edge.use", "edge.surface", "edge.begin_shape_index", "edge.end_shape_index", "edge.density"]
+
+async def _fetch_trace(client: httpx.AsyncClient, coords: List[List[float]]) -> Optional[dict]:
+    try:
+        trace_payload = {
+            "shape": [{"lat": c[1], "lon": c[0]} for c in coords],
+            "costing": "bicycle", "shape_match": "map_snap",
+            "filters": {"attributes": TRACE_ATTRIBUTES, "action": "include"}
+        }
+        t_resp = await _post(client, "/trace_attributes", trace_payload, max_timeout=30.0)
+        if t_resp.status_code == 200: return t_resp.json()
+        report_degraded("trace_attributes", f"HTTP {t_resp.status_code}", points=len(coords))
+    except ValhallaOverloaded: raise
+    except Exception as e: report_degraded("trace_attributes", e, points=len(coords))
+    return None
+
+async def _fetch_heights(client: httpx.AsyncClient, coords: List[List[float]]) -> Optional[List[float]]:
+    try:
+        h_resp = await _post(client, "/height", {"range_candidates": False, "shape": [{"lat": c[1], "lon": c[0]} for c in coords]}, max_timeout=10.0)
+        if h_resp.status_code == 200:
+            return [float(ele) if ele is not None else 0.0 for ele in h_resp.json().get("height", [])]
+        report_degraded("height", f"HTTP {h_resp.status_code}", points=len(coords))
+    except ValhallaOverloaded: raise
+    except Exception as e: report_degraded("height", e, points=len(coords))
+    return None
+
+def _build_display_features(edges: List[dict], matched_coords: List[List[float]]) -> List[dict]:
+    display_features = []
+    if not edges: return display_features
+    current_color, current_label, current_desc = get_segment_style(edges[0])
+    current_coords = []
+    for edge in edges:
+        color, label, desc = get_segment_style(edge)
+        start_idx, end_idx = edge.get("begin_shape_index", 0) or 0, edge.get("end_shape_index", 0) or 0
+        if start_idx >= len(matched_coords): continue
+        end_idx = min(len(matched_coords)-1, end_idx)
+        if start_idx == end_idx: end_idx = min(len(matched_coords)-1, end_idx + 1)
+        edge_coords = matched_coords[start_idx : end_idx + 1]
+        if (color != current_color or label != current_label) and current_coords:
+            if len(current_coords) >= 2:
+                display_features.append({"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[float(pt[0]), float(pt[1])] for pt in current_coords]}, "properties": {"color": current_color, "surface": current_label, "description": current_desc}})
+            current_coords, current_color, current_label, current_desc = [], color, label, desc
+        if not current_coords: current_coords.extend(edge_coords)
+        else: current_coords.extend(edge_coords[1:] if current_coords[-1] == edge_coords[0] else edge_coords)
+    if current_coords and len(current_coords) >= 2:
+        display_features.append({"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[float(pt[0]), float(pt[1])] for pt in current_coords]}, "properties": {"color": current_color, "surface": current_label, "description": current_desc}})
+    return display_features
+
+def _flatten_ferries(elevs: List[float], edges: List[dict]) -> None:
+    """Ferry 구간은 시작점 고도로 평탄화 (in-place)"""
+    for edge in edges:
+        if edge.get("use") == "ferry":
+            start_idx, end_idx = edge.get("begin_shape_index", 0) or 0, edge.get("end_shape_index", 0) or 0
+            if start_idx < len(elevs):
+                base_elev = elevs[start_idx]
+                for k in range(start_idx, min(end_idx + 1, len(elevs))): elevs[k] = base_elev
+
+SPLIT_TOLERANCE_DEG = 2e-5  # ~2m, matched shape에서 구간 경계 포인트를 찾을 때 일치로 보는 거리
+
+def _boundary_indices(matched_coords: List[List[float]], route_coords: List[List[float]], route_bounds: List[int]) -> List[int]:
+    """구간 경계(routed run shape 인덱스) → matched shape 인덱스. 길이가 같으면 그대로,
+    다르면 직전 경계 이후에서 처음으로 허용 거리 안에 드는 포인트 (없으면 가장 가까운 포인트)"""
+    if len(matched_coords) == len(route_coords): return list(route_bounds)
+    pts = np.asarray(matched_coords, dtype=np.float64)
+    out, start = [], 0
+    for r in route_bounds:
+        lon, lat = route_coords[r]
+        d2 = (pts[start:, 0] - lon) ** 2 + (pts[start:, 1] - lat) ** 2
+        close = np.flatnonzero(d2 <= SPLIT_TOLERANCE_DEG ** 2)
+        start += int(close[0] if len(close) else np.argmin(d2))
+        out.append(start)
+    return out
+
+def _split_edges(edges: List[dict], lo: int, hi: int) -> List[dict]:
+    """run 기준 edge 중 [lo, hi] 구간에 속하는 부분을 구간 기준 인덱스로. 경계를 넘는 edge는 양쪽으로 잘림"""
+    out = []
+    for edge in edges:
+        begin, end = edge.get("begin_shape_index", 0) or 0, edge.get("end_shape_index", 0) or 0
+        if end < lo or begin > hi: continue
+        if lo > 0 and end == lo: continue       # 앞 구간에서 끝나는 edge
+        if begin == hi and end > hi: continue   # 다음 구간에서 시작하는 edge
+        clipped = dict(edge)
+        clipped["begin_shape_index"] = max(begin, lo) - lo
+        clipped["end_shape_index"] = min(end, hi) - lo
+        out.append(clipped)
+    return out
+
+async def _build_run(client: httpx.AsyncClient, legs: List[dict]) -> List[Tuple[dict, bool]]:
+    """연속 구간(run)의 shape를 이어 붙여 trace/height를 한 번씩만 조회한 뒤 구간별로 나눔.
+    반환: 구간마다 (leg 결과, 캐시 가능 여부). shape index는 구간 기준"""
+    results, route_coords, ranges = [], [], []
+    for leg in legs:
+        leg_coords = decode_valhalla_shape(leg.get("shape", "")) if leg.get("shape") else []
+        summary = leg.get("summary", {})
+        results.append({"coords": leg_coords, "edges": [], "elevs": None, "length": summary.get("length", 0), "time": summary.get("time", 0)})
+        if not leg_coords:
+            ranges.append(None)
+            continue
+        skip = 1 if route_coords and route_coords[-1] == leg_coords[0] else 0
+        begin = len(route_coords) - skip
+        route_coords.extend(leg_coords[skip:])
+        ranges.append((begin, len(route_coords) - 1))
+    if not route_coords: return [(result, False) for result in results]
+
+    # 고도 조회는 edge 속성과 무관하므로 routed shape 기준으로 trace와 동시에 시작
+    t_data, route_elevs = await asyncio.gather(_fetch_trace(client, route_coords), _fetch_heights(client, route_coords))
+
+    edges, matched_coords = [], route_coords
+    if t_data:
+        edges = t_data.get("edges", [])
+        if t_data.get("shape"): matched_coords = decode_valhalla_shape(t_data["shape"]) or route_coords
+
+    # 인덱스로 매칭: map_snap 결과가 입력과 같은 길이면 routed shape 고도를 그대로 사용,
+    # 포인트 수가 달라진 경우에만 matched shape 전체로 한 번 더 조회
+    elevs = route_elevs
+    if matched_coords is not route_coords and len(matched_coords) != len(route_coords):
+        elevs = await _fetch_heights(client, matched_coords)
+    if elevs:
+        elevs = elevs[:len(matched_coords)]
+        _flatten_ferries(elevs, edges)
+
+    # trace/height 중 하나라도 실패한 run은 캐시하지 않고 다음 요청에서 재시도
+    cacheable = t_data is not None and elevs is not None and len(elevs) == len(matched_coords)
+
+    spans = [r for r in ranges if r is not None]
+    inner = _boundary_indices(matched_coords, route_coords, [end for _, end in spans[:-1]])
+    bounds = iter(zip([0] + inner, inner + [len(matched_coords) - 1]))
+    for result, span in zip(results, ranges):
+        if span is None: continue
+        lo, hi = next(bounds)
+        result.update(
+            coords=matched_coords[lo:hi + 1],
+            edges=_split_edges(edges, lo, hi),
+            elevs=elevs[lo:hi + 1] if elevs is not None else None,
+        )
+    return [(result, cacheable and span is not None) for result, span in zip(results, ranges)]
+
+async def _route_legs(client: httpx.AsyncClient, locations: List[Location], costing_options: dict) -> List[Tuple[dict, bool]]:
+    """연속된 locations 구간을 한 번의 /route로 계산하고, trace/height도 run 전체로 한 번씩 조회"""
+    valhalla_payload = {
+        "locations": [{"lat": loc.lat, "lon": loc.lon} for loc in locations],
+        "costing": "bicycle",
+        "costing_options": costing_options,
+        "directions_options": {"units": "km"}
+    }
+    resp = await _post(client, "/route", valhalla_payload, max_timeout=30.0)
+    if resp.status_code != 200: raise HTTPException(status_code=resp.status_code, detail=resp.text)
+    legs = resp.json().get("trip", {}).get("legs", [])
+    if len(legs) != len(locations) - 1: raise HTTPException(status_code=500, detail="Unexpected leg count")
+    return await _build_run(client, legs)
+
+def _stitch_legs(legs: List[dict]):
+    """구간 결과를 이어 붙임. 구간 경계의 중복 포인트는 한 번만 남기고 edge shape index를 전역으로 보정"""
+    coords, elevs, edges = [], [], []
+    has_elevs = all(leg["elevs"] is not None and len(leg["elevs"]) == len(leg["coords"]) for leg in legs)
+    for leg in legs:
+        leg_coords = leg["coords"]
+        if not leg_coords: continue
+        skip = 1 if coords and coords[-1] == leg_coords[0] else 0
+        offset = len(coords) - skip
+        coords.extend(leg_coords[skip:])
+        if has_elevs: elevs.extend(leg["elevs"][skip:])
+        for edge in leg["edges"]:
+            shifted = dict(edge)
+            shifted["begin_shape_index"] = (edge.get("begin_shape_index", 0) or 0) + offset
+            shifted["end_shape_index"] = (edge.get("end_shape_index", 0) or 0) + offset
+            edges.append(shifted)
+    return coords, (elevs if has_elevs else None), edges
+
 @router.post("")
 async def get_route_v2(request: RouteRequest):
     if len(request.locations) >= 2:
         if haversine(request.locations[0].lon, request.locations[0].lat, request.locations[-1].lon, request.locations[-1].lat) > 800:
             raise HTTPException(status_code=400, detail="Course is too long! Max 800km.")
     
-    valhalla_payload = {
-        "locations": [{"lat": loc.lat, "lon": loc.lon} for loc in request.locations],
-        "costing": "bicycle",
-        "costing_options": {"bicycle": {"bicycle_type": request.bicycle_type, "use_ferry": 0.1}},
-        "directions_options": {"units": "km"}
-    }
+    locations = request.locations
+    if len(locations) < 2: raise HTTPException(status_code=400, detail="At least 2 locations are required")
+    costing_options = {"bicycle": {"bicycle_type": request.bicycle_type, "use_ferry": 0.1}}
+    keys = [leg_key(locations[i], locations[i + 1], request.bicycle_type, costing_options) for i in range(len(locations) - 1)]
+    legs = [leg_cache.get(k) for k in keys]
+    
+    # 캐시에 없는 구간을 연속 구간(run) 단위로 묶어 Valhalla 호출
+    missing_runs, i = [], 0
+    while i < len(legs):
+        if legs[i] is None:
+            j = i
+            while j + 1 < len(legs) and legs[j + 1] is None: j += 1
+            missing_runs.append((i, j))
+            i = j + 1
+        else: i += 1
     
     async with httpx.AsyncClient() as client:
         try:
-            resp = await client.post(f"{VALHALLA_URL}/route", json=valhalla_payload, timeout=30.0)
-            if resp.status_code != 200: raise HTTPException(status_code=resp.status_code, detail=resp.text)
-            data = resp.json()
-            legs = data.get("trip", {}).get("legs", [])
-            route_coords = []
-            for leg in legs:
-                if leg.get("shape"): route_coords.extend(decode_valhalla_shape(leg["shape"]))
-            if not route_coords: raise HTTPException(status_code=500, detail="Empty shape")
+            with collect_degraded() as degraded:
+                run_results = await asyncio.gather(*(_route_legs(client, locations[a:b + 2], costing_options) for a, b in missing_runs))
+            for (a, b), results in zip(missing_runs, run_results):
+                for k, (leg, cacheable) in enumerate(results, start=a):
+                    legs[k] = leg
+                    if cacheable: leg_cache.set(keys[k], leg)
             
-            display_features, matched_coords = [], route_coords
-            try:
-                trace_payload = {
-                    "shape": [{"lat": c[1], "lon": c[0]} for c in route_coords],
-                    "costing": "bicycle", "shape_match": "map_snap",
-                    "filters": {"attributes": ["edge.use", "edge.surface", "edge.begin_shape_index", "edge.end_shape_index", "edge.density"], "action": "include"}
-                }
-                t_resp = await client.post(f"{VALHALLA_URL}/trace_attributes", json=trace_payload, timeout=30.0)
-                if t_resp.status_code == 200:
-                    t_data = t_resp.json()
-                    edges = t_data.get("edges", [])
-                    if t_data.get("shape"): matched_coords = decode_valhalla_shape(t_data["shape"])
-                    if edges:
-                        current_color, current_label, current_desc = get_segment_style(edges[0])
-                        current_coords = []
-                        for edge in edges:
-                            color, label, desc = get_segment_style(edge)
-                            start_idx, end_idx = edge.get("begin_shape_index", 0) or 0, edge.get("end_shape_index", 0) or 0
-                            if start_idx >= len(matched_coords): continue
-                            end_idx = min(len(matched_coords)-1, end_idx)
-                            if start_idx == end_idx: end_idx = min(len(matched_coords)-1, end_idx + 1)
-                            edge_coords = matched_coords[start_idx : end_idx + 1]
-                            if (color != current_color or label != current_label) and current_coords:
-                                if len(current_coords) >= 2:
-                                    display_features.append({"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[float(pt[0]), float(pt[1])] for pt in current_coords]}, "properties": {"color": current_color, "surface": current_label, "description": current_desc}})
-                                current_coords, current_color, current_label, current_desc = [], color, label, desc
-                            if not current_coords: current_coords.extend(edge_coords)
-                            else: current_coords.extend(edge_coords[1:] if current_coords[-1] == edge_coords[0] else edge_coords)
-                        if current_coords and len(current_coords) >= 2:
-                            display_features.append({"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[float(pt[0]), float(pt[1])] for pt in current_coords]}, "properties": {"color": current_color, "surface": current_label, "description": current_desc}})
-            except Exception as e: print(f"TRACE FAILED: {e}")
+            matched_coords, elevs, edges = _stitch_legs(legs)
+            if not matched_coords: raise HTTPException(status_code=500, detail="Empty shape")
             
+            display_features = _build_display_features(edges, matched_coords)
             if not display_features:
                 display_features = [{"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[float(c[0]), float(c[1])] for c in matched_coords]}, "properties": {"color": "#2a9e92", "surface": "paved"}}]
             
-            ascent, full_3d = 0, copy.deepcopy(matched_coords)
-            try:
-                h_resp = await client.post(f"{VALHALLA_URL}/height", json={"range_candidates": False, "shape": [{"lat": c[1], "lon": c[0]} for c in matched_coords]}, timeout=10.0)
-                if h_resp.status_code == 200:
-                    elevs = h_resp.json().get("height", [])
-                    for i, ele in enumerate(elevs):
-                        if i < len(full_3d):
-                            val = float(ele) if ele is not None else 0.0
-                            if len(full_3d[i]) < 3: full_3d[i].append(val)
-                            else: full_3d[i][2] = val
-                    if 'edges' in locals() and edges:
-                        for edge in edges:
-                            if edge.get("use") == "ferry":
-                                start_idx, end_idx = edge.get("begin_shape_index", 0) or 0, edge.get("end_shape_index", 0) or 0
-                                if start_idx < len(full_3d):
-                                    base_elev = full_3d[start_idx][2] if len(full_3d[start_idx]) > 2 else 0.0
-                                    for k in range(start_idx, min(end_idx + 1, len(full_3d))):
-                                        if len(full_3d[k]) > 2: full_3d[k][2] = base_elev
-                                        if k < len(elevs): elevs[k] = base_elev
-                    for i in range(1, len(elevs)):
-                        diff = elevs[i] - elevs[i-1]
-                        if diff > 0.5: ascent += diff
-            except: pass
+            ascent, full_3d = 0, [[c[0], c[1]] for c in matched_coords]
+            if elevs:
+                for i, ele in enumerate(elevs): full_3d[i].append(ele)
+                for i in range(1, len(elevs)):
+                    diff = elevs[i] - elevs[i-1]
+                    if diff > 0.5: ascent += diff
             
-            return {
+            result = {
                 "summary": {
-                    "distance": data.get("trip", {}).get("summary", {}).get("length", 0), 
-                    "time": data.get("trip", {}).get("summary", {}).get("time", 0), 
+                    "distance": round(sum(leg["length"] for leg in legs), 3), 
+                    "time": sum(leg["time"] for leg in legs), 
                     "ascent": round(ascent)
                 }, 
                 "full_geometry": {"type": "LineString", "coordinates": full_3d}, 
                 "display_geojson": {"type": "FeatureCollection", "features": display_features}
             }
+            # trace/height 일부 실패 시 (표면 정보 또는 고도 누락) 원인을 함께 전달
+            if degraded: result["degraded"] = degraded
+            return result
+        except ValhallaOverloaded:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stats")
+async def get_planner_stats():
+    """Valhalla 요청 병합(single-flight), 스케줄러 lane 상태, 구간 캐시 카운터"""
+    return {
+        "valhalla": valhalla_flight.stats(),
+        "scheduler": valhalla_scheduler.stats(),
+        "resilience": valhalla_resilience.stats(),
+        "leg_cache": {"size": len(leg_cache), "hits": leg_cache.hits, "misses": leg_cache.misses}
+    }
@@ -1,9 +1,12 @@
 import os
 import json
+import asyncio
 import uuid
-import tempfile
+import xml.etree.ElementTree as ET
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Header, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Header, Depends, UploadFile, File, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from app.core.database import get_db_conn
 from app.core.storage import save_to_storage
 from app.core.security import get_current_user
@@ -11,12 +14,17 @@ from app.core.config import VALHALLA_URL, STORAGE_TYPE, STORAGE_BASE_DIR, GCS_BU
 from app.models.route import RouteCreateRequest
 from app.models.common import Location
 from app.services.image_service import generate_thumbnail
-from app.services.embedding_service import get_embedding
+from app.services.embedding_service import to_halfvec_literal
+from app.services.embedding_worker import embedding_worker
 from app.services.auto_tag_service import generate_tags_and_description
+from app.services import tag_popularity
+from app.services.tag_popularity import popular_tags, POPULAR_TAGS_MAX_AGE
+from app.services.route_embedding_service import route_embedder, query_vector
 from google.cloud import storage
 
 from valhalla import ValhallaClient
-from gpx_loader import GpxLoader, TcxLoader
+from valhalla_scheduler import ValhallaOverloaded
+from gpx_loader import GpxLoader, TcxLoader, TrackTooLargeError
 
 router = APIRouter(prefix="/api/routes", tags=["routes"])
 valhalla_client = ValhallaClient(VALHALLA_URL)
@@ -60,7 +68,8 @@ async def create_route(route: RouteCreateRequest, authorization: str = Header(No
                         all_points.append({"lat": coord[1], "lon": coord[0]})
             
             if len(all_points) > 1:
-                final_full_data = valhalla_client.get_standard_course(all_points)
+                # 동기 Valhalla 호출은 threadpool에서 실행 (event loop 블로킹 방지)
+                final_full_data = await run_in_threadpool(valhalla_client.get_standard_course, all_points)
                 final_full_data['editor_state'] = route.editor_state
             else:
                 print("Warning: Not enough points to generate course.")
@@ -92,10 +101,19 @@ async def create_route(route: RouteCreateRequest, authorization: str = Header(No
         wkt = f"LINESTRING({points_str})"
         start_wkt = f"POINT({summary_locs[0].lon} {summary_locs[0].lat})"
 
-        # Generate Thumbnail
-        thumbnail_url = generate_thumbnail(summary_locs, route_uuid)
+        # Generate Thumbnail (card만; 레티나/공유 사이즈는 /api/thumbnails 첫 요청 때 생성)
+        thumbnail_url = generate_thumbnail(generated_points, route_uuid,
+                                           replace=bool(route.is_overwrite and route.route_id))
 
         if route.is_overwrite and route.route_id:
+            # 변경 전 공개 상태/태그 (tag_popularity 증분 갱신용). 동시 저장은 행 잠금으로 직렬화
+            cur.execute(
+                "SELECT status, ARRAY(SELECT tag_id FROM route_tags WHERE route_id = r.id) AS tag_ids FROM routes r WHERE r.id = %s FOR UPDATE",
+                (route.route_id,)
+            )
+            old = cur.fetchone()
+            before = (old['status'], old['tag_ids'])
+
             # UPDATE existing route
             cur.execute(
                 """
@@ -106,12 +124,13 @@ async def create_route(route: RouteCreateRequest, authorization: str = Header(No
                     distance = %s, elevation_gain = %s, data_file_path = %s,
                     thumbnail_url = %s,
                     updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s RETURNING id, route_num
+                WHERE id = %s RETURNING id, route_num, status
                 """,
                 (route.title, route.description, route.status, wkt, start_wkt, final_distance, final_elevation, final_data_path, thumbnail_url, route.route_id)
             )
             saved_route = cur.fetchone()
         else:
+            before = (None, [])
             # INSERT new route
             cur.execute(
                 """
@@ -120,7 +139,7 @@ async def create_route(route: RouteCreateRequest, authorization: str = Header(No
                     summary_path, start_point, distance, elevation_gain, data_file_path, thumbnail_url
                 ) VALUES (
                     %s, %s, %s, %s, %s, %s, ST_GeomFromText(%s, 4326), ST_GeomFromText(%s, 4326), %s, %s, %s, %s
-                ) RETURNING id, route_num
+                ) RETURNING id, route_num, status
                 """,
                 (route_uuid, user_id, route.parent_route_id, route.title, route.description, route.status, wkt, start_wkt, final_distance, final_elevation, final_data_path, thumbnail_url)
             )
@@ -129,45 +148,36 @@ async def create_route(route: RouteCreateRequest, authorization: str = Header(No
         target_id = saved_route['id']
 
         # 5. Handle Tags
+        tag_ids = before[1]
         if route.tags is not None:
+            tag_ids = []
             cur.execute("DELETE FROM route_tags WHERE route_id = %s", (target_id,))
             for tag_name in route.tags:
                 tag_name = tag_name.strip().lower()
                 if not tag_name: continue
-                # Check if tag exists
-                cur.execute("SELECT id, embedding FROM tags WHERE slug = %s", (tag_name,))
+                # 새 태그는 임베딩 없이 생성 → 커밋 후 embedding_worker가 배치로 채움 (요청 경로에서 Gemini 호출 없음)
+                cur.execute("SELECT id FROM tags WHERE slug = %s", (tag_name,))
                 existing = cur.fetchone()
                 if existing:
                     tag_id = existing['id']
-                    # Backfill embedding if missing
-                    if existing['embedding'] is None:
-                        try:
-                            emb = get_embedding(tag_name)
-                            cur.execute("UPDATE tags SET embedding = %s::halfvec WHERE id = %s", (str(emb), tag_id))
-                        except Exception as emb_err:
-                            print(f"Embedding backfill error for '{tag_name}': {emb_err}")
                 else:
-                    # Create new tag with embedding
-                    try:
-                        emb = get_embedding(tag_name)
-                        cur.execute(
-                            "INSERT INTO tags (names, slug, embedding) VALUES (%s, %s, %s::halfvec) RETURNING id",
-                            (json.dumps({"ko": tag_name, "en": tag_name}), tag_name, str(emb)),
-                        )
-                    except Exception as emb_err:
-                        print(f"Embedding generation error for '{tag_name}': {emb_err}")
-                        cur.execute(
-                            "INSERT INTO tags (names, slug) VALUES (%s, %s) ON CONFLICT (slug) DO UPDATE SET slug=EXCLUDED.slug RETURNING id",
-                            (json.dumps({"ko": tag_name, "en": tag_name}), tag_name),
-                        )
+                    cur.execute(
+                        "INSERT INTO tags (names, slug) VALUES (%s, %s) ON CONFLICT (slug) DO UPDATE SET slug=EXCLUDED.slug RETURNING id",
+                        (json.dumps({"ko": tag_name, "en": tag_name}), tag_name),
+                    )
                     tag_id = cur.fetchone()['id']
                 cur.execute("INSERT INTO route_tags (route_id, tag_id) VALUES (%s, %s) ON CONFLICT DO NOTHING", (target_id, tag_id))
+                tag_ids.append(tag_id)
+        tag_popularity.apply_route_change(cur, before, (saved_route['status'], tag_ids))
 
         # 6. Initialize Stats if New
         if not (route.is_overwrite and route.route_id):
             cur.execute("INSERT INTO route_stats (route_id) VALUES (%s) ON CONFLICT DO NOTHING", (target_id,))
 
         conn.commit()
+        popular_tags.invalidate()
+        route_embedder.schedule(target_id)  # 코스 임베딩은 응답과 분리해서 백그라운드로
+        if route.tags: embedding_worker.schedule_tags()
         cur.close()
         conn.close()
         
@@ -178,84 +188,63 @@ async def create_route(route: RouteCreateRequest, authorization: str = Header(No
             "uuid": route_uuid,
             "thumbnail_url": thumbnail_url
         }
+    except ValhallaOverloaded:
+        raise
     except Exception as e:
         print(f"Save Route Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/tags")
-async def get_tags():
-    conn = get_db_conn()
-    cur = conn.cursor()
+def _popular_tags_response(request: Request, variant: str, build) -> Response:
+    """인기 태그 목록 응답. 목록 해시 ETag + Cache-Control, If-None-Match 일치 시 304"""
     try:
-        cur.execute("""
-            SELECT t.slug, t.names, COUNT(rt.route_id) as count
-            FROM tags t
-            INNER JOIN route_tags rt ON rt.tag_id = t.id
-            INNER JOIN routes r ON r.id = rt.route_id AND r.status = 'PUBLIC'
-            GROUP BY t.id, t.slug, t.names
-            ORDER BY count DESC
-        """)
-        rows = cur.fetchall()
-        return [
-            {
-                "slug": row["slug"],
-                "name": row["names"].get("ko", row["slug"]) if isinstance(row["names"], dict) else row["slug"],
-                "count": row["count"]
-            }
-            for row in rows
-        ]
+        rows, digest = popular_tags.get()
     except Exception as e:
         print(f"Tags Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cur.close()
-        conn.close()
+    etag = f'"{digest}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={POPULAR_TAGS_MAX_AGE}, stale-while-revalidate={POPULAR_TAGS_MAX_AGE * 5}"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=build(rows), headers=headers)
 
-@router.get("/tags/search")
-async def search_tags(q: str = ""):
-    conn = get_db_conn()
-    cur = conn.cursor()
-    try:
-        q = q.strip()
-        if not q:
-            # Return popular tags when no query
+@router.get("/tags")
+def get_tags(request: Request):
+    # tag_popularity 요약 테이블 (+ 프로세스 캐시). 요청마다 GROUP BY 하지 않음
+    return _popular_tags_response(request, "all", lambda rows: rows)
+
+TAG_SEARCH_EMBEDDING_BUDGET = float(os.getenv("TAG_SEARCH_EMBEDDING_BUDGET", 0.3))  # 초, 자동완성 타이핑 간격 안
+
+def _tag_name(row) -> str:
+    return row["names"].get("ko", row["slug"]) if isinstance(row["names"], dict) else row["slug"]
+
+def _like_pattern(q: str) -> str:
+    """부분 일치 LIKE 패턴 (%, _ 이스케이프)"""
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _search_tags_text(q: str) -> list:
+    """slug 부분 일치 (idx_tags_slug_trgm 트라이그램 인덱스 사용)"""
+    pattern = _like_pattern(q)
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
             cur.execute("""
-                SELECT t.slug, t.names, COUNT(rt.route_id) as count
+                SELECT t.id, t.slug, t.names, COUNT(rt.route_id) as count
                 FROM tags t
-                INNER JOIN route_tags rt ON rt.tag_id = t.id
-                INNER JOIN routes r ON r.id = rt.route_id AND r.status = 'PUBLIC'
+                LEFT JOIN route_tags rt ON rt.tag_id = t.id
+                LEFT JOIN routes r ON r.id = rt.route_id AND r.status = 'PUBLIC'
+                WHERE t.slug LIKE %s
                 GROUP BY t.id, t.slug, t.names
                 ORDER BY count DESC
-                LIMIT 15
-            """)
-            rows = cur.fetchall()
-            return [
-                {
-                    "slug": row["slug"],
-                    "name": row["names"].get("ko", row["slug"]) if isinstance(row["names"], dict) else row["slug"],
-                    "count": row["count"],
-                    "similarity": None,
-                }
-                for row in rows
-            ]
-
-        # 1. Text matching (LIKE)
-        cur.execute("""
-            SELECT t.id, t.slug, t.names, COUNT(rt.route_id) as count
-            FROM tags t
-            LEFT JOIN route_tags rt ON rt.tag_id = t.id
-            LEFT JOIN routes r ON r.id = rt.route_id AND r.status = 'PUBLIC'
-            WHERE t.slug LIKE %s
-            GROUP BY t.id, t.slug, t.names
-            ORDER BY count DESC
-            LIMIT 10
-        """, (f"%{q}%",))
-        text_rows = cur.fetchall()
-
-        # 2. Semantic search via embedding
-        semantic_rows = []
-        try:
-            query_embedding = get_embedding(q)
+                LIMIT 10
+            """, (pattern,))
+            return cur.fetchall()
+
+def _search_tags_semantic(q: str) -> list:
+    """캐시된 검색어 임베딩 + HNSW 최근접 태그. 미스면 embedding_worker 큐에 넣고 빈 결과"""
+    arr = embedding_worker.lookup(q)
+    if arr is None: return []
+    query_embedding = to_halfvec_literal(arr)
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
             cur.execute("""
                 SELECT t.id, t.slug, t.names, COUNT(rt.route_id) as count,
                        1 - (t.embedding <=> %s::halfvec) as similarity
@@ -266,47 +255,59 @@ async def search_tags(q: str = ""):
                 GROUP BY t.id, t.slug, t.names, t.embedding
                 ORDER BY t.embedding <=> %s::halfvec
                 LIMIT 10
-            """, (str(query_embedding), str(query_embedding)))
-            semantic_rows = cur.fetchall()
-        except Exception as emb_err:
-            print(f"Embedding search fallback: {emb_err}")
-
-        # 3. Merge results (text matches first, then semantic, deduplicated)
-        results = []
-        seen_ids = set()
-
-        for row in text_rows:
-            seen_ids.add(row["id"])
-            sim = None
-            for sr in semantic_rows:
-                if sr["id"] == row["id"]:
-                    sim = round(float(sr["similarity"]), 4) if sr["similarity"] else None
-                    break
-            results.append({
-                "slug": row["slug"],
-                "name": row["names"].get("ko", row["slug"]) if isinstance(row["names"], dict) else row["slug"],
-                "count": row["count"],
-                "similarity": sim,
-            })
+            """, (query_embedding, query_embedding))
+            return cur.fetchall()
 
-        for row in semantic_rows:
-            if row["id"] not in seen_ids:
-                seen_ids.add(row["id"])
-                results.append({
-                    "slug": row["slug"],
-                    "name": row["names"].get("ko", row["slug"]) if isinstance(row["names"], dict) else row["slug"],
-                    "count": row["count"],
-                    "similarity": round(float(row["similarity"]), 4) if row["similarity"] else None,
-                })
+def _log_semantic_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Embedding search fallback: {task.exception()}")
 
-        return results
+@router.get("/tags/search")
+async def search_tags(request: Request, q: str = ""):
+    q = q.strip()
+    if not q:
+        # Return popular tags when no query (캐시 미스 시에만 DB 조회 → threadpool)
+        return await run_in_threadpool(
+            _popular_tags_response, request, "top15",
+            lambda rows: [{**row, "similarity": None} for row in rows[:15]],
+        )
 
+    # 1. Text matching (LIKE) 와 2. Semantic search 를 동시에 실행
+    started = asyncio.get_running_loop().time()
+    semantic_task = asyncio.ensure_future(run_in_threadpool(_search_tags_semantic, q))
+    semantic_task.add_done_callback(_log_semantic_failure)
+    try:
+        text_rows = await run_in_threadpool(_search_tags_text, q)
     except Exception as e:
         print(f"Tag Search Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cur.close()
-        conn.close()
+
+    # 임베딩 캐시 미스이거나 예산 안에 오지 않으면 텍스트 결과만 반환.
+    # 미스는 embedding_worker가 배치로 캐시를 채우므로 다음 입력에서는 semantic 결과가 포함됨
+    semantic_rows = []
+    remaining = TAG_SEARCH_EMBEDDING_BUDGET - (asyncio.get_running_loop().time() - started)
+    try:
+        semantic_rows = await asyncio.wait_for(asyncio.shield(semantic_task), max(0.0, remaining))
+    except asyncio.TimeoutError:
+        print(f"Embedding search skipped for '{q}': over {TAG_SEARCH_EMBEDDING_BUDGET}s budget")
+    except Exception:
+        pass  # _log_semantic_failure 에서 로그
+
+    # 3. Merge results (text matches first, then semantic, deduplicated)
+    similarity = {
+        row["id"]: round(float(row["similarity"]), 4) if row["similarity"] else None
+        for row in semantic_rows
+    }
+    results = [
+        {"slug": row["slug"], "name": _tag_name(row), "count": row["count"], "similarity": similarity.get(row["id"])}
+        for row in text_rows
+    ]
+    seen_ids = {row["id"] for row in text_rows}
+    for row in semantic_rows:
+        if row["id"] not in seen_ids:
+            seen_ids.add(row["id"])
+            results.append({"slug": row["slug"], "name": _tag_name(row), "count": row["count"], "similarity": similarity[row["id"]]})
+    return results
 
 @router.get("/nearby")
 async def get_nearby_routes(
@@ -596,18 +597,183 @@ async def search_routes(
         cur.close()
         conn.close()
 
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_SEARCH_CANDIDATES", 100))  # 텍스트/벡터 각각의 후보 수
+HYBRID_RRF_K = int(os.getenv("HYBRID_SEARCH_RRF_K", 60))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_SEARCH_VECTOR_WEIGHT", 1.0))
+HYBRID_TEXT_WEIGHT = float(os.getenv("HYBRID_SEARCH_TEXT_WEIGHT", 1.0))
+HYBRID_EF_SEARCH = int(os.getenv("HYBRID_SEARCH_EF_SEARCH", 100))
+
+def _public_route_filters(params: dict, min_distance, max_distance, min_elevation, max_elevation, tags) -> str:
+    """공개 코스 + 거리/고도/태그 필터 (named params)"""
+    clauses = ["r.status = 'PUBLIC'"]
+    if min_distance is not None:
+        clauses.append("r.distance >= %(min_distance)s")
+        params["min_distance"] = min_distance * 1000
+    if max_distance is not None:
+        clauses.append("r.distance <= %(max_distance)s")
+        params["max_distance"] = max_distance * 1000
+    if min_elevation is not None:
+        clauses.append("r.elevation_gain >= %(min_elevation)s")
+        params["min_elevation"] = min_elevation
+    if max_elevation is not None:
+        clauses.append("r.elevation_gain <= %(max_elevation)s")
+        params["max_elevation"] = max_elevation
+    tag_list = [t.strip() for t in (tags or "").split(",") if t.strip()]
+    if tag_list:
+        clauses.append("""
+            EXISTS (
+                SELECT 1 FROM route_tags rt_f
+                INNER JOIN tags t_f ON t_f.id = rt_f.tag_id
+                WHERE rt_f.route_id = r.id AND t_f.slug = ANY(%(tags)s)
+            )""")
+        params["tags"] = tag_list
+    return " AND ".join(clauses)
+
+@router.get("/search")
+async def hybrid_search_routes(
+    q: str,
+    page: int = 1,
+    limit: int = 10,
+    min_distance: Optional[int] = None,  # km
+    max_distance: Optional[int] = None,  # km
+    min_elevation: Optional[int] = None, # m
+    max_elevation: Optional[int] = None, # m
+    tags: Optional[str] = None           # comma-separated slugs
+):
+    """자연어 코스 검색: 트라이그램(제목/설명) 순위 + 코스 임베딩(HNSW) 순위를 RRF로 합산.
+    필터는 두 후보 집합 모두에 적용. 검색어 임베딩이 캐시에 없거나 실패 시 텍스트 순위만 사용"""
+    q = q.strip()
+    if not q: raise HTTPException(status_code=400, detail="q is required")
+    page, limit = max(1, page), min(max(1, limit), 50)
+
+    try:
+        embedding = await run_in_threadpool(query_vector, q)
+    except Exception as e:
+        print(f"Route vector search fallback for '{q}': {e}")
+        embedding = None
+
+    params = {
+        "q": q, "pattern": _like_pattern(q), "emb": embedding,
+        "candidates": max(HYBRID_CANDIDATES, page * limit),
+        "rrf_k": HYBRID_RRF_K, "w_vec": HYBRID_VECTOR_WEIGHT, "w_text": HYBRID_TEXT_WEIGHT,
+        "limit": limit, "offset": (page - 1) * limit,
+    }
+    filters = _public_route_filters(params, min_distance, max_distance, min_elevation, max_elevation, tags)
+
+    if embedding is not None:
+        # 필터로 후보가 줄어도 HNSW가 LIMIT만큼 채울 때까지 계속 탐색 (pgvector 0.8 iterative scan)
+        vec_cte = f"""
+            SELECT id, dist, ROW_NUMBER() OVER (ORDER BY dist, id) AS rank
+            FROM (
+                SELECT r.id, re.embedding <=> %(emb)s::halfvec AS dist
+                FROM route_embeddings re
+                INNER JOIN routes r ON r.id = re.route_id
+                WHERE {filters}
+                ORDER BY re.embedding <=> %(emb)s::halfvec
+                LIMIT %(candidates)s
+            ) v"""
+    else:
+        vec_cte = "SELECT NULL::bigint AS id, NULL::float8 AS dist, NULL::bigint AS rank WHERE false"
+
+    query = f"""
+        WITH vec AS ({vec_cte}),
+        txt AS (
+            SELECT id, sim, ROW_NUMBER() OVER (ORDER BY sim DESC, id DESC) AS rank
+            FROM (
+                -- idx_routes_title_trgm / idx_routes_desc_trgm: ILIKE, word similarity 모두 GIN 트라이그램 사용
+                SELECT r.id,
+                       GREATEST(word_similarity(%(q)s, r.title), word_similarity(%(q)s, COALESCE(r.description, ''))) AS sim
+                FROM routes r
+                WHERE {filters}
+                  AND (r.title ILIKE %(pattern)s OR r.description ILIKE %(pattern)s OR %(q)s <%% r.title)
+                ORDER BY sim DESC, r.id DESC
+                LIMIT %(candidates)s
+            ) t
+        ),
+        fused AS (
+            SELECT COALESCE(v.id, t.id) AS id,
+                   %(w_vec)s * COALESCE(1.0 / (%(rrf_k)s + v.rank), 0)
+                     + %(w_text)s * COALESCE(1.0 / (%(rrf_k)s + t.rank), 0) AS score,
+                   1 - v.dist AS similarity,
+                   t.sim AS text_score
+            FROM vec v
+            FULL OUTER JOIN txt t ON t.id = v.id
+        )
+        SELECT
+            f.score, f.similarity, f.text_score,
+            r.id, r.route_num, r.uuid, r.title, r.distance, r.elevation_gain,
+            r.created_at, r.updated_at, r.thumbnail_url, r.status, r.user_id,
+            u.username as author_name, u.profile_image_url as author_image,
+            COALESCE(rs.view_count, 0) as view_count,
+            COALESCE(rs.download_count, 0) as download_count,
+            ARRAY(
+                SELECT t.slug FROM route_tags rt INNER JOIN tags t ON t.id = rt.tag_id WHERE rt.route_id = r.id
+            ) as tags
+        FROM fused f
+        INNER JOIN routes r ON r.id = f.id
+        LEFT JOIN users u ON r.user_id = u.id
+        LEFT JOIN route_stats rs ON r.id = rs.route_id
+        ORDER BY f.score DESC, r.id DESC
+        LIMIT %(limit)s OFFSET %(offset)s
+    """
+
+    conn = get_db_conn()
+    cur = conn.cursor()
+    try:
+        if embedding is not None:
+            cur.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+            cur.execute("SET LOCAL hnsw.ef_search = %s", (HYBRID_EF_SEARCH,))
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        routes = [
+            {
+                "id": row['id'],
+                "route_num": row['route_num'],
+                "uuid": row['uuid'],
+                "title": row['title'],
+                "distance": row['distance'],
+                "elevation_gain": row['elevation_gain'],
+                "created_at": row['created_at'],
+                "updated_at": row['updated_at'],
+                "thumbnail_url": row['thumbnail_url'],
+                "status": row['status'],
+                "user_id": row['user_id'],
+                "author_name": row['author_name'] or "알 수 없음",
+                "author_image": row['author_image'],
+                "tags": row['tags'],
+                "view_count": row['view_count'],
+                "download_count": row['download_count'],
+                "score": round(float(row['score']), 6),
+                "similarity": round(float(row['similarity']), 4) if row['similarity'] is not None else None,
+                "text_score": round(float(row['text_score']), 4) if row['text_score'] is not None else None,
+            }
+            for row in rows
+        ]
+        return {"routes": routes, "page": page, "limit": limit, "q": q, "semantic": embedding is not None}
+    except Exception as e:
+        print(f"Hybrid Search Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cur.close()
+        conn.close()
+
 @router.delete("/{route_id}")
 async def delete_route(route_id: int, authorization: str = Header(None)):
     user_id = await get_current_user(authorization)
     conn = get_db_conn()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT user_id FROM routes WHERE id = %s", (route_id,))
+        cur.execute(
+            "SELECT user_id, status, ARRAY(SELECT tag_id FROM route_tags WHERE route_id = r.id) AS tag_ids FROM routes r WHERE r.id = %s FOR UPDATE",
+            (route_id,)
+        )
         row = cur.fetchone()
         if not row: raise HTTPException(status_code=404, detail="Route not found")
         if row['user_id'] != user_id: raise HTTPException(status_code=403, detail="Not authorized to delete this route")
         cur.execute("UPDATE routes SET status = 'DELETED', updated_at = CURRENT_TIMESTAMP WHERE id = %s", (route_id,))
+        tag_popularity.apply_route_change(cur, (row['status'], row['tag_ids']), ('DELETED', row['tag_ids']))
         conn.commit()
+        popular_tags.invalidate()
         return {"status": "success"}
     finally:
         cur.close()
@@ -747,29 +913,32 @@ async def increment_download_count(route_id: int):
 @router.post("/import")
 async def import_gpx(file: UploadFile = File(...)):
     try:
-        content = await file.read()
-        suffix = os.path.splitext(file.filename)[1].lower()
+        suffix = os.path.splitext(file.filename or "")[1].lower()
         if suffix not in [".gpx", ".tcx"]:
-            if b"<TrainingCenterDatabase" in content: suffix = ".tcx"
+            head = await file.read(4096)
+            await file.seek(0)
+            if b"<TrainingCenterDatabase" in head: suffix = ".tcx"
             else: suffix = ".gpx"
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(content)
-            tmp_path = tmp.name
-        
-        loader = TcxLoader(tmp_path) if suffix == ".tcx" else GpxLoader(tmp_path)
+        # Parse straight from the upload stream (no temp file, no full in-memory copy)
+        loader = TcxLoader(file.file) if suffix == ".tcx" else GpxLoader(file.file)
         loader.load()
-        os.unlink(tmp_path)
         
-        if not loader.points: raise HTTPException(status_code=400, detail=f"Invalid {suffix[1:].upper()} file: No track points found.")
-        return loader.process_with_valhalla(valhalla_client)
+        if not len(loader.lats): raise HTTPException(status_code=400, detail=f"Invalid {suffix[1:].upper()} file: No track points found.")
+        return await run_in_threadpool(loader.process_with_valhalla, valhalla_client)
+    except (HTTPException, ValhallaOverloaded):
+        raise
+    except TrackTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {suffix[1:].upper()} file: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/auto-tag")
-async def generate_auto_tag_and_desc(route: RouteCreateRequest, authorization: str = Header(None)):
-    """Generate AI tags and description"""
+async def generate_auto_tag_and_desc(route: RouteCreateRequest, authorization: str = Header(None), refresh: bool = False):
+    """Generate AI tags and description (refresh=true: 캐시 무시하고 새로 생성)"""
     # Just need full_data
     full_data = route.full_data
     if not full_data and route.editor_state and route.editor_state.get('sections'):
@@ -780,7 +949,7 @@ async def generate_auto_tag_and_desc(route: RouteCreateRequest, authorization: s
                 for coord in coords:
                     all_points.append({"lat": coord[1], "lon": coord[0]})
         if len(all_points) > 1:
-            full_data = valhalla_client.get_standard_course(all_points)
+            full_data = await run_in_threadpool(valhalla_client.get_standard_course, all_points)
             full_data['editor_state'] = route.editor_state
     
     if not full_data:
@@ -788,7 +957,7 @@ async def generate_auto_tag_and_desc(route: RouteCreateRequest, authorization: s
 
     conn = get_db_conn()
     try:
-        result = generate_tags_and_description(conn, full_data)
+        result = generate_tags_and_description(conn, full_data, use_cache=not refresh)
         return result
     except Exception as e:
         print(f"Auto-tag generation error: {e}")
@@ -1,10 +1,29 @@
 import os
+import uuid
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Response
+from starlette.concurrency import run_in_threadpool
 from google.cloud import storage
 from app.core.config import STORAGE_TYPE, STORAGE_BASE_DIR, GCS_BUCKET_NAME
+from app.services.image_service import render_missing_size
+from app.services.thumbnail_renderer import parse_thumbnail_filename
 
 router = APIRouter(prefix="/api/thumbnails", tags=["thumbnails"])
 
+def _media_type(filename: str) -> str:
+    return "image/webp" if filename.endswith(".webp") else "image/png"
+
+async def _render_missing(filename: str) -> Optional[bytes]:
+    """저장 때 렌더링하지 않은 사이즈(card@2x, share)는 첫 요청 때 코스 JSON에서 만들어 저장"""
+    parsed = parse_thumbnail_filename(filename)
+    if parsed is None: return None
+    route_uuid, size = parsed
+    try:
+        uuid.UUID(route_uuid)
+    except ValueError:
+        return None
+    return await run_in_threadpool(render_missing_size, route_uuid, size)
+
 @router.get("/{filename}")
 async def get_thumbnail_proxy(filename: str):
     """
@@ -17,11 +36,16 @@ async def get_thumbnail_proxy(filename: str):
             bucket = client.bucket(GCS_BUCKET_NAME)
             blob = bucket.blob(f"thumbnails/{filename}")
             
-            if not blob.exists():
-                raise HTTPException(status_code=404, detail="Thumbnail not found in GCS")
-            
-            content = blob.download_as_bytes()
-            return Response(content=content, media_type="image/png")
+            if blob.exists():
+                content = blob.download_as_bytes()
+            else:
+                content = await _render_missing(filename)
+                if content is None:
+                    raise HTTPException(status_code=404, detail="Thumbnail not found in GCS")
+
+            return Response(content=content, media_type=_media_type(filename))
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"GCS Proxy Error: {e}")
             raise HTTPException(status_code=500, detail="Error fetching image from GCS")
@@ -29,8 +53,11 @@ async def get_thumbnail_proxy(filename: str):
     else: # LOCAL
         file_path = os.path.join(STORAGE_BASE_DIR, "thumbnails", filename)
         if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="Thumbnail not found locally")
+            content = await _render_missing(filename)
+            if content is None:
+                raise HTTPException(status_code=404, detail="Thumbnail not found locally")
+            return Response(content=content, media_type=_media_type(filename))
         
         with open(file_path, "rb") as f:
             content = f.read()
-        return Response(content=content, media_type="image/png")
+        return Response(content=content, media_type=_media_type(filename))
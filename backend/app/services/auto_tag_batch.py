@@ -0,0 +1,375 @@
+"""
+자동 태그/설명 배치 실행기 — 카탈로그 전체 재생성 (Suimi 코스 + 사용자 코스)
+
+스크립트마다 따로 만들던 스레드풀 / 진행 파일 / DB 접근 / 재시도를 한 곳으로 모음.
+- 코스 id는 키셋 페이지(id > 마지막 id)로 스트리밍 → 전체 목록을 메모리에 올리지 않음
+- 페이지마다 코스 행 + 기존 태그를 한 쿼리, 주변 POI를 한 번에 준비
+  (_find_waypoints_bulk: 인메모리 waypoint_index, 없으면 PostGIS 쿼리 1회)
+- LLM 호출은 워커 스레드에서, 토큰 버킷(rpm)으로 간격을 맞추고 실패 시 지수 백오프(+jitter) 재시도
+  → 처리량 ≈ min(rpm, workers / 호출 지연) 으로 예측 가능
+- 결과는 auto_tag_batch_progress(job, route_id)에 체크포인트 후 write_batch개씩 한 트랜잭션으로 반영
+  · generated: 생성만 됨 (dry-run 또는 반영 실패) → 다음 실행 시작 때 먼저 반영
+  · written: 반영 완료 → 같은 job 재실행 시 건너뜀
+  · error: MAX_JOB_ATTEMPTS 미만이면 다음 실행에서 다시 시도
+- 반영 시 routes.updated_at을 갱신하므로 코스 임베딩은 embed_routes.py가 stale로 잡아 보충
+
+Usage: scripts/auto_tag_batch.py (기본 자동 태그), 커스텀 프롬프트는 generate/write만 바꿔 BatchRunner 사용
+"""
+
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from psycopg2.extras import Json, execute_values
+
+from app.core.database import get_db_conn
+from app.core.rate_limit import TokenBucket, call_with_backoff
+from app.core.storage import load_from_storage
+from app.services import tag_popularity
+from app.services.auto_tag_service import (
+    _find_waypoints_bulk, cached_from_waypoints, generate_from_waypoints, get_existing_tags, route_probes,
+)
+
+AUTO_TAG_BATCH_RPM = float(os.getenv("AUTO_TAG_BATCH_RPM", 60))        # 분당 LLM 호출 수 상한
+AUTO_TAG_BATCH_WORKERS = int(os.getenv("AUTO_TAG_BATCH_WORKERS", 4))    # 동시 호출 수 (DB_POOL_MAX 이하로)
+AUTO_TAG_BATCH_PAGE = 50     # 페이지당 코스 수 (POI 벌크 쿼리 단위)
+AUTO_TAG_BATCH_WRITE = 20    # 반영 트랜잭션당 코스 수
+MAX_JOB_ATTEMPTS = 3         # 실행을 넘어 같은 코스를 다시 시도하는 횟수
+ROUTE_RADIUS_M = 500         # generate_tags_and_description과 같은 경로 선 반경
+MAX_TAG_LENGTH = 50          # tags.slug VARCHAR(50)
+
+_PAGE_SQL = """
+    SELECT r.id FROM routes r
+    LEFT JOIN auto_tag_batch_progress p ON p.job = %(job)s AND p.route_id = r.id
+    WHERE r.status != 'DELETED' AND r.id > %(after)s AND ({where})
+      AND (p.route_id IS NULL OR (p.status = 'error' AND p.attempts < %(max_attempts)s))
+    ORDER BY r.id
+    LIMIT %(page)s
+"""
+
+_ROUTES_SQL = """
+    SELECT r.id, r.uuid, r.user_id, r.title, r.description, r.status, r.data_file_path,
+           r.distance, r.elevation_gain,
+           ARRAY(
+               SELECT t.slug FROM route_tags rt JOIN tags t ON t.id = rt.tag_id
+               WHERE rt.route_id = r.id ORDER BY t.slug
+           ) AS tags
+    FROM routes r
+    WHERE r.id = ANY(%s)
+    ORDER BY r.id
+"""
+
+
+class BatchRunner:
+    """
+    job: auto_tag_batch_progress.job 키. 같은 이름으로 다시 실행하면 이어서 진행
+    generate(item) -> dict: 워커 스레드에서 호출 (JSON 직렬화 가능한 결과). 예외는 재시도 후 error로 기록
+        item = 코스 행(id, uuid, user_id, title, description, status, distance, elevation_gain, tags)
+               + full_data + waypoints(우선순위 순) + existing_tags
+    write(cur, done): 메인 스레드에서 [(item, result)]를 반영. 트랜잭션 커밋은 실행기가 함
+    lookup(item) -> dict | None: 토큰을 받기 전에 확인하는 캐시. 히트면 generate/속도 제한 없이 결과로 사용
+    require_data: 코스 JSON이 없으면 호출 없이 error로 기록
+    """
+    def __init__(self, job: str, generate: Callable[[dict], dict],
+                 write: Optional[Callable[[object, list], None]] = None, *,
+                 workers: int = AUTO_TAG_BATCH_WORKERS, rpm: float = AUTO_TAG_BATCH_RPM,
+                 page_size: int = AUTO_TAG_BATCH_PAGE, write_batch: int = AUTO_TAG_BATCH_WRITE,
+                 with_pois: bool = True, require_data: bool = True, dry_run: bool = False,
+                 lookup: Optional[Callable[[dict], Optional[dict]]] = None):
+        self.job = job
+        self.generate = generate
+        self.write = write
+        self.lookup = lookup
+        self.workers = workers
+        self.rpm = rpm
+        self.page_size = page_size
+        self.write_batch = write_batch
+        self.with_pois = with_pois
+        self.require_data = require_data
+        self.dry_run = dry_run
+        self._bucket = TokenBucket(rpm / 60.0, burst=workers)
+        self._stop = threading.Event()
+        self._counts = {"generated": 0, "error": 0, "written": 0}
+        self._started = 0.0
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def install_signal_handlers(self) -> None:
+        """Ctrl+C / SIGTERM: 새 호출은 멈추고 진행 중인 호출은 체크포인트까지 마친 뒤 종료"""
+        def handler(sig, frame):
+            if not self._stop.is_set():
+                print("\n⚠️  종료 요청 수신. 진행 중인 호출을 기록한 뒤 종료합니다...")
+            self.stop()
+        signal.signal(signal.SIGINT, handler)
+        signal.signal(signal.SIGTERM, handler)
+
+    def run(self, where: str = "TRUE", params: Optional[dict] = None,
+            limit: Optional[int] = None, reset: bool = False) -> dict:
+        """where: routes r 조건 (named params). 반환: {"generated", "error", "written"} 건수"""
+        params = params or {}
+        self._started = time.time()
+        print(f"[Batch {self.job}] workers={self.workers}, ≤{self.rpm:g} calls/min"
+              f"{' (dry-run)' if self.dry_run or not self.write else ''}")
+
+        with get_db_conn() as conn:
+            if reset:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM auto_tag_batch_progress WHERE job = %s", (self.job,))
+                conn.commit()
+            existing_tags = get_existing_tags(conn)
+            conn.commit()
+
+            if self.write and not self.dry_run: self._write_pending(conn)
+
+            pending, in_flight = [], set()
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for items in self._pages(conn, where, params, limit, existing_tags):
+                    for item in items:
+                        if item.get("error"):
+                            pending.append((item, None, item["error"]))
+                            continue
+                        in_flight.add(pool.submit(self._generate_one, item))
+                        if len(in_flight) >= self.workers * 2:
+                            in_flight = self._collect(conn, in_flight, pending, FIRST_COMPLETED)
+                    if self._stop.is_set(): break
+                self._collect(conn, in_flight, pending, ALL_COMPLETED)
+            self._flush(conn, pending)
+
+        self._report(final=True)
+        return dict(self._counts)
+
+    # --- 내부 단계 ---
+
+    def _pages(self, conn, where: str, params: dict, limit: Optional[int], existing_tags: list):
+        after, remaining = 0, limit
+        while not self._stop.is_set():
+            page = self.page_size if remaining is None else min(self.page_size, remaining)
+            if page <= 0: return
+            with conn.cursor() as cur:
+                cur.execute(_PAGE_SQL.format(where=where), {
+                    **params, "job": self.job, "after": after,
+                    "max_attempts": MAX_JOB_ATTEMPTS, "page": page,
+                })
+                route_ids = [row["id"] for row in cur.fetchall()]
+            conn.commit()
+            if not route_ids: return
+            after = route_ids[-1]
+            if remaining is not None: remaining -= len(route_ids)
+            yield self._prepare(conn, route_ids, existing_tags)
+
+    def _prepare(self, conn, route_ids: list, existing_tags: list) -> list:
+        """코스 행 + JSON + 주변 POI (페이지 전체를 한 쿼리로)"""
+        with conn.cursor() as cur:
+            cur.execute(_ROUTES_SQL, (route_ids,))
+            items = [dict(row) for row in cur.fetchall()]
+
+        probes = {}
+        for item in items:
+            item["existing_tags"] = existing_tags
+            item["waypoints"] = []
+            item["full_data"] = None
+            if not (self.with_pois or self.require_data): continue  # 제목/설명만 쓰는 작업
+            raw = None
+            try:
+                raw = load_from_storage(item["data_file_path"])
+            except Exception as e:
+                print(f"[Batch {self.job}] route {item['id']} data load error: {e}")
+            item["full_data"] = json.loads(raw) if raw else None
+            if item["full_data"] is None:
+                if self.require_data: item["error"] = f"route data file missing: {item['data_file_path']}"
+                continue
+            points, route_wkt = route_probes(item["full_data"])
+            if self.with_pois and points: probes[item["id"]] = (points, route_wkt, ROUTE_RADIUS_M)
+
+        if probes:
+            by_id = {item["id"]: item for item in items}
+            for route_id, waypoints in _find_waypoints_bulk(conn, probes).items():
+                by_id[route_id]["waypoints"] = waypoints
+        conn.commit()
+        return items
+
+    def _generate_one(self, item: dict):
+        if self._stop.is_set(): return item, None, None  # 시작 전 취소 → 기록 없이 다음 실행으로
+        try:
+            cached = self.lookup(item) if self.lookup is not None else None
+            if cached is not None: return item, cached, None  # 캐시 히트는 rpm 상한에 걸리지 않음
+            return item, call_with_backoff(lambda: self.generate(item), self._bucket), None
+        except Exception as e:
+            return item, None, f"{type(e).__name__}: {e}"[:1000]
+
+    def _collect(self, conn, in_flight: set, pending: list, return_when) -> set:
+        done, rest = wait(in_flight, return_when=return_when)
+        for future in done:
+            item, result, error = future.result()
+            if result is None and error is None: continue
+            pending.append((item, result, error))
+            if len(pending) >= self.write_batch: self._flush(conn, pending)
+        return rest
+
+    def _flush(self, conn, pending: list) -> None:
+        """체크포인트(생성 결과 보존) 커밋 후 반영. 반영이 실패해도 결과는 generated로 남음"""
+        if not pending: return
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO auto_tag_batch_progress (job, route_id, status, result, error) VALUES %s
+                ON CONFLICT (job, route_id) DO UPDATE
+                    SET status = EXCLUDED.status, result = EXCLUDED.result, error = EXCLUDED.error,
+                        attempts = auto_tag_batch_progress.attempts + 1, updated_at = CURRENT_TIMESTAMP
+                """,
+                [
+                    (self.job, item["id"], "error" if error else "generated",
+                     Json(result) if result is not None else None, error)
+                    for item, result, error in pending
+                ],
+            )
+        conn.commit()
+
+        done = [(item, result) for item, result, error in pending if not error]
+        for item, _, error in pending:
+            if error: print(f"[Batch {self.job}] route {item['id']} error: {error[:200]}")
+        self._counts["generated"] += len(done)
+        self._counts["error"] += len(pending) - len(done)
+        pending.clear()
+
+        if done and self.write and not self.dry_run: self._write(conn, done)
+        self._report()
+
+    def _write(self, conn, done: list) -> None:
+        try:
+            with conn.cursor() as cur:
+                self.write(cur, done)
+                cur.execute(
+                    "UPDATE auto_tag_batch_progress SET status = 'written', updated_at = CURRENT_TIMESTAMP "
+                    "WHERE job = %s AND route_id = ANY(%s)",
+                    (self.job, [item["id"] for item, _ in done]),
+                )
+            conn.commit()
+            self._counts["written"] += len(done)
+        except Exception as e:
+            conn.rollback()
+            print(f"[Batch {self.job}] write error ({len(done)} routes, first id={done[0][0]['id']}): {e}")
+
+    def _write_pending(self, conn) -> None:
+        """이전 실행(dry-run / 반영 실패)에서 생성만 된 결과를 먼저 반영"""
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT p.route_id, p.result FROM auto_tag_batch_progress p
+                JOIN routes r ON r.id = p.route_id
+                WHERE p.job = %s AND p.status = 'generated' AND r.status != 'DELETED'
+                ORDER BY p.route_id
+                """,
+                (self.job,),
+            )
+            results = {row["route_id"]: row["result"] for row in cur.fetchall()}
+        conn.commit()
+        if not results: return
+        print(f"[Batch {self.job}] writing {len(results)} previously generated routes")
+
+        route_ids = list(results)
+        for i in range(0, len(route_ids), self.write_batch):
+            with conn.cursor() as cur:
+                cur.execute(_ROUTES_SQL, (route_ids[i:i + self.write_batch],))
+                items = [dict(row) for row in cur.fetchall()]
+            self._write(conn, [(item, results[item["id"]]) for item in items])
+
+    def _report(self, final: bool = False) -> None:
+        elapsed = max(time.time() - self._started, 1e-6)
+        c = self._counts
+        rate = (c["generated"] + c["error"]) / elapsed * 60
+        print(f"[Batch {self.job}] {'done' if final else 'progress'}: generated {c['generated']}"
+              f" / error {c['error']} / written {c['written']} — {rate:.1f} routes/min, {elapsed:.0f}s")
+
+
+def load_results(job: str, route_ids: Optional[list] = None) -> dict:
+    """job의 체크포인트 결과 {route_id: {"status", "result", "error"}} (미리보기/내보내기용)"""
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT route_id, status, result, error FROM auto_tag_batch_progress
+                WHERE job = %s AND (%s::bigint[] IS NULL OR route_id = ANY(%s::bigint[]))
+                ORDER BY route_id
+                """,
+                (job, route_ids, route_ids),
+            )
+            return {row["route_id"]: dict(row) for row in cur.fetchall()}
+
+
+# --- 기본 작업: generate_tags_and_description과 같은 태그/설명 생성 ---
+
+def auto_tag_lookup(item: dict) -> Optional[dict]:
+    """BatchRunner lookup: auto_tag_cache 히트면 결과, 미스면 표시만 해두고 None (auto_tag_item이 재조회하지 않음)"""
+    cached = cached_from_waypoints(item["full_data"], item["waypoints"], item["existing_tags"])
+    if cached is None: item["cache_checked"] = True
+    return cached
+
+
+def auto_tag_item(item: dict, use_cache: bool = True) -> dict:
+    """BatchRunner generate: 페이지 벌크 POI 결과로 태그/설명 생성. 빈 결과는 재시도 대상"""
+    result = generate_from_waypoints(item["full_data"], item["waypoints"], item["existing_tags"], use_cache,
+                                     cache_checked=item.get("cache_checked", False))
+    if not result.get("tags") and not result.get("description"):
+        raise ValueError("empty auto-tag result")
+    return result
+
+
+def write_tags_and_description(cur, done: list) -> None:
+    """BatchRunner write: 설명 + 태그 교체를 배치 단위로 (제목은 사용자 입력이라 유지).
+    새 태그 임베딩은 비워두고 scripts/data_refinement/embed_existing_tags.py가 채움"""
+    route_ids = sorted(item["id"] for item, _ in done)
+    cur.execute(
+        """
+        SELECT r.id, r.status, ARRAY(SELECT tag_id FROM route_tags WHERE route_id = r.id) AS tag_ids
+        FROM routes r WHERE r.id = ANY(%s) ORDER BY r.id FOR UPDATE
+        """,
+        (route_ids,),
+    )
+    before = {row["id"]: (row["status"], row["tag_ids"]) for row in cur.fetchall()}
+    done = [(item, result) for item, result in done if item["id"] in before]  # 그 사이 삭제된 코스 제외
+
+    slugs_by_route = {
+        item["id"]: sorted({t for t in result.get("tags", []) if t and len(t) <= MAX_TAG_LENGTH})
+        for item, result in done
+    }
+    slugs = sorted({slug for route_slugs in slugs_by_route.values() for slug in route_slugs})
+    tag_ids = {}
+    if slugs:
+        execute_values(
+            cur,
+            "INSERT INTO tags (names, slug) VALUES %s ON CONFLICT (slug) DO NOTHING",
+            [(Json({"ko": slug, "en": slug}), slug) for slug in slugs],
+        )
+        cur.execute("SELECT id, slug FROM tags WHERE slug = ANY(%s)", (slugs,))
+        tag_ids = {row["slug"]: row["id"] for row in cur.fetchall()}
+
+    descriptions = [(item["id"], result["description"]) for item, result in done if result.get("description")]
+    if descriptions:
+        execute_values(
+            cur,
+            """
+            UPDATE routes r SET description = v.description, updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(id, description) WHERE r.id = v.id
+            """,
+            descriptions,
+            template="(%s::bigint, %s)",
+        )
+
+    # 태그가 빈 결과(설명만 생성)는 기존 태그를 유지 — 교체는 새 태그가 있는 코스만
+    retagged = sorted(route_id for route_id, route_slugs in slugs_by_route.items() if route_slugs)
+    if retagged:
+        cur.execute("DELETE FROM route_tags WHERE route_id = ANY(%s)", (retagged,))
+        rows = [(route_id, tag_ids[slug]) for route_id in retagged for slug in slugs_by_route[route_id]]
+        execute_values(cur, "INSERT INTO route_tags (route_id, tag_id) VALUES %s ON CONFLICT DO NOTHING", rows)
+
+    for route_id in retagged:
+        status, old_tag_ids = before[route_id]
+        new_tag_ids = [tag_ids[slug] for slug in slugs_by_route[route_id]]
+        tag_popularity.apply_route_change(cur, (status, old_tag_ids), (status, new_tag_ids))
@@ -0,0 +1,122 @@
+"""
+자동 태그/설명 결과 캐시 (Postgres auto_tag_cache)
+
+같은 코스로 "자동 태그"를 다시 누르거나 사소한 수정 후 재생성할 때 Gemini를 다시 부르지 않도록
+프롬프트 입력을 정규화한 해시 + 모델명을 키로 결과(JSON)를 보관.
+- 정규화: 통계는 반올림(고도 10m, 노면/경사 비율 1%, 좌표 ~100m), POI는 이름·유형·우선순위·거리 구간 집합,
+  기존 태그 목록은 내용 해시(tags_version). 프롬프트 문구를 바꾸면 PROMPT_VERSION을 올릴 것
+- TTL: AUTO_TAG_CACHE_TTL (기본 7일), 만료 행은 기록 시 정리
+- bypass: generate_tags_and_description(..., use_cache=False) / POST /api/routes/auto-tag?refresh=true
+  (새 결과로 캐시를 덮어씀). AUTO_TAG_CACHE_ENABLED=0 이면 전체 비활성
+캐시 조회/기록 실패는 무시하고 Gemini 호출로 진행 (호출자 커넥션과 분리된 커넥션 사용)
+"""
+
+import hashlib
+import json
+import os
+from typing import Optional
+
+from psycopg2.extras import Json
+
+from app.core.database import get_db_conn
+from metrics import registry
+
+PROMPT_VERSION = 1
+AUTO_TAG_CACHE_ENABLED = os.getenv("AUTO_TAG_CACHE_ENABLED", "1") not in ("0", "false", "False")
+AUTO_TAG_CACHE_TTL = int(os.getenv("AUTO_TAG_CACHE_TTL", 7 * 24 * 3600))  # 초
+
+CACHE_LOOKUPS = registry.counter(
+    "auto_tag_cache_total", "Auto-tag result cache lookups", ("result",))  # hit / miss / bypass / error
+
+
+def _round_to(value, step: float):
+    return round(round((value or 0) / step) * step, 1)
+
+
+def _round_point(point: Optional[dict]):
+    if not point: return None
+    return [round(point["lat"], 3), round(point["lon"], 3)]
+
+
+def _distance_band(distance_m: float) -> str:
+    """프롬프트의 인접/인근/주변 구분과 같은 경계"""
+    if distance_m <= 50: return "adjacent"
+    if distance_m <= 200: return "near"
+    return "around"
+
+
+def tags_version(existing_tags: list[str]) -> str:
+    return hashlib.sha1("\n".join(sorted(existing_tags)).encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_inputs(context: dict, existing_tags: list[str]) -> dict:
+    """_extract_route_context 결과 중 결과에 영향을 주는 값만, 사소한 차이는 반올림으로 흡수"""
+    pois = sorted(
+        [
+            p["name"],
+            ",".join(p["type"]) if isinstance(p["type"], list) else str(p["type"]),
+            p.get("priority", "route"),
+            _distance_band(p.get("distance_m", 0)),
+            round(p.get("dist_from_start_m", 0) / 1000),
+        ]
+        for p in context.get("nearby_pois", [])
+    )
+    return {
+        "prompt_version": PROMPT_VERSION,
+        "distance_km": round(context["distance_km"], 1),
+        "elevation_gain_m": _round_to(context["elevation_gain_m"], 10),
+        "elevation_loss_m": _round_to(context["elevation_loss_m"], 10),
+        "ele_min_m": _round_to(context["ele_min_m"], 10),
+        "ele_max_m": _round_to(context["ele_max_m"], 10),
+        "surface_pct": {k: round(v) for k, v in sorted(context["surface_pct"].items()) if round(v) > 0},
+        "steep_pct": round(context["steep_pct"]),
+        "flat_pct": round(context["flat_pct"]),
+        "start": _round_point(context.get("start")),
+        "end": _round_point(context.get("end")),
+        "course_type": context["course_type"],
+        "difficulty": context["difficulty"],
+        "is_loop": bool(context["is_loop"]),
+        "pois": pois,
+        "tags_version": tags_version(existing_tags),
+    }
+
+
+def cache_key(context: dict, existing_tags: list[str], model: str) -> str:
+    payload = json.dumps(normalize_inputs(context, existing_tags), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(f"{model}\n{payload}".encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[dict]:
+    try:
+        with get_db_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT result FROM auto_tag_cache WHERE cache_key = %s AND expires_at > CURRENT_TIMESTAMP",
+                    (key,),
+                )
+                row = cur.fetchone()
+    except Exception as e:
+        CACHE_LOOKUPS.inc(result="error")
+        print(f"[AutoTag Cache] lookup error: {e}")
+        return None
+    CACHE_LOOKUPS.inc(result="hit" if row else "miss")
+    return row["result"] if row else None
+
+
+def put(key: str, model: str, result: dict) -> None:
+    try:
+        with get_db_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM auto_tag_cache WHERE expires_at <= CURRENT_TIMESTAMP")
+                cur.execute(
+                    """
+                    INSERT INTO auto_tag_cache (cache_key, model, result, expires_at)
+                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+                    ON CONFLICT (cache_key) DO UPDATE
+                        SET result = EXCLUDED.result, created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+                    """,
+                    (key, model, Json(result), AUTO_TAG_CACHE_TTL),
+                )
+            conn.commit()
+    except Exception as e:
+        print(f"[AutoTag Cache] write error: {e}")
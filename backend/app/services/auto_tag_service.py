@@ -8,9 +8,16 @@
 
 import os
 import json
+import numpy as np
 from google import genai
 from google.genai import types
 
+from app.services import auto_tag_cache
+from app.services.waypoint_index import Polyline, waypoint_index
+from metrics import registry
+
+AUTO_TAG_MODEL = os.getenv("AUTO_TAG_MODEL", "gemini-3.1-flash-lite-preview")
+
 _client = None
 
 def _get_client():
@@ -20,6 +27,44 @@ def _get_client():
     return _client
 
 
+def classify_course(distance_km: float, elevation_gain: float) -> tuple[str, str]:
+    """거리/획득고도로 (코스 성격, 난이도) 판단. 자동 태그 프롬프트와 코스 임베딩 문서에서 공통 사용"""
+    # 코스 성격 판단 (획득고도/km 기준)
+    gain_per_km = elevation_gain / distance_km if distance_km > 0 else 0
+    if gain_per_km < 5:
+        course_type = "평지 코스"
+    elif gain_per_km < 12:
+        course_type = "완만한 업다운 코스"
+    elif gain_per_km < 18:
+        course_type = "힐리한 코스"
+    else:
+        course_type = "본격 클라이밍 코스"
+
+    # 난이도 판단 (거리 점수 + 고도 점수 합산)
+    # 거리 점수: 0~30km=1, 30~60=2, 60~100=3, 100+=4
+    if distance_km < 30: dist_score = 1
+    elif distance_km < 60: dist_score = 2
+    elif distance_km < 100: dist_score = 3
+    else: dist_score = 4
+
+    # 고도 점수: gain_per_km 기준 0~5=0, 5~12=1, 12~18=2, 18+=3
+    if gain_per_km < 5: climb_score = 0
+    elif gain_per_km < 12: climb_score = 1
+    elif gain_per_km < 18: climb_score = 2
+    else: climb_score = 3
+
+    total_score = dist_score + climb_score  # 1~7
+    if total_score <= 2:
+        difficulty = "초급"
+    elif total_score <= 4:
+        difficulty = "중급"
+    elif total_score <= 5:
+        difficulty = "중상급"
+    else:
+        difficulty = "상급"
+    return course_type, difficulty
+
+
 def _extract_route_context(full_data: dict, nearby_waypoints: list[dict]) -> dict:
     """코스 데이터에서 Gemini 프롬프트용 컨텍스트 추출."""
     stats = full_data.get("stats", {})
@@ -61,39 +106,7 @@ def _extract_route_context(full_data: dict, nearby_waypoints: list[dict]) -> dic
     flat_pct = round(flat_segments / total_segs * 100, 1)
     steep_pct = round(steep_segments / total_segs * 100, 1)
 
-    # 코스 성격 판단 (획득고도/km 기준)
-    gain_per_km = elevation_gain / distance_km if distance_km > 0 else 0
-    if gain_per_km < 5:
-        course_type = "평지 코스"
-    elif gain_per_km < 12:
-        course_type = "완만한 업다운 코스"
-    elif gain_per_km < 18:
-        course_type = "힐리한 코스"
-    else:
-        course_type = "본격 클라이밍 코스"
-
-    # 난이도 판단 (거리 점수 + 고도 점수 합산)
-    # 거리 점수: 0~30km=1, 30~60=2, 60~100=3, 100+=4
-    if distance_km < 30: dist_score = 1
-    elif distance_km < 60: dist_score = 2
-    elif distance_km < 100: dist_score = 3
-    else: dist_score = 4
-
-    # 고도 점수: gain_per_km 기준 0~5=0, 5~12=1, 12~18=2, 18+=3
-    if gain_per_km < 5: climb_score = 0
-    elif gain_per_km < 12: climb_score = 1
-    elif gain_per_km < 18: climb_score = 2
-    else: climb_score = 3
-
-    total_score = dist_score + climb_score  # 1~7
-    if total_score <= 2:
-        difficulty = "초급"
-    elif total_score <= 4:
-        difficulty = "중급"
-    elif total_score <= 5:
-        difficulty = "중상급"
-    else:
-        difficulty = "상급"
+    course_type, difficulty = classify_course(distance_km, elevation_gain)
 
     # 순환 여부
     if start and end:
@@ -238,97 +251,152 @@ def _build_prompt(context: dict, existing_tags: list[str]) -> str:
 ```"""
 
 
-def _get_waypoints_along_route(conn, route_line_wkt: str, radius_m: int = 500) -> list[dict]:
-    """경로 선(LineString)을 따라 radius_m 이내의 waypoints 검색 및 코스 상 위치 계산."""
+WAYPOINT_LOOKUPS = registry.counter(
+    "auto_tag_waypoint_lookups_total", "Auto-tag POI lookups by backend (index / postgis)", ("backend",))
+
+# 우선순위가 높은 버킷부터 (같은 waypoint가 여러 버킷에 걸리면 가장 앞 버킷 하나로)
+PRIORITY_RANK = {"start": 0, "end": 1, "control_point": 2, "route": 3}
+METERS_PER_DEGREE_LAT = 110574  # 위도 1도 최소 길이 → 도 단위 반경을 넉넉하게 (인덱스 1차 필터용)
+
+_WAYPOINTS_SQL = """
+    WITH lines AS (
+        SELECT l.key, g.geom, l.radius_m,
+               ST_Length(g.geom::geography) AS length_m,
+               l.radius_m / (%(m_per_deg)s * cos(radians(GREATEST(abs(ST_YMin(g.geom)), abs(ST_YMax(g.geom)))))) AS radius_deg
+        FROM unnest(%(line_keys)s::bigint[], %(wkts)s::text[], %(line_radii)s::float8[]) AS l(key, wkt, radius_m)
+        CROSS JOIN LATERAL (SELECT ST_GeomFromText(l.wkt, 4326) AS geom) g
+    ),
+    probes AS (
+        SELECT p.key, p.seq, p.rank, p.radius_m,
+               ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326) AS geom,
+               p.radius_m / (%(m_per_deg)s * cos(radians(abs(p.lat)))) AS radius_deg
+        FROM unnest(%(keys)s::bigint[], %(lons)s::float8[], %(lats)s::float8[], %(radii)s::float8[], %(ranks)s::int[])
+             WITH ORDINALITY AS p(key, lon, lat, radius_m, rank, seq)
+    ),
+    hits AS (
+        -- geometry ST_DWithin(도 단위)으로 idx_waypoints_location 후보를 먼저 좁히고 geography로 정확히 재확인
+        SELECT p.key, w.id, p.rank, p.seq, ST_Distance(w.location::geography, p.geom::geography) AS distance_m
+        FROM probes p
+        JOIN waypoints w ON ST_DWithin(w.location, p.geom, p.radius_deg)
+                        AND ST_DWithin(w.location::geography, p.geom::geography, p.radius_m)
+        UNION ALL
+        SELECT l.key, w.id, %(route_rank)s, 0, ST_Distance(w.location::geography, l.geom::geography)
+        FROM lines l
+        JOIN waypoints w ON ST_DWithin(w.location, l.geom, l.radius_deg)
+                        AND ST_DWithin(w.location::geography, l.geom::geography, l.radius_m)
+    ),
+    best AS (
+        SELECT DISTINCT ON (key, id) key, id, rank, seq, distance_m
+        FROM hits
+        ORDER BY key, id, rank, seq, distance_m
+    )
+    SELECT b.key, w.id, w.name, w.type::text[] AS type, w.description, b.rank, b.distance_m,
+           ST_LineLocatePoint(l.geom, w.location) * l.length_m AS dist_from_start_m
+    FROM best b
+    JOIN waypoints w ON w.id = b.id
+    LEFT JOIN lines l ON l.key = b.key
+    ORDER BY b.key, b.rank, b.seq, b.distance_m
+"""
+
+
+def _find_waypoints_in_index(index, requests: dict) -> dict:
+    """_WAYPOINTS_SQL과 같은 규칙(버킷 우선순위 → 포인트 순서 → 거리, waypoint당 버킷 하나)을 인메모리 인덱스로"""
+    results = {}
+    for key, (points, route_line_wkt, route_radius_m) in requests.items():
+        line = Polyline.from_wkt(route_line_wkt) if route_line_wkt else None
+        best = {}  # index 위치 → (rank, seq, distance_m)
+        for seq, p in enumerate(points, 1):
+            rank = PRIORITY_RANK[p["priority"]]
+            for i, d in zip(*index.near_point(float(p["lat"]), float(p["lon"]), float(p["radius_m"]))):
+                if (rank, seq, d) < best.get(i, (99, 0, 0)): best[i] = (rank, seq, d)
+        if line is not None and route_radius_m:
+            rank = PRIORITY_RANK["route"]
+            idx, dists, _ = index.near_line(line, float(route_radius_m))
+            for i, d in zip(idx, dists):
+                if (rank, 0, d) < best.get(i, (99, 0, 0)): best[i] = (rank, 0, d)
+
+        hits = sorted(best.items(), key=lambda item: item[1])
+        positions = np.fromiter((i for i, _ in hits), dtype=np.int64, count=len(hits))
+        along = index.locate(line, positions) if line is not None else np.zeros(len(hits))
+        names = {rank: name for name, rank in PRIORITY_RANK.items()}
+        results[key] = [
+            {"id": index.rows[i]["id"], "name": index.rows[i]["name"], "type": index.rows[i]["type"],
+             "description": index.rows[i]["description"], "distance_m": round(float(d)),
+             "dist_from_start_m": round(float(a)), "priority": names[rank]}
+            for (i, (rank, _, d)), a in zip(hits, along)
+        ]
+    return results
+
+
+def _find_waypoints_bulk(conn, requests: dict) -> dict:
+    """여러 코스의 waypoint 검색을 한 번에 (배치 자동 태그용).
+
+    requests: {key(int): (points, route_line_wkt, route_radius_m)} — 인자 의미는 _find_waypoints와 동일
+    반환: {key: [waypoint, ...]} (키별 정렬/중복 제거 규칙도 _find_waypoints와 동일)
+    인메모리 인덱스(waypoint_index)가 있으면 DB를 거치지 않고, 없으면 PostGIS 쿼리 한 번
+    """
+    index = waypoint_index.get()
+    if index is not None:
+        WAYPOINT_LOOKUPS.inc(backend="index")
+        return _find_waypoints_in_index(index, requests)
+    WAYPOINT_LOOKUPS.inc(backend="postgis")
+
+    results = {key: [] for key in requests}
+    line_keys, wkts, line_radii = [], [], []
+    keys, lons, lats, radii, ranks = [], [], [], [], []
+    for key, (points, route_line_wkt, route_radius_m) in requests.items():
+        if route_line_wkt:
+            line_keys.append(key)
+            wkts.append(route_line_wkt)
+            line_radii.append(float(route_radius_m) if route_radius_m else None)
+        for p in points:
+            keys.append(key)
+            lons.append(float(p["lon"]))
+            lats.append(float(p["lat"]))
+            radii.append(float(p["radius_m"]))
+            ranks.append(PRIORITY_RANK[p["priority"]])
+    if not keys and not any(r is not None for r in line_radii): return results
+
+    names = {rank: name for name, rank in PRIORITY_RANK.items()}
     cur = conn.cursor()
-    cur.execute("""
-        SELECT id, name, type::text[], description,
-               ST_Distance(
-                   location::geography,
-                   ST_GeomFromText(%s, 4326)::geography
-               ) as distance_m,
-               (ST_LineLocatePoint(
-                   ST_GeomFromText(%s, 4326),
-                   location::geometry
-               ) * ST_Length(ST_GeomFromText(%s, 4326)::geography)) as dist_from_start_m
-        FROM waypoints
-        WHERE ST_DWithin(
-            location::geography,
-            ST_GeomFromText(%s, 4326)::geography,
-            %s
-        )
-        ORDER BY distance_m
-    """, (route_line_wkt, route_line_wkt, route_line_wkt, route_line_wkt, radius_m))
+    cur.execute(_WAYPOINTS_SQL, {
+        "line_keys": line_keys, "wkts": wkts, "line_radii": line_radii,
+        "route_rank": PRIORITY_RANK["route"],
+        "m_per_deg": METERS_PER_DEGREE_LAT,
+        "keys": keys, "lons": lons, "lats": lats, "radii": radii, "ranks": ranks,
+    })
     rows = cur.fetchall()
     cur.close()
-    return [
-        {"id": r["id"], "name": r["name"], "type": r["type"],
-         "description": r["description"], "distance_m": round(r["distance_m"]),
-         "dist_from_start_m": round(r["dist_from_start_m"]) if r["dist_from_start_m"] is not None else 0,
-         "priority": "route"}
-        for r in rows
-    ]
+    for r in rows:
+        results[r["key"]].append(
+            {"id": r["id"], "name": r["name"], "type": r["type"],
+             "description": r["description"], "distance_m": round(r["distance_m"]),
+             "dist_from_start_m": round(r["dist_from_start_m"]) if r["dist_from_start_m"] is not None else 0,
+             "priority": names[r["rank"]]}
+        )
+    return results
 
 
-def _get_waypoints_near_control_points(conn, control_points: list[dict], route_line_wkt: str | None = None, radius_m: int = 200) -> list[dict]:
-    """사용자가 직접 찍은 포인트(control points) 인근 waypoints 검색. 코스 상 위치 계산 포함."""
-    if not control_points:
-        return []
+def _find_waypoints(conn, points: list[dict], route_line_wkt: str | None = None, route_radius_m: int | None = None) -> list[dict]:
+    """포인트별 반경 검색 + 경로 선 따라 검색을 한 번의 쿼리로.
 
-    results = []
-    seen_ids = set()
-    cur = conn.cursor()
+    points: [{"lat", "lon", "radius_m", "priority"}] (priority는 PRIORITY_RANK 키)
+    route_radius_m: 지정 시 route_line_wkt 선에서 이 거리 이내도 "route" 버킷으로 포함
+    경로 길이/선은 쿼리 안에서 한 번만 계산하고, waypoint별로 우선순위가 가장 높은 버킷 하나만 남김.
+    정렬: 버킷 우선순위 → 포인트 순서 → 거리 (기존 버킷별 쿼리 후 병합한 순서와 동일)
+    """
+    return _find_waypoints_bulk(conn, {0: (points, route_line_wkt, route_radius_m)})[0]
 
-    for cp in control_points:
-        lat, lon = cp["lat"], cp["lon"]
-        if route_line_wkt:
-            cur.execute("""
-                SELECT id, name, type::text[], description,
-                       ST_Distance(
-                           location::geography,
-                           ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography
-                       ) as distance_m,
-                       (ST_LineLocatePoint(
-                           ST_GeomFromText(%s, 4326),
-                           location::geometry
-                       ) * ST_Length(ST_GeomFromText(%s, 4326)::geography)) as dist_from_start_m
-                FROM waypoints
-                WHERE ST_DWithin(
-                    location::geography,
-                    ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
-                    %s
-                )
-                ORDER BY distance_m
-            """, (lon, lat, route_line_wkt, route_line_wkt, lon, lat, radius_m))
-        else:
-            cur.execute("""
-                SELECT id, name, type::text[], description,
-                       ST_Distance(
-                           location::geography,
-                           ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography
-                       ) as distance_m,
-                       0 as dist_from_start_m
-                FROM waypoints
-                WHERE ST_DWithin(
-                    location::geography,
-                    ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
-                    %s
-                )
-                ORDER BY distance_m
-            """, (lon, lat, lon, lat, radius_m))
-
-        for r in cur.fetchall():
-            if r["id"] not in seen_ids:
-                seen_ids.add(r["id"])
-                results.append({
-                    "id": r["id"], "name": r["name"], "type": r["type"],
-                    "description": r["description"], "distance_m": round(r["distance_m"]),
-                    "dist_from_start_m": round(r["dist_from_start_m"]) if r["dist_from_start_m"] is not None else 0,
-                    "priority": "control_point"
-                })
 
-    cur.close()
-    return results
+def _get_waypoints_along_route(conn, route_line_wkt: str, radius_m: int = 500) -> list[dict]:
+    """경로 선(LineString)을 따라 radius_m 이내의 waypoints 검색 및 코스 상 위치 계산."""
+    return _find_waypoints(conn, [], route_line_wkt, route_radius_m=radius_m)
+
+
+def _get_waypoints_near_control_points(conn, control_points: list[dict], route_line_wkt: str | None = None, radius_m: int = 200) -> list[dict]:
+    """사용자가 직접 찍은 포인트(control points) 인근 waypoints 검색. 코스 상 위치 계산 포함."""
+    points = [{"lat": cp["lat"], "lon": cp["lon"], "radius_m": radius_m, "priority": "control_point"} for cp in control_points]
+    return _find_waypoints(conn, points, route_line_wkt)
 
 
 def _extract_control_points(full_data: dict) -> list[dict]:
@@ -370,7 +438,22 @@ def get_existing_tags(conn) -> list[str]:
     return tags
 
 
-def generate_tags_and_description(conn, full_data: dict) -> dict:
+def route_probes(full_data: dict) -> tuple[list[dict], str | None]:
+    """_find_waypoints 인자: 출발지/도착지 (200m), control points (200m) 포인트 목록과 경로 선 WKT"""
+    lats = full_data.get("points", {}).get("lat", [])
+    lons = full_data.get("points", {}).get("lon", [])
+    if not lats: return [], None
+    points = [
+        {"lat": lats[0], "lon": lons[0], "radius_m": 200, "priority": "start"},
+        {"lat": lats[-1], "lon": lons[-1], "radius_m": 200, "priority": "end"},
+    ] + [
+        {"lat": cp["lat"], "lon": cp["lon"], "radius_m": 200, "priority": "control_point"}
+        for cp in _extract_control_points(full_data)
+    ]
+    return points, _build_route_line_wkt(full_data)
+
+
+def generate_tags_and_description(conn, full_data: dict, use_cache: bool = True) -> dict:
     """
     코스 데이터로 태그와 설명 자동 생성.
 
@@ -380,51 +463,48 @@ def generate_tags_and_description(conn, full_data: dict) -> dict:
     3. 경로 선(LineString)을 따라 500m 이내 웨이포인트
     4. 합쳐서 중복 제거, 우선순위 순 정렬
 
+    같은 입력(정규화 후)이면 auto_tag_cache 결과 재사용. use_cache=False면 새로 생성해서 캐시 갱신.
+
     Returns:
         {"tags": ["태그1", ...], "description": "코스 설명"}
     """
-    lats = full_data.get("points", {}).get("lat", [])
-    lons = full_data.get("points", {}).get("lon", [])
-    if not lats:
+    points, route_wkt = route_probes(full_data)
+    if not points:
         return {"tags": [], "description": ""}
 
-    route_wkt = _build_route_line_wkt(full_data)
-
-    # 1. 출발지 / 도착지 인근 웨이포인트 (200m)
-    start_point = [{"lat": lats[0], "lon": lons[0]}]
-    end_point = [{"lat": lats[-1], "lon": lons[-1]}]
-    
-    start_pois = _get_waypoints_near_control_points(conn, start_point, route_wkt, radius_m=200)
-    for p in start_pois: p["priority"] = "start"
-    
-    end_pois = _get_waypoints_near_control_points(conn, end_point, route_wkt, radius_m=200)
-    for p in end_pois: p["priority"] = "end"
-
-    # 2. Control points 인근 웨이포인트 (200m)
-    control_points = _extract_control_points(full_data)
-    cp_pois = _get_waypoints_near_control_points(conn, control_points, route_wkt, radius_m=200)
-    for p in cp_pois: p["priority"] = "control_point"
-
-    # 3. 경로 선 따라 웨이포인트 검색 (500m)
-    route_pois = _get_waypoints_along_route(conn, route_wkt, radius_m=500) if route_wkt else []
-    for p in route_pois: p["priority"] = "route"
-
-    # 4. 합치기: start/end -> control_point -> route 우선, 중복 제거
-    seen_ids = set()
-    merged = []
-    
-    for wp in start_pois + end_pois + cp_pois + route_pois:
-        if wp["id"] not in seen_ids:
-            seen_ids.add(wp["id"])
-            merged.append(wp)
-
-    existing_tags = get_existing_tags(conn)
-    context = _extract_route_context(full_data, merged)
+    # 한 쿼리에서 검색 + start/end -> control_point -> route 우선으로 중복 제거
+    merged = _find_waypoints(conn, points, route_wkt, route_radius_m=500)
+    return generate_from_waypoints(full_data, merged, get_existing_tags(conn), use_cache)
+
+
+def cached_from_waypoints(full_data: dict, waypoints: list[dict], existing_tags: list[str]) -> dict | None:
+    """auto_tag_cache만 확인 (Gemini 호출 없음). 배치 실행기가 속도 제한 토큰을 받기 전에 사용"""
+    if not auto_tag_cache.AUTO_TAG_CACHE_ENABLED: return None
+    context = _extract_route_context(full_data, waypoints)
+    return auto_tag_cache.get(auto_tag_cache.cache_key(context, existing_tags, AUTO_TAG_MODEL))
+
+
+def generate_from_waypoints(full_data: dict, waypoints: list[dict], existing_tags: list[str], use_cache: bool = True,
+                            cache_checked: bool = False) -> dict:
+    """waypoint 검색/기존 태그 조회가 끝난 뒤 단계 (캐시 → Gemini). DB 커넥션을 잡지 않으므로
+    배치 실행기(auto_tag_batch)가 페이지 단위로 한꺼번에 검색한 결과를 넘겨 병렬 호출.
+    cache_checked: 호출자가 이미 cached_from_waypoints로 미스를 확인함 → 조회 생략 (결과 기록은 함)"""
+    context = _extract_route_context(full_data, waypoints)
+
+    cache_key = None
+    if auto_tag_cache.AUTO_TAG_CACHE_ENABLED:
+        cache_key = auto_tag_cache.cache_key(context, existing_tags, AUTO_TAG_MODEL)
+        if not use_cache:
+            auto_tag_cache.CACHE_LOOKUPS.inc(result="bypass")
+        elif not cache_checked:
+            cached = auto_tag_cache.get(cache_key)
+            if cached is not None: return cached
+
     prompt = _build_prompt(context, existing_tags)
 
     client = _get_client()
     response = client.models.generate_content(
-        model="gemini-3.1-flash-lite-preview",
+        model=AUTO_TAG_MODEL,
         contents=prompt,
         config=types.GenerateContentConfig(
             temperature=0.3,
@@ -437,6 +517,9 @@ def generate_tags_and_description(conn, full_data: dict) -> dict:
         tags = [t.strip().lower() for t in result.get("tags", []) if t.strip()]
         description = result.get("description", "").strip()
         title = result.get("title", "").strip()
-        return {"tags": tags, "description": description, "title": title}
     except (json.JSONDecodeError, AttributeError):
         return {"tags": [], "description": "", "title": ""}
+
+    result = {"tags": tags, "description": description, "title": title}
+    if cache_key and (tags or description): auto_tag_cache.put(cache_key, AUTO_TAG_MODEL, result)
+    return result
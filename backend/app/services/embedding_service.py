@@ -1,5 +1,33 @@
+"""
+검색어 임베딩 (gemini-embedding-001, 3072차원) + 2단계 캐시
+
+L1: 프로세스 내 LRU. float16 NumPy 배열(6KB/개)로 보관, EMBEDDING_CACHE_SIZE개 상한 (기본 2000개 ≈ 12MB)
+L2: Postgres search_query_cache (halfvec). 조회는 halfvec_send()로 binary 전송 → 문자열 파싱 없음
+미스 시 Gemini 호출 후 L1에 즉시 넣고, L2 쓰기는 백그라운드 스레드에서 모아서 한 번에 INSERT
+"""
+
+import atexit
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from psycopg2.extras import execute_values
+
 from app.core.database import get_db_conn
+from metrics import registry
+
+EMBEDDING_MODEL = "gemini-embedding-001"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 2000))
+WRITE_BATCH_SIZE = int(os.getenv("EMBEDDING_CACHE_WRITE_BATCH", 50))
+WRITE_FLUSH_INTERVAL = float(os.getenv("EMBEDDING_CACHE_WRITE_INTERVAL", 0.5))  # 초
+
+CACHE_LOOKUPS = registry.counter(
+    "embedding_cache_lookups_total", "Query embedding cache lookups", ("tier", "result"))
+CACHE_WRITES = registry.counter(
+    "embedding_cache_writes_total", "search_query_cache rows written by the write-behind queue", ("result",))
 
 _client = None
 
@@ -14,53 +42,189 @@ def _get_client():
         )
     return _client
 
-def query_cache(text: str) -> list[float] | None:
+
+def to_halfvec_literal(values) -> str:
+    """halfvec 입력용 텍스트 '[v1,v2,...]' (list / NumPy 배열 공통)"""
+    return "[" + ",".join(map(str, np.asarray(values, dtype=np.float32).tolist())) + "]"
+
+
+def mrl_truncate(values, dim: int) -> np.ndarray:
+    """Matryoshka 축소: 앞 dim개만 남기고 L2 정규화 (gemini-embedding-001은 축소 시 정규화되지 않음)"""
+    vec = np.asarray(values, dtype=np.float32)[:dim]
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm > 0 else vec
+
+
+def _decode_halfvec(buf) -> np.ndarray:
+    """halfvec_send() 결과: int16 dim, int16 unused, big-endian float16 * dim"""
+    return np.frombuffer(buf, dtype=">f2", offset=4).astype(np.float16)
+
+
+class EmbeddingLRU:
+    """텍스트 → float16 배열 LRU (thread-safe). 배열은 공유되므로 read-only로 저장"""
+    def __init__(self, maxsize: int = EMBEDDING_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str):
+        with self._lock:
+            arr = self._data.get(text)
+            if arr is not None: self._data.move_to_end(text)
+            return arr
+
+    def put(self, text: str, values) -> np.ndarray:
+        arr = np.asarray(values, dtype=np.float16)
+        arr.flags.writeable = False
+        if self.maxsize <= 0: return arr
+        with self._lock:
+            self._data[text] = arr
+            self._data.move_to_end(text)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return arr
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "bytes": sum(a.nbytes for a in self._data.values())}
+
+
+class _CacheWriter:
+    """search_query_cache write-behind. WRITE_FLUSH_INTERVAL 동안 모인 항목을 한 번의 INSERT로 기록"""
+    def __init__(self):
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._held = None  # 모으는 중인 첫 항목 (종료 시 flush가 함께 기록, 중복은 ON CONFLICT로 무시)
+
+    def submit(self, text: str, values) -> None:
+        self._ensure_started()
+        self._queue.put((text, values))
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-cache-writer", daemon=True)
+                self._thread.start()
+
+    def _drain(self, first=None) -> dict:
+        batch = {}
+        if first is not None: batch[first[0]] = first[1]
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                text, values = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch[text] = values
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            self._held = self._queue.get()
+            time.sleep(WRITE_FLUSH_INTERVAL)  # 짧은 시간 모아서 한 번에
+            batch = self._drain(self._held)
+            self._held = None
+            self.write(batch)
+
+    def flush(self) -> None:
+        """남은 항목을 호출 스레드에서 바로 기록 (프로세스 종료 시)"""
+        held = self._held
+        while held is not None or not self._queue.empty():
+            self.write(self._drain(held))
+            held = None
+
+    def write(self, batch: dict) -> None:
+        if not batch: return
+        try:
+            with get_db_conn() as conn:
+                with conn.cursor() as cur:
+                    execute_values(
+                        cur,
+                        "INSERT INTO search_query_cache (query, embedding) VALUES %s ON CONFLICT (query) DO NOTHING",
+                        [(text, to_halfvec_literal(values)) for text, values in batch.items()],
+                        template="(%s, %s::halfvec)",
+                    )
+                conn.commit()
+            CACHE_WRITES.inc(len(batch), result="ok")
+        except Exception as e:
+            CACHE_WRITES.inc(len(batch), result="error")
+            print(f"[Embedding Cache] DB batch write error ({len(batch)} rows): {e}")
+
+
+memory_cache = EmbeddingLRU()
+_writer = _CacheWriter()
+atexit.register(_writer.flush)
+
+
+def _query_db(text: str):
     try:
         with get_db_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT embedding FROM search_query_cache WHERE query = %s", (text,))
+                cur.execute("SELECT halfvec_send(embedding) AS embedding FROM search_query_cache WHERE query = %s", (text,))
                 row = cur.fetchone()
-                if row and row['embedding']:
-                    emb_str = row['embedding']
-                    if isinstance(emb_str, str):
-                        emb_str = emb_str.strip('[]')
-                        return [float(x) for x in emb_str.split(',')]
-                    elif isinstance(emb_str, list):
-                        return emb_str
+                if row and row['embedding'] is not None:
+                    return _decode_halfvec(row['embedding'])
     except Exception as e:
         print(f"[Embedding Cache] DB query error: {e}")
     return None
 
+
+def query_cache(text: str) -> list[float] | None:
+    """L1 → L2 순서로 조회. L2 히트는 L1에 적재"""
+    arr = get_cached_array(text)
+    return arr.tolist() if arr is not None else None
+
+
+def get_cached_array(text: str):
+    arr = memory_cache.get(text)
+    if arr is not None:
+        CACHE_LOOKUPS.inc(tier="memory", result="hit")
+        return arr
+    CACHE_LOOKUPS.inc(tier="memory", result="miss")
+    arr = _query_db(text)
+    CACHE_LOOKUPS.inc(tier="db", result="hit" if arr is not None else "miss")
+    if arr is not None: arr = memory_cache.put(text, arr)
+    return arr
+
+
 def set_cache(text: str, embedding_values: list[float]):
-    try:
-        with get_db_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "INSERT INTO search_query_cache (query, embedding) VALUES (%s, %s::halfvec) ON CONFLICT (query) DO NOTHING",
-                    (text, str(embedding_values))
-                )
-            conn.commit()
-    except Exception as e:
-        print(f"[Embedding Cache] DB set error: {e}")
+    """L1 + L2 동기 기록 (스크립트용: 호출 직후 DB 반영이 필요할 때)"""
+    memory_cache.put(text, embedding_values)
+    _writer.write({text: embedding_values})
+
 
 def get_embedding(text: str) -> list[float]:
-    # 1. Try to get from cache
-    cached_emb = query_cache(text)
-    if cached_emb is not None:
+    # 1. Try to get from cache (memory → DB)
+    cached = get_cached_array(text)
+    if cached is not None:
         print(f"[Embedding Cache] HIT for '{text}'")
-        return cached_emb
+        return cached.tolist()
 
     print(f"[Embedding Cache] MISS for '{text}'. Calling Gemini API...")
 
     # 2. Fetch from Gemini API
     client = _get_client()
     result = client.models.embed_content(
-        model="gemini-embedding-001",
+        model=EMBEDDING_MODEL,
         contents=text,
     )
     embedding_values = result.embeddings[0].values
 
-    # 3. Save to cache
-    set_cache(text, embedding_values)
+    # 3. Save to cache (memory 즉시, DB는 write-behind)
+    memory_cache.put(text, embedding_values)
+    _writer.submit(text, embedding_values)
 
     return embedding_values
+
+
+def embed_documents(texts: list[str], dim: int) -> list[np.ndarray]:
+    """문서(코스 등) 여러 개를 한 번의 embed_content로 dim차원 임베딩 (검색어 캐시는 거치지 않음).
+    output_dimensionality로 받은 값도 mrl_truncate로 정규화해서 검색어 쪽 축소 벡터와 같은 공간에 둠"""
+    if not texts: return []
+    from google.genai import types
+    result = _get_client().models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=texts,
+        config=types.EmbedContentConfig(output_dimensionality=dim),
+    )
+    return [mrl_truncate(e.values, dim) for e in result.embeddings]
@@ -0,0 +1,213 @@
+"""
+검색어 / 태그 임베딩 백그라운드 워커 — 사용자 요청 경로에서 Gemini 임베딩 호출 제거
+
+대상 (pending)
+- 검색어: search_query_cache 미스. 요청은 lookup()으로 캐시만 보고, 미스는 큐에 넣은 뒤 텍스트 결과로 진행
+  (큐는 프로세스 메모리. 재시작으로 잃어도 다음 미스 때 다시 들어옴)
+- 태그: tags.embedding IS NULL. create_route는 임베딩 없이 태그를 만들고 schedule_tags()만 호출,
+  그 밖의 경로(자동 태그 배치 등)로 생긴 태그는 EMBED_WORKER_TAG_POLL마다 확인
+처리 (embed_pending)
+- 태그 slug가 이미 search_query_cache에 있으면 API 호출 없이 복사
+- 나머지는 EMBED_WORKER_BATCH개씩 multi-input embed_content 1회, EMBED_WORKER_CONCURRENCY개 동시,
+  토큰 버킷(EMBED_WORKER_RPM) + 지수 백오프 (app.core.rate_limit)
+- 배치마다 한 트랜잭션: search_query_cache multi-row INSERT + tags multi-row UPDATE ... FROM (VALUES ...)
+  → 같은 텍스트가 검색어이자 태그면 호출 한 번으로 둘 다 채움
+스크립트(embed_existing_tags.py, prefill_cache)는 embed_pending을 직접 동기 호출
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from app.core.database import get_db_conn
+from app.core.rate_limit import TokenBucket, call_with_backoff
+from app.services.embedding_service import embed_documents, get_cached_array, memory_cache, to_halfvec_literal
+from metrics import registry
+
+EMBED_WORKER_BATCH = int(os.getenv("EMBED_WORKER_BATCH", 50))               # embed_content 1회당 텍스트 수
+EMBED_WORKER_CONCURRENCY = int(os.getenv("EMBED_WORKER_CONCURRENCY", 2))    # 동시 호출 수 (DB_POOL_MAX 이하로)
+EMBED_WORKER_RPM = float(os.getenv("EMBED_WORKER_RPM", 120))                # 분당 embed_content 호출 상한
+EMBED_WORKER_DELAY = float(os.getenv("EMBED_WORKER_DELAY", 0.2))            # 초, 동시에 들어오는 미스를 모으는 시간
+EMBED_WORKER_TAG_POLL = float(os.getenv("EMBED_WORKER_TAG_POLL", 300))      # 초
+EMBED_WORKER_MAX_PENDING = int(os.getenv("EMBED_WORKER_MAX_PENDING", 1000))  # 넘치면 미스를 버림 (다음 미스 때 다시)
+EMBEDDING_DIM = 3072      # search_query_cache / tags halfvec(3072)
+MAX_QUERY_LENGTH = 255    # search_query_cache.query VARCHAR(255)
+
+EMBEDDED_TEXTS = registry.counter(
+    "embedding_worker_texts_total", "Texts handled by the batched embedding worker",
+    ("source", "result"))  # source: query / tag, result: embedded / copied / error
+EMBED_CALLS = registry.counter(
+    "embedding_worker_calls_total", "Multi-input embed_content calls from the embedding worker", ("result",))
+
+# 같은 텍스트로 이미 캐시된 검색어 임베딩을 태그에 복사 (API 호출 없음)
+_COPY_FROM_CACHE_SQL = """
+    UPDATE tags t SET embedding = c.embedding
+    FROM search_query_cache c
+    WHERE t.embedding IS NULL AND c.query = t.slug
+"""
+
+_PENDING_TAGS_SQL = "SELECT id, slug FROM tags WHERE embedding IS NULL ORDER BY id LIMIT %s"
+
+_CACHED_QUERIES_SQL = "SELECT query FROM search_query_cache WHERE query = ANY(%s)"
+
+_INSERT_CACHE_SQL = "INSERT INTO search_query_cache (query, embedding) VALUES %s ON CONFLICT (query) DO NOTHING"
+
+_UPDATE_TAGS_SQL = """
+    UPDATE tags t SET embedding = v.embedding::halfvec
+    FROM (VALUES %s) AS v(id, embedding)
+    WHERE t.id = v.id AND t.embedding IS NULL
+"""
+
+_bucket = TokenBucket(EMBED_WORKER_RPM / 60.0, burst=EMBED_WORKER_CONCURRENCY)
+
+
+def _write_batch(texts: list[str], vectors: list[np.ndarray], tag_ids: dict) -> None:
+    """배치 결과를 한 트랜잭션으로: 검색어 캐시 INSERT 1회 + 태그 UPDATE 1회"""
+    literals = [to_halfvec_literal(vec) for vec in vectors]
+    cache_rows = [(text, literal) for text, literal in zip(texts, literals) if len(text) <= MAX_QUERY_LENGTH]
+    tag_rows = [(tag_ids[text], literal) for text, literal in zip(texts, literals) if text in tag_ids]
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            if cache_rows:
+                execute_values(cur, _INSERT_CACHE_SQL, cache_rows, template="(%s, %s::halfvec)", page_size=len(cache_rows))
+            if tag_rows:
+                execute_values(cur, _UPDATE_TAGS_SQL, tag_rows, page_size=len(tag_rows))
+        conn.commit()
+
+
+def _embed_and_write(texts: list[str], tag_ids: dict) -> list[np.ndarray]:
+    try:
+        vectors = call_with_backoff(lambda: embed_documents(texts, EMBEDDING_DIM), _bucket)
+    except Exception:
+        EMBED_CALLS.inc(result="error")
+        raise
+    EMBED_CALLS.inc(result="ok")
+    _write_batch(texts, vectors, tag_ids)
+    return vectors
+
+
+def embed_pending(queries: Iterable[str] = (), tags: bool = True, tag_limit: Optional[int] = None,
+                  done: Optional[Callable[[list], None]] = None) -> dict:
+    """검색어(캐시에 없는 것만) + 임베딩 없는 태그를 배치로 임베딩해서 기록 (동기).
+    done(texts)는 배치가 끝날 때마다 (실패 포함) 호출. 반환: 결과별 건수"""
+    counts = {"cached": 0, "copied": 0, "embedded": 0, "error": 0}
+    queries = list(dict.fromkeys(q for q in queries if q))
+    tag_ids = {}
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            if tags:
+                cur.execute(_COPY_FROM_CACHE_SQL)
+                counts["copied"] = cur.rowcount
+                cur.execute(_PENDING_TAGS_SQL, (tag_limit,))
+                tag_ids = {row["slug"]: row["id"] for row in cur.fetchall()}
+            cached = set()
+            if queries:
+                cur.execute(_CACHED_QUERIES_SQL, (queries,))
+                cached = {row["query"] for row in cur.fetchall()}
+        conn.commit()  # API 호출 동안 트랜잭션을 열어두지 않음
+
+    counts["cached"] = len(cached)
+    if counts["copied"]: EMBEDDED_TEXTS.inc(counts["copied"], source="tag", result="copied")
+    if cached and done: done(sorted(cached))
+
+    texts = [q for q in queries if q not in cached]
+    queued = set(texts)
+    texts += [slug for slug in tag_ids if slug not in queued]
+    batches = [texts[i:i + EMBED_WORKER_BATCH] for i in range(0, len(texts), EMBED_WORKER_BATCH)]
+    if not batches: return counts
+
+    with ThreadPoolExecutor(max_workers=min(EMBED_WORKER_CONCURRENCY, len(batches))) as pool:
+        futures = {pool.submit(_embed_and_write, batch, tag_ids): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                vectors = future.result()
+                result = "embedded"
+                for text, vec in zip(batch, vectors):
+                    memory_cache.put(text, vec)
+            except Exception as e:
+                result = "error"
+                print(f"[Embedding Worker] batch error ({len(batch)} texts, first='{batch[0]}'): {e}")
+            counts[result] += len(batch)
+            n_tags = sum(1 for text in batch if text in tag_ids)
+            if n_tags: EMBEDDED_TEXTS.inc(n_tags, source="tag", result=result)
+            if len(batch) - n_tags: EMBEDDED_TEXTS.inc(len(batch) - n_tags, source="query", result=result)
+            if done: done(batch)
+    return counts
+
+
+class _EmbeddingWorker:
+    """검색어 미스 / 태그 백필을 모아 embed_pending으로 처리하는 백그라운드 스레드.
+    lookup(text, wait)는 캐시 히트면 바로, 미스면 큐에 넣고 최대 wait초만 배치 결과를 기다림"""
+    def __init__(self):
+        self._pending: "OrderedDict[str, threading.Event]" = OrderedDict()
+        self._inflight: dict = {}
+        self._tags_due = True  # 시작 직후 한 번 확인
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="embedding-worker", daemon=True)
+            self._thread.start()
+
+    def submit(self, text: str) -> Optional[threading.Event]:
+        """임베딩 요청. 배치가 끝나면 set되는 Event (큐가 가득 차면 None)"""
+        with self._lock:
+            self._ensure_started()
+            event = self._pending.get(text) or self._inflight.get(text)
+            if event is None:
+                if len(self._pending) >= EMBED_WORKER_MAX_PENDING: return None
+                event = self._pending[text] = threading.Event()
+        self._wake.set()
+        return event
+
+    def schedule_tags(self) -> None:
+        """임베딩 없는 태그가 생겼음을 알림 (create_route 커밋 후)"""
+        with self._lock:
+            self._ensure_started()
+            self._tags_due = True
+        self._wake.set()
+
+    def lookup(self, text: str, wait: float = 0.0) -> Optional[np.ndarray]:
+        """캐시(L1 → L2)에 있으면 3072차원 배열, 없으면 큐에 넣고 wait초 안에 끝나면 결과, 아니면 None"""
+        arr = get_cached_array(text)
+        if arr is not None: return arr
+        event = self.submit(text)
+        if event is None or wait <= 0 or not event.wait(wait): return None
+        return get_cached_array(text)
+
+    def _resolve(self, texts: list) -> None:
+        with self._lock:
+            events = [self._inflight.pop(text, None) for text in texts]
+        for event in events:
+            if event is not None: event.set()
+
+    def _run(self) -> None:
+        while True:
+            timed_out = not self._wake.wait(EMBED_WORKER_TAG_POLL)
+            time.sleep(EMBED_WORKER_DELAY)
+            with self._lock:
+                self._wake.clear()
+                batch, self._pending = self._pending, OrderedDict()
+                self._inflight.update(batch)
+                tags, self._tags_due = self._tags_due or timed_out, False
+            if not batch and not tags: continue
+            try:
+                counts = embed_pending(batch.keys(), tags=tags, done=self._resolve)
+                if counts["copied"] or counts["embedded"] or counts["error"]:
+                    print(f"[Embedding Worker] {len(batch)} queries, tags={tags}: {counts}")
+            except Exception as e:
+                print(f"[Embedding Worker] error ({len(batch)} queries, tags={tags}): {e}")
+            finally:
+                self._resolve(list(batch))  # 실패한 항목도 대기 해제
+
+
+embedding_worker = _EmbeddingWorker()
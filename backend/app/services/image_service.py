@@ -1,70 +1,51 @@
-import io
-from PIL import Image, ImageDraw
-from typing import List
-from app.core.storage import save_to_storage
-from app.models.common import Location
+import json
+from typing import Any, Dict, Optional, Sequence
+from app.core.storage import save_to_storage, load_from_storage, delete_from_storage
+from app.services.thumbnail_renderer import render_thumbnails, thumbnail_filename, THUMBNAIL_FORMAT, DEFAULT_SIZES, SAVE_SIZES
 
-def generate_thumbnail(locations: List[Location], route_uuid: str):
-    if not locations: return None
-    
-    # 1. Calculate Bounding Box from FULL data
-    lats_all = [loc.lat for loc in locations]
-    lons_all = [loc.lon for loc in locations]
-    min_lat, max_lat = min(lats_all), max(lats_all)
-    min_lon, max_lon = min(lons_all), max(lons_all)
-    
-    # 2. Downsample for drawing
-    step = max(1, len(locations) // 500)
-    sampled = locations[::step]
-    if len(sampled) > 0 and sampled[-1] != locations[-1]:
-        sampled.append(locations[-1])
-    
-    # 3. Setup Image (Ratio ~2.5:1 to match UI)
-    W, H = 600, 240
-    padding = 40 
-    img = Image.new('RGB', (W, H), color='#111827')
-    draw = ImageDraw.Draw(img)
-    
-    # 4. Calculate Range and Scale
-    lat_range = max_lat - min_lat
-    lon_range = max_lon - min_lon
-    
-    if lat_range < 0.00001: lat_range = 0.0001
-    if lon_range < 0.00001: lon_range = 0.0001
-    
-    # Fit inside (W-2*padding, H-2*padding)
-    scale_x = (W - 2 * padding) / lon_range
-    scale_y = (H - 2 * padding) / lat_range
-    scale = min(scale_x, scale_y)
-    
-    # Centering offsets
-    off_x = (W - lon_range * scale) / 2
-    off_y = (H - lat_range * scale) / 2
-    
-    # 5. Transform Points
-    points = []
-    for loc in sampled:
-        x = off_x + (loc.lon - min_lon) * scale
-        y = off_y + (max_lat - loc.lat) * scale # Flip Y (max_lat is top)
-        points.append((x, y))
-        
-    # 6. Draw
-    if len(points) > 1:
-        draw.line(points, fill='#2a9e92', width=5, joint='curve')
-        
-        # Start/End Markers
-        r = 5
-        # Start (Green)
-        sx, sy = points[0]
-        draw.ellipse((sx-r, sy-r, sx+r, sy+r), fill='#10B981', outline='white', width=1)
-        # End (Red)
-        ex, ey = points[-1]
-        draw.ellipse((ex-r, ey-r, ex+r, ey+r), fill='#EF4444', outline='white', width=1)
+def generate_thumbnail(points: Dict[str, Any], route_uuid: str,
+                       sizes: Sequence[str] = DEFAULT_SIZES,
+                       color_by_elevation: bool = False,
+                       replace: bool = False) -> Optional[str]:
+    """
+    Render thumbnails from the route's columnar `points` arrays (lat/lon/ele)
+    and store them. Returns the card thumbnail URL.
+    저장 요청 경로는 card만 렌더링. 나머지 사이즈는 render_missing_size가 첫 요청 때 생성.
+    replace: 같은 uuid로 덮어쓰는 저장 — 이전 코스로 그려진 나머지 사이즈를 지워서 다시 렌더링되게 함
+    """
+    if not points: return None
 
-    # 7. Save
-    img_byte_arr = io.BytesIO()
-    img.save(img_byte_arr, format='PNG')
-    img_bytes = img_byte_arr.getvalue()
-    
-    save_to_storage(img_bytes, "thumbnails", f"{route_uuid}.png")
-    return f"/api/thumbnails/{route_uuid}.png"
+    images = render_thumbnails(
+        points.get('lat', []), points.get('lon', []), points.get('ele'),
+        sizes=sizes, fmt=THUMBNAIL_FORMAT, color_by_elevation=color_by_elevation,
+    )
+    if not images: return None
+
+    for size, img_bytes in images.items():
+        save_to_storage(img_bytes, "thumbnails", thumbnail_filename(route_uuid, size))
+
+    if replace:
+        for size in SAVE_SIZES:
+            if size in images: continue
+            try:
+                delete_from_storage("thumbnails", thumbnail_filename(route_uuid, size))
+            except Exception as e:
+                print(f"[Thumbnail] stale {size} delete failed for {route_uuid}: {e}")
+
+    return f"/api/thumbnails/{thumbnail_filename(route_uuid, 'card')}"
+
+def render_missing_size(route_uuid: str, size: str) -> Optional[bytes]:
+    """저장 때 건너뛴 사이즈(card@2x, share)를 코스 JSON에서 렌더링해 저장하고 바이트 반환. 코스가 없으면 None"""
+    raw = load_from_storage(f"routes/{route_uuid}.json")
+    if raw is None: return None
+
+    points = json.loads(raw).get('points') or {}
+    images = render_thumbnails(
+        points.get('lat', []), points.get('lon', []), points.get('ele'),
+        sizes=(size,), fmt=THUMBNAIL_FORMAT,
+    )
+    img_bytes = images.get(size)
+    if img_bytes is None: return None
+
+    save_to_storage(img_bytes, "thumbnails", thumbnail_filename(route_uuid, size))
+    return img_bytes
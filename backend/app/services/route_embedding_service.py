@@ -0,0 +1,174 @@
+"""
+코스 임베딩 (route_embeddings) — 자연어 코스 검색 (GET /api/routes/search)
+
+- 문서: 제목 + 설명 + 태그 + 코스 성격/난이도(classify_course) + 경유 POI 이름
+- gemini-embedding-001을 ROUTE_EMBEDDING_DIM(기본 768)차원으로 MRL 축소 → halfvec + HNSW
+  (docs/db/benchmark_vector_index.md: MRL 768 + HNSW p50 ~1.8ms, halfvec 3072 대비 4-5배 빠름)
+- 검색어는 기존 3072차원 캐시를 앞 768개로 잘라 재정규화 → 검색어당 추가 API 호출 없음.
+  캐시 미스는 embedding_worker 배치를 ROUTE_SEARCH_EMBEDDING_WAIT까지만 기다리고, 넘으면 텍스트 순위만
+- 저장 요청과 분리: create_route 커밋 후 schedule(route_id) → 백그라운드 스레드가 모아서 일괄 임베딩
+- source_hash(모델 + 차원 + 문서)가 같으면 재임베딩 생략. 누락/오래된 행은 scripts/data_refinement/embed_routes.py
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from psycopg2.extras import execute_values
+
+from app.core.database import get_db_conn
+from app.services.auto_tag_service import classify_course
+from app.services.embedding_service import EMBEDDING_MODEL, embed_documents, mrl_truncate, to_halfvec_literal
+from app.services.embedding_worker import embedding_worker
+from metrics import registry
+
+ROUTE_EMBEDDING_DIM = int(os.getenv("ROUTE_EMBEDDING_DIM", 768))  # init.sql halfvec(768)과 맞출 것
+ROUTE_EMBED_BATCH = int(os.getenv("ROUTE_EMBED_BATCH", 16))       # embed_content 1회당 문서 수
+ROUTE_EMBED_DELAY = float(os.getenv("ROUTE_EMBED_DELAY", 2.0))    # 초, 연속 저장을 모으는 시간
+ROUTE_SEARCH_EMBEDDING_WAIT = float(os.getenv("ROUTE_SEARCH_EMBEDDING_WAIT", 0.5))  # 초, 검색어 캐시 미스 시 대기 상한
+MAX_DOCUMENT_CHARS = 2000
+MAX_DOCUMENT_POIS = 10
+
+ROUTE_EMBEDDINGS = registry.counter(
+    "route_embeddings_total", "Route embedding refreshes (embedded / unchanged / error)", ("result",))
+
+_DOCUMENT_SQL = """
+    SELECT r.id, r.title, r.description, r.distance, r.elevation_gain, re.source_hash,
+           ARRAY(
+               SELECT COALESCE(t.names->>'ko', t.slug)
+               FROM route_tags rt JOIN tags t ON t.id = rt.tag_id
+               WHERE rt.route_id = r.id ORDER BY t.slug
+           ) AS tag_names,
+           ARRAY(
+               SELECT w.name
+               FROM route_waypoints rw JOIN waypoints w ON w.id = rw.waypoint_id
+               WHERE rw.route_id = r.id ORDER BY rw.sequence LIMIT %s
+           ) AS poi_names
+    FROM routes r
+    LEFT JOIN route_embeddings re ON re.route_id = r.id
+    WHERE r.id = ANY(%s) AND r.status != 'DELETED'
+"""
+
+
+def route_document(row) -> str:
+    """임베딩할 코스 문서. 제목/설명이 비어도 태그·코스 성격만으로 검색되도록 구성"""
+    distance_km = round((row["distance"] or 0) / 1000, 1)
+    course_type, difficulty = classify_course(distance_km, row["elevation_gain"] or 0)
+    lines = [row["title"] or "", row["description"] or ""]
+    if row["tag_names"]: lines.append("태그: " + ", ".join(row["tag_names"]))
+    lines.append(f"{distance_km}km, 획득고도 {row['elevation_gain'] or 0}m, {course_type}, 난이도 {difficulty}")
+    if row["poi_names"]: lines.append("경유: " + ", ".join(row["poi_names"]))
+    return "\n".join(line.strip() for line in lines if line.strip())[:MAX_DOCUMENT_CHARS]
+
+
+def source_hash(document: str) -> str:
+    return hashlib.sha1(f"{EMBEDDING_MODEL}:{ROUTE_EMBEDDING_DIM}\n{document}".encode("utf-8")).hexdigest()
+
+
+def embed_routes(route_ids: Iterable[int]) -> dict:
+    """코스 문서가 바뀐 경우만 임베딩해서 route_embeddings에 upsert. 반환: 결과별 건수"""
+    route_ids = sorted(set(route_ids))
+    counts = {"embedded": 0, "unchanged": 0, "error": 0}
+    if not route_ids: return counts
+
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_DOCUMENT_SQL, (MAX_DOCUMENT_POIS, route_ids))
+            rows = cur.fetchall()
+        conn.commit()  # API 호출 동안 트랜잭션을 열어두지 않음
+
+        pending = []
+        for row in rows:
+            document = route_document(row)
+            digest = source_hash(document)
+            if digest == row["source_hash"]:
+                counts["unchanged"] += 1
+                continue
+            pending.append((row["id"], document, digest))
+
+        for i in range(0, len(pending), ROUTE_EMBED_BATCH):
+            batch = pending[i:i + ROUTE_EMBED_BATCH]
+            try:
+                vectors = embed_documents([document for _, document, _ in batch], ROUTE_EMBEDDING_DIM)
+                with conn.cursor() as cur:
+                    execute_values(
+                        cur,
+                        """
+                        INSERT INTO route_embeddings (route_id, embedding, source_hash) VALUES %s
+                        ON CONFLICT (route_id) DO UPDATE
+                            SET embedding = EXCLUDED.embedding, source_hash = EXCLUDED.source_hash, updated_at = CURRENT_TIMESTAMP
+                        """,
+                        [(route_id, to_halfvec_literal(vec), digest) for (route_id, _, digest), vec in zip(batch, vectors)],
+                        template="(%s, %s::halfvec, %s)",
+                    )
+                conn.commit()
+                counts["embedded"] += len(batch)
+            except Exception as e:
+                conn.rollback()
+                counts["error"] += len(batch)
+                print(f"[Route Embedding] batch error ({len(batch)} routes, first id={batch[0][0]}): {e}")
+
+    for result, count in counts.items():
+        if count: ROUTE_EMBEDDINGS.inc(count, result=result)
+    return counts
+
+
+def stale_route_ids(limit: Optional[int] = None) -> List[int]:
+    """임베딩이 없거나 마지막 임베딩 이후 수정된 코스"""
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT r.id FROM routes r
+                LEFT JOIN route_embeddings re ON re.route_id = r.id
+                WHERE r.status != 'DELETED' AND (re.route_id IS NULL OR r.updated_at > re.updated_at)
+                ORDER BY r.id
+                LIMIT %s
+                """,
+                (limit,),
+            )
+            return [row["id"] for row in cur.fetchall()]
+
+
+def query_vector(q: str) -> Optional[str]:
+    """검색어 → halfvec(ROUTE_EMBEDDING_DIM) 리터럴 (3072차원 검색어 캐시 재사용). 대기 시간 안에 없으면 None"""
+    arr = embedding_worker.lookup(q, wait=ROUTE_SEARCH_EMBEDDING_WAIT)
+    if arr is None: return None
+    return to_halfvec_literal(mrl_truncate(arr, ROUTE_EMBEDDING_DIM))
+
+
+class _RouteEmbedder:
+    """저장된 코스 id를 ROUTE_EMBED_DELAY 동안 모아 embed_routes 한 번으로 처리하는 백그라운드 스레드.
+    프로세스 종료로 못 끝낸 코스는 stale_route_ids()에 잡히므로 백필 스크립트가 보충"""
+    def __init__(self):
+        self._queue: "queue.Queue[int]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def schedule(self, route_id: int) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="route-embedder", daemon=True)
+                self._thread.start()
+        self._queue.put(route_id)
+
+    def _run(self) -> None:
+        while True:
+            route_ids = {self._queue.get()}
+            time.sleep(ROUTE_EMBED_DELAY)
+            while True:
+                try:
+                    route_ids.add(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                counts = embed_routes(route_ids)
+                print(f"[Route Embedding] {len(route_ids)} routes: {counts}")
+            except Exception as e:
+                print(f"[Route Embedding] error for {sorted(route_ids)}: {e}")
+
+
+route_embedder = _RouteEmbedder()
@@ -0,0 +1,69 @@
+"""
+플래너 구간(leg) 캐시
+
+에디터에서 포인트 하나를 추가/이동할 때마다 전체 코스를 다시 라우팅하지 않도록
+(from, to, bicycle_type, costing options) 단위로 Valhalla 결과를 보관.
+- 값: 구간별 matched shape, 고도, edge 속성(구간 기준 shape index), 거리/시간
+- 프로세스 메모리 LRU + TTL (Cloud Run 인스턴스별, 재시작 시 비워짐)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+LEG_CACHE_SIZE = int(os.environ.get("PLAN_LEG_CACHE_SIZE", "5000"))
+LEG_CACHE_TTL = float(os.environ.get("PLAN_LEG_CACHE_TTL", "3600"))  # 초, 타일 갱신 반영 주기
+
+LegKey = Tuple[float, float, float, float, str, str]
+
+
+def leg_key(from_loc, to_loc, bicycle_type: str, costing_options: Dict[str, Any]) -> LegKey:
+    """좌표는 polyline precision(1e-6)으로 반올림하여 키로 사용"""
+    return (
+        round(from_loc.lat, 6), round(from_loc.lon, 6),
+        round(to_loc.lat, 6), round(to_loc.lon, 6),
+        bicycle_type or "",
+        json.dumps(costing_options, sort_keys=True),
+    )
+
+
+class LegCache:
+    def __init__(self, maxsize: int = LEG_CACHE_SIZE, ttl: float = LEG_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[LegKey, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: LegKey) -> Optional[dict]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                if item is not None: del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: LegKey, leg: dict) -> None:
+        if self.maxsize <= 0: return
+        with self._lock:
+            self._data[key] = (time.monotonic(), leg)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+leg_cache = LegCache()
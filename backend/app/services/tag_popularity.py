@@ -0,0 +1,155 @@
+"""
+태그 인기도 요약 (tag_popularity) + 인기 태그 목록 캐시
+
+GET /api/routes/tags, 빈 검색어 /tags/search 는 요청마다 tags × route_tags × routes(PUBLIC)
+GROUP BY 를 돌던 것을 tag_popularity(tag_id, public_count) 한 테이블 조회로 대체.
+- 증분 갱신: 코스 저장/삭제 트랜잭션 안에서 변경 전후 (status, 태그) 차이만큼 public_count ± 1
+  (UPDATE가 행을 다시 읽으므로 동시 저장에도 값이 어긋나지 않음)
+- 전체 재계산: refresh_all() — 스크립트가 routes / route_tags 를 직접 바꾼 뒤, 또는 주기 실행
+  (scripts/refresh_tag_popularity.py)
+- 목록 캐시: 프로세스 메모리 TTL. 이 인스턴스의 커밋 직후 invalidate, 다른 인스턴스 변경은 TTL 안에 반영
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from app.core.database import get_db_conn
+from metrics import registry
+
+POPULAR_TAGS_CACHE_TTL = float(os.getenv("POPULAR_TAGS_CACHE_TTL", 60))  # 초
+POPULAR_TAGS_MAX_AGE = int(os.getenv("POPULAR_TAGS_MAX_AGE", 60))  # Cache-Control max-age (초)
+
+CACHE_LOOKUPS = registry.counter(
+    "popular_tags_cache_total", "Popular tag list lookups served from memory vs tag_popularity", ("result",))
+
+# tag_id 지정 시 해당 태그만, 없으면 전체. 값이 바뀐 행만 갱신 (dead tuple 최소화)
+_REFRESH_SQL = """
+    INSERT INTO tag_popularity (tag_id, public_count, updated_at)
+    SELECT t.id, COUNT(r.id), CURRENT_TIMESTAMP
+    FROM tags t
+    LEFT JOIN route_tags rt ON rt.tag_id = t.id
+    LEFT JOIN routes r ON r.id = rt.route_id AND r.status = 'PUBLIC'
+    {where}
+    GROUP BY t.id
+    ON CONFLICT (tag_id) DO UPDATE
+        SET public_count = EXCLUDED.public_count, updated_at = EXCLUDED.updated_at
+        WHERE tag_popularity.public_count IS DISTINCT FROM EXCLUDED.public_count
+"""
+
+
+def _public_tags(status: Optional[str], tag_ids: Iterable[int]) -> set:
+    return set(tag_ids) if status == "PUBLIC" else set()
+
+
+def apply_route_change(cur, before: Tuple[Optional[str], Iterable[int]], after: Tuple[Optional[str], Iterable[int]]) -> int:
+    """코스 1건의 (status, tag_ids) 변경 전후 차이를 public_count에 반영. 호출자 트랜잭션 안에서 실행.
+    반환: 값이 바뀐 태그 수"""
+    delta = Counter(_public_tags(*after))
+    delta.subtract(_public_tags(*before))
+    rows = sorted((tag_id, d) for tag_id, d in delta.items() if d)  # tag_id 순서로 잠가 교착 방지
+    if not rows: return 0
+    execute_values(
+        cur,
+        """
+        INSERT INTO tag_popularity (tag_id, public_count) VALUES %s
+        ON CONFLICT (tag_id) DO UPDATE
+            SET public_count = tag_popularity.public_count + EXCLUDED.public_count, updated_at = CURRENT_TIMESTAMP
+        """,
+        rows,
+    )
+    return len(rows)
+
+
+def refresh_tags(cur, tag_ids: Optional[Iterable[int]] = None) -> int:
+    """route_tags / routes 기준으로 public_count 재계산 (tag_ids=None 이면 전체). 반환: 갱신된 행 수"""
+    if tag_ids is None:
+        cur.execute(_REFRESH_SQL.format(where=""))
+    else:
+        tag_ids = sorted(set(tag_ids))
+        if not tag_ids: return 0
+        cur.execute(_REFRESH_SQL.format(where="WHERE t.id = ANY(%s)"), (tag_ids,))
+    return cur.rowcount
+
+
+def refresh_all() -> int:
+    """전체 재계산 후 커밋 (주기 실행 / 일괄 스크립트 이후)"""
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            updated = refresh_tags(cur)
+        conn.commit()
+    popular_tags.invalidate()
+    return updated
+
+
+class PopularTags:
+    """public_count > 0 인 태그 전체 목록 (count 내림차순) + 내용 해시(ETag용)"""
+    def __init__(self, ttl: float = POPULAR_TAGS_CACHE_TTL):
+        self.ttl = ttl
+        self._rows: Optional[List[dict]] = None
+        self._etag = ""
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._rows = None
+            self._generation += 1
+
+    def _fresh(self) -> Optional[Tuple[List[dict], str]]:
+        with self._lock:
+            if self._rows is None or time.monotonic() - self._loaded_at > self.ttl: return None
+            return self._rows, self._etag
+
+    def get(self) -> Tuple[List[dict], str]:
+        """(rows, etag). 미스 시 한 스레드만 DB 조회, 나머지는 그 결과를 사용"""
+        cached = self._fresh()
+        if cached is not None:
+            CACHE_LOOKUPS.inc(result="hit")
+            return cached
+        with self._load_lock:
+            cached = self._fresh()
+            if cached is not None:
+                CACHE_LOOKUPS.inc(result="hit")
+                return cached
+            CACHE_LOOKUPS.inc(result="miss")
+            with self._lock:
+                generation = self._generation
+            rows = _load_popular_tags()
+            etag = hashlib.sha1(json.dumps(rows, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+            with self._lock:
+                # 조회 중 invalidate 되었으면 다음 요청이 다시 읽도록 저장하지 않음
+                if generation == self._generation:
+                    self._rows, self._etag, self._loaded_at = rows, etag, time.monotonic()
+            return rows, etag
+
+
+def _load_popular_tags() -> List[dict]:
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT t.slug, t.names, p.public_count AS count
+                FROM tag_popularity p
+                JOIN tags t ON t.id = p.tag_id
+                WHERE p.public_count > 0
+                ORDER BY p.public_count DESC, t.id
+            """)
+            return [
+                {
+                    "slug": row["slug"],
+                    "name": row["names"].get("ko", row["slug"]) if isinstance(row["names"], dict) else row["slug"],
+                    "count": row["count"],
+                }
+                for row in cur.fetchall()
+            ]
+
+
+popular_tags = PopularTags()
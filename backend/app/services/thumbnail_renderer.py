@@ -0,0 +1,165 @@
+"""
+코스 썸네일 렌더러
+
+route JSON의 points 배열(lat/lon/ele)을 numpy로 한 번에 투영하여
+여러 사이즈(카드, 공유 미리보기, 레티나)를 한 번의 호출로 렌더링.
+- 저장소 의존성 없음 (backend API와 scripts 양쪽에서 import)
+- WebP 또는 최적화 PNG 인코딩
+- 옵션: 고도에 따라 색이 변하는 라인
+"""
+
+from __future__ import annotations
+
+import io
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# name -> (width, height, line_width, marker_radius)
+THUMBNAIL_SIZES: Dict[str, Tuple[int, int, int, int]] = {
+    "card": (600, 240, 5, 5),          # 목록 카드 (UI 비율 ~2.5:1)
+    "card@2x": (1200, 480, 10, 10),    # 레티나 카드
+    "share": (1200, 630, 8, 9),        # OG / 공유 미리보기
+}
+DEFAULT_SIZES = ("card",)
+# 한 코스의 전체 사이즈. thumbnail_url은 card를 가리키고 나머지는 같은 uuid prefix로 저장
+# 저장 요청은 card만 렌더링, 나머지는 /api/thumbnails 첫 요청 때 생성 (배치 스크립트는 전부)
+SAVE_SIZES = ("card", "card@2x", "share")
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp").lower()  # 'webp' or 'png'
+
+BACKGROUND_COLOR = "#111827"
+LINE_COLOR = "#2a9e92"
+START_COLOR = "#10B981"
+END_COLOR = "#EF4444"
+MAX_DRAW_POINTS = 500
+PADDING_RATIO = 40 / 240  # 기존 600x240 카드의 padding 40px 비율 유지
+
+# 고도 색상 램프 (낮음 → 높음)
+ELEVATION_RAMP = ["#2a9e92", "#3B82F6", "#22C55E", "#EAB308", "#F97316", "#EF4444"]
+
+
+def _as_arrays(lats, lons, eles=None):
+    lat_arr = np.asarray(lats, dtype=np.float64)
+    lon_arr = np.asarray(lons, dtype=np.float64)
+    ele_arr = np.asarray(eles, dtype=np.float64) if eles is not None and len(eles) == len(lat_arr) else None
+    return lat_arr, lon_arr, ele_arr
+
+
+def _downsample_index(n: int, max_points: int = MAX_DRAW_POINTS) -> np.ndarray:
+    """균등 간격 샘플 인덱스. 마지막 포인트는 항상 포함."""
+    step = max(1, n // max_points)
+    idx = np.arange(0, n, step)
+    if idx[-1] != n - 1:
+        idx = np.append(idx, n - 1)
+    return idx
+
+
+def _normalized_path(lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, float, float]:
+    """
+    bbox 기준 좌표 (x=lon-min_lon, y=max_lat-lat) 와 범위를 반환.
+    Bounding box는 전체 포인트 기준, 그리는 좌표는 다운샘플된 포인트.
+    """
+    min_lat, max_lat = float(lats.min()), float(lats.max())
+    min_lon, max_lon = float(lons.min()), float(lons.max())
+    lat_range = max(max_lat - min_lat, 0.0001)
+    lon_range = max(max_lon - min_lon, 0.0001)
+    xy = np.column_stack((lons - min_lon, max_lat - lats))
+    return xy, lon_range, lat_range
+
+
+def _project(xy: np.ndarray, lon_range: float, lat_range: float, width: int, height: int) -> np.ndarray:
+    """정규화된 좌표를 (width, height) 캔버스 픽셀 좌표로 일괄 변환 (가운데 정렬)."""
+    padding = height * PADDING_RATIO
+    scale = min((width - 2 * padding) / lon_range, (height - 2 * padding) / lat_range)
+    offset = np.array([(width - lon_range * scale) / 2, (height - lat_range * scale) / 2])
+    return xy * scale + offset
+
+
+def _elevation_runs(eles: np.ndarray) -> Sequence[Tuple[int, int, str]]:
+    """고도를 색상 버킷으로 양자화하고, 같은 색이 이어지는 구간 (start, end, color) 목록으로 묶음."""
+    lo, hi = float(eles.min()), float(eles.max())
+    n_colors = len(ELEVATION_RAMP)
+    if hi - lo < 1.0:
+        buckets = np.zeros(len(eles), dtype=np.int64)
+    else:
+        buckets = np.minimum(((eles - lo) / (hi - lo) * n_colors).astype(np.int64), n_colors - 1)
+    # 세그먼트 i (i -> i+1) 색상은 두 끝점 중 높은 쪽 버킷 기준
+    seg_buckets = np.maximum(buckets[:-1], buckets[1:])
+    change = np.flatnonzero(np.diff(seg_buckets)) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(seg_buckets)]))
+    return [(int(s), int(e), ELEVATION_RAMP[seg_buckets[s]]) for s, e in zip(starts, ends)]
+
+
+def _encode(img: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "webp":
+        # 단색 배경 + 라인 그래픽은 lossless WebP가 lossy보다 작고 선명함
+        img.save(buf, format="WEBP", lossless=True, quality=100, method=4)
+    else:
+        # 팔레트 PNG: 단색 배경 + 소수 색상이라 용량이 크게 줄어듦
+        img.quantize(colors=64, method=Image.Quantize.MEDIANCUT).save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def render_thumbnails(
+    lats: Sequence[float],
+    lons: Sequence[float],
+    eles: Optional[Sequence[float]] = None,
+    sizes: Sequence[str] = DEFAULT_SIZES,
+    fmt: str = THUMBNAIL_FORMAT,
+    color_by_elevation: bool = False,
+) -> Dict[str, bytes]:
+    """
+    코스 썸네일을 요청된 사이즈별로 렌더링하여 {size_name: encoded_bytes} 반환.
+    포인트가 2개 미만이면 빈 dict.
+    """
+    lat_arr, lon_arr, ele_arr = _as_arrays(lats, lons, eles)
+    if len(lat_arr) < 2:
+        return {}
+
+    xy_all, lon_range, lat_range = _normalized_path(lat_arr, lon_arr)
+    idx = _downsample_index(len(lat_arr))
+    xy = xy_all[idx]
+    runs = _elevation_runs(ele_arr[idx]) if color_by_elevation and ele_arr is not None else None
+
+    images = {}
+    for name in sizes:
+        width, height, line_width, r = THUMBNAIL_SIZES[name]
+        pts = _project(xy, lon_range, lat_range, width, height)
+
+        img = Image.new("RGB", (width, height), color=BACKGROUND_COLOR)
+        draw = ImageDraw.Draw(img)
+        if runs:
+            for s, e, color in runs:
+                draw.line(pts[s:e + 1].ravel().tolist(), fill=color, width=line_width, joint="curve")
+        else:
+            draw.line(pts.ravel().tolist(), fill=LINE_COLOR, width=line_width, joint="curve")
+
+        sx, sy = pts[0]
+        ex, ey = pts[-1]
+        draw.ellipse((sx - r, sy - r, sx + r, sy + r), fill=START_COLOR, outline="white", width=1)
+        draw.ellipse((ex - r, ey - r, ex + r, ey + r), fill=END_COLOR, outline="white", width=1)
+
+        images[name] = _encode(img, fmt)
+    return images
+
+
+def thumbnail_filename(route_uuid: str, size: str = "card", fmt: str = THUMBNAIL_FORMAT) -> str:
+    """저장 파일명 규칙: card → {uuid}.{ext}, 그 외 → {uuid}_{size}.{ext}"""
+    ext = "webp" if fmt == "webp" else "png"
+    if size == "card":
+        return f"{route_uuid}.{ext}"
+    return f"{route_uuid}_{size.replace('@', '_')}.{ext}"
+
+
+def parse_thumbnail_filename(filename: str, fmt: str = THUMBNAIL_FORMAT) -> Optional[Tuple[str, str]]:
+    """thumbnail_filename의 역 (card 외 사이즈만): (uuid, size), 해당 없으면 None"""
+    for size in THUMBNAIL_SIZES:
+        if size == "card": continue
+        suffix = thumbnail_filename("", size, fmt)
+        if filename.endswith(suffix) and len(filename) > len(suffix):
+            return filename[:-len(suffix)], size
+    return None
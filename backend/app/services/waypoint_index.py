@@ -0,0 +1,216 @@
+"""
+웨이포인트 인메모리 공간 인덱스 (자동 태그 / 설명 재생성의 POI 검색)
+
+자동 태그 1회마다 PostGIS로 waypoints 전체에 geography 거리 검색을 하던 것을 프로세스 안에서 처리.
+카탈로그가 수천 건 수준이라 numpy 배열 + 균일 격자(CELL_DEG)로 충분.
+- 격자: (lon, lat)을 CELL_DEG 칸으로 나눠 칸 번호순 정렬 → 칸별 [start, end) 구간 (CSR 형태)
+- 거리: 후보 POI 위도 기준 등장방형 근사 (반경 수백 m에서 geography 대비 오차 ~0.5% 이하)
+- near_line: 폴리라인에서 radius_m 이내 POI를 (선까지 거리, 출발점부터 선을 따라간 거리)와 함께, 선 따라 순서로
+- 갱신: WAYPOINT_INDEX_CHECK_INTERVAL마다 waypoints 시그니처(건수/최대 id/내용 해시)를 확인해 바뀌었으면 재적재.
+  같은 프로세스에서 waypoints를 바꿨다면 invalidate()로 즉시 반영
+- WAYPOINT_INDEX_VERIFIED_ONLY=1 이면 is_verified 웨이포인트만 (크롤링 데이터는 아직 전부 미검증이라 기본 off)
+- 적재 실패 / WAYPOINT_INDEX_ENABLED=0 이면 get()이 None → 호출자가 PostGIS 쿼리로 대체
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.core.database import get_db_conn
+from metrics import registry
+
+WAYPOINT_INDEX_ENABLED = os.getenv("WAYPOINT_INDEX_ENABLED", "1") not in ("0", "false", "False")
+WAYPOINT_INDEX_VERIFIED_ONLY = os.getenv("WAYPOINT_INDEX_VERIFIED_ONLY", "0") in ("1", "true", "True")
+WAYPOINT_INDEX_CHECK_INTERVAL = float(os.getenv("WAYPOINT_INDEX_CHECK_INTERVAL", 60))  # 초
+CELL_DEG = 0.01  # 격자 한 칸 (위도 ~1.1km)
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+MAX_PAIRS = 2_000_000  # 후보 × 구간 거리 행렬을 이 크기 단위로 나눠 계산
+
+INDEX_RELOADS = registry.counter(
+    "waypoint_index_reloads_total", "In-memory waypoint index (re)loads", ("result",))  # loaded / error
+
+_FILTER = "location IS NOT NULL" + (" AND is_verified" if WAYPOINT_INDEX_VERIFIED_ONLY else "")
+
+_LOAD_SQL = f"""
+    SELECT id, name, type::text[] AS type, description, ST_X(location) AS lon, ST_Y(location) AS lat
+    FROM waypoints WHERE {_FILTER}
+    ORDER BY id
+"""
+
+# 행 수정/추가/삭제 모두 잡히도록 내용 해시까지 포함 (수천 건이라 수 ms)
+_SIGNATURE_SQL = f"""
+    SELECT COUNT(*) AS n, COALESCE(MAX(id), 0) AS max_id,
+           COALESCE(SUM(hashtext(name || '|' || ST_AsEWKT(location) || '|' || type::text || '|' || COALESCE(description, ''))::bigint), 0) AS digest
+    FROM waypoints WHERE {_FILTER}
+"""
+
+
+def _local_scale(lats: np.ndarray) -> np.ndarray:
+    """위도별 경도 1도의 미터 길이"""
+    return METERS_PER_DEGREE * np.cos(np.radians(lats))
+
+
+class Polyline:
+    """검색용 폴리라인. 구간 길이 / 누적 거리를 한 번만 계산"""
+    def __init__(self, lats: Sequence[float], lons: Sequence[float]):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        mid_lat = (self.lats[:-1] + self.lats[1:]) / 2
+        dx = np.diff(self.lons) * _local_scale(mid_lat)
+        dy = np.diff(self.lats) * METERS_PER_DEGREE
+        self.seg_len = np.hypot(dx, dy)
+        self.cum_len = np.concatenate(([0.0], np.cumsum(self.seg_len)))
+
+    @classmethod
+    def from_wkt(cls, wkt: str) -> Optional["Polyline"]:
+        """auto_tag_service._build_route_line_wkt 형식 "LINESTRING(lon lat, ...)" """
+        body = wkt[wkt.index("(") + 1:wkt.rindex(")")]
+        coords = np.array([pair.split() for pair in body.split(",")], dtype=np.float64)
+        if len(coords) < 2: return None
+        return cls(coords[:, 1], coords[:, 0])
+
+    @property
+    def length_m(self) -> float:
+        return float(self.cum_len[-1])
+
+    def project(self, lats: np.ndarray, lons: np.ndarray):
+        """점들 → (선까지 최단 거리 m, 가장 가까운 지점까지 선을 따라간 거리 m)"""
+        dist = np.full(len(lats), np.inf)
+        along = np.zeros(len(lats))
+        if not len(lats): return dist, along
+        step = max(1, MAX_PAIRS // max(1, len(self.seg_len)))
+        seg_dlon, seg_dlat = np.diff(self.lons), np.diff(self.lats)
+        for s in range(0, len(lats), step):
+            plat, plon = lats[s:s + step, None], lons[s:s + step, None]
+            kx = _local_scale(plat)
+            # 점 기준 구간 시작점(a)과 구간 벡터(v), 미터 단위
+            ax = (self.lons[:-1] - plon) * kx
+            ay = (self.lats[:-1] - plat) * METERS_PER_DEGREE
+            vx = seg_dlon * kx
+            vy = seg_dlat * METERS_PER_DEGREE
+            vv = vx * vx + vy * vy
+            t = np.clip(np.divide(-(ax * vx + ay * vy), vv, out=np.zeros_like(vv), where=vv > 0), 0.0, 1.0)
+            ax += t * vx
+            ay += t * vy
+            d2 = ax * ax + ay * ay
+            j = np.argmin(d2, axis=1)
+            rows = np.arange(len(j))
+            dist[s:s + step] = np.sqrt(d2[rows, j])
+            along[s:s + step] = self.cum_len[j] + t[rows, j] * self.seg_len[j]
+        return dist, along
+
+
+class WaypointIndex:
+    """불변 인덱스. 재적재 시 새 객체로 교체되므로 검색 중 잠금 불필요"""
+    def __init__(self, rows: list):
+        self.rows = rows  # id, name, type, description (인덱스 순서)
+        self.lats = np.array([r["lat"] for r in rows], dtype=np.float64)
+        self.lons = np.array([r["lon"] for r in rows], dtype=np.float64)
+        cx = np.floor(self.lons / CELL_DEG).astype(np.int64)
+        cy = np.floor(self.lats / CELL_DEG).astype(np.int64)
+        self._order = np.lexsort((cy, cx))
+        keys, starts, counts = np.unique(
+            np.stack([cx[self._order], cy[self._order]], axis=1), axis=0, return_index=True, return_counts=True)
+        self._cells = {(int(x), int(y)): (int(s), int(s + c)) for (x, y), s, c in zip(keys, starts, counts)}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _candidates(self, boxes) -> np.ndarray:
+        """(lon_min, lat_min, lon_max, lat_max) 상자들과 겹치는 칸의 POI 인덱스"""
+        cells = set()
+        for lon_min, lat_min, lon_max, lat_max in boxes:
+            for x in range(math.floor(lon_min / CELL_DEG), math.floor(lon_max / CELL_DEG) + 1):
+                for y in range(math.floor(lat_min / CELL_DEG), math.floor(lat_max / CELL_DEG) + 1):
+                    cells.add((x, y))
+        spans = [self._cells[c] for c in cells if c in self._cells]
+        if not spans: return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate([self._order[s:e] for s, e in spans]))
+
+    @staticmethod
+    def _pad(lat: float, radius_m: float):
+        pad_lat = radius_m / METERS_PER_DEGREE
+        return pad_lat, radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(abs(lat) + pad_lat)), 1e-6))
+
+    def near_point(self, lat: float, lon: float, radius_m: float):
+        """점에서 radius_m 이내 → (POI 인덱스, 거리 m), 거리순"""
+        pad_lat, pad_lon = self._pad(lat, radius_m)
+        idx = self._candidates([(lon - pad_lon, lat - pad_lat, lon + pad_lon, lat + pad_lat)])
+        dx = (self.lons[idx] - lon) * _local_scale(self.lats[idx])
+        dy = (self.lats[idx] - lat) * METERS_PER_DEGREE
+        dist = np.hypot(dx, dy)
+        keep = dist <= radius_m
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def near_line(self, line: Polyline, radius_m: float):
+        """폴리라인에서 radius_m 이내 → (POI 인덱스, 선까지 거리 m, 선 따라 거리 m), 선 따라 순서"""
+        boxes = []
+        for i in range(len(line.lats) - 1):
+            lat_lo, lat_hi = sorted((line.lats[i], line.lats[i + 1]))
+            lon_lo, lon_hi = sorted((line.lons[i], line.lons[i + 1]))
+            pad_lat, pad_lon = self._pad(max(abs(lat_lo), abs(lat_hi)), radius_m)
+            boxes.append((lon_lo - pad_lon, lat_lo - pad_lat, lon_hi + pad_lon, lat_hi + pad_lat))
+        idx = self._candidates(boxes)
+        dist, along = line.project(self.lats[idx], self.lons[idx])
+        keep = dist <= radius_m
+        idx, dist, along = idx[keep], dist[keep], along[keep]
+        order = np.argsort(along, kind="stable")
+        return idx[order], dist[order], along[order]
+
+    def locate(self, line: Polyline, idx: np.ndarray) -> np.ndarray:
+        """POI들의 선 따라 거리 (ST_LineLocatePoint × 길이)"""
+        return line.project(self.lats[idx], self.lons[idx])[1]
+
+
+class _IndexHolder:
+    def __init__(self):
+        self._index: Optional[WaypointIndex] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[WaypointIndex]:
+        """현재 인덱스 (필요하면 시그니처 확인 후 재적재). 사용 불가면 None"""
+        if not WAYPOINT_INDEX_ENABLED: return None
+        if self._index is not None and time.monotonic() - self._checked_at < WAYPOINT_INDEX_CHECK_INTERVAL:
+            return self._index
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._checked_at < WAYPOINT_INDEX_CHECK_INTERVAL:
+                return self._index
+            try:
+                self._refresh()
+            except Exception as e:
+                INDEX_RELOADS.inc(result="error")
+                print(f"[Waypoint Index] refresh error: {e}")
+            self._checked_at = time.monotonic()  # 실패해도 매 호출마다 재시도하지 않음
+            return self._index
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._signature = None
+            self._checked_at = 0.0
+
+    def _refresh(self) -> None:
+        with get_db_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_SIGNATURE_SQL)
+                row = cur.fetchone()
+                signature = (row["n"], row["max_id"], row["digest"])
+                if signature == self._signature and self._index is not None: return
+                started = time.perf_counter()
+                cur.execute(_LOAD_SQL)
+                rows = [dict(r) for r in cur.fetchall()]
+        self._index = WaypointIndex(rows)
+        self._signature = signature
+        INDEX_RELOADS.inc(result="loaded")
+        print(f"[Waypoint Index] loaded {len(rows)} waypoints in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+waypoint_index = _IndexHolder()
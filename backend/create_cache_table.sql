@@ -3,3 +3,13 @@ CREATE TABLE IF NOT EXISTS search_query_cache (
     embedding halfvec(3072),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
+
+-- 자동 태그/설명(Gemini) 결과 캐시. 키 = sha256(모델명 + 정규화된 프롬프트 입력)
+CREATE TABLE IF NOT EXISTS auto_tag_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    result JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_auto_tag_cache_expires ON auto_tag_cache(expires_at);
@@ -1,11 +1,12 @@
 from __future__ import annotations
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from typing import List, Dict, Any
+import time
+import zlib
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
 import math
 
 RIDUCK_NS = 'https://riduck.dev/xmlns/1'
-ET.register_namespace('riduck', RIDUCK_NS)
 
 INTERNAL_TO_GPX_SYM = {
     'turn_left': 'Turn Left',
@@ -33,255 +34,315 @@ INTERNAL_TO_TCX_MAP = {
     'u_turn': 'Generic',
 }
 
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+CHUNK_SIZE = 64 * 1024  # bytes per streamed chunk
+
+# Fake Start Time for TCX (Epoch or specific date)
+# Using a fixed date ensures reproducibility.
+# 2026-02-20T10:00:00Z
+TCX_START_EPOCH = 1771581600
+TCX_AVG_SPEED_MPS = 5.5  # ~20km/h
+
+
+def _text(value) -> str:
+    return escape(str(value))
+
+
+def _get_sections(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    sections = data.get('editor_state', {}).get('sections', [])
+    # If editor_state is missing but 'sections' is at root (frontend payload might vary), handle it
+    if not sections and 'sections' in data:
+        sections = data['sections']
+    return sections
+
+
+def _validate_sections(sections, numeric_latlng: bool) -> None:
+    """Eager pass over the payload so malformed input fails before the response starts streaming.
+
+    Checks exactly what iter_xml later converts: section/segment/point shapes, coordinate
+    numbers and dist_km (plus point lat/lng when the writer float()s them). Raises ValueError.
+    """
+    if not isinstance(sections, list):
+        raise ValueError("sections must be a list")
+    for s_idx, section in enumerate(sections):
+        if not isinstance(section, dict):
+            raise ValueError(f"section {s_idx} must be an object")
+        for g_idx, segment in enumerate(section.get('segments', [])):
+            geometry = segment.get('geometry', {}) if isinstance(segment, dict) else None
+            if not isinstance(geometry, dict):
+                raise ValueError(f"section {s_idx} segment {g_idx}: invalid geometry")
+            for coord in geometry.get('coordinates', []):
+                try:
+                    if numeric_latlng and len(coord) < 2: raise ValueError
+                    for value in coord[:3]:
+                        float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"section {s_idx} segment {g_idx}: invalid coordinate {coord!r}") from None
+        for p_idx, point in enumerate(section.get('points', [])):
+            if not isinstance(point, dict):
+                raise ValueError(f"section {s_idx} point {p_idx} must be an object")
+            keys = ('lat', 'lng', 'dist_km') if numeric_latlng else ('dist_km',)
+            for key in keys:
+                value = point.get(key)
+                if value is None: continue
+                try:
+                    float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"section {s_idx} point {p_idx}: invalid {key} {value!r}") from None
+
+
+def _iter_track_coords(sections) -> Iterator[Tuple[float, float, Optional[float]]]:
+    """Merged track over all sections/segments as (lat, lon, ele|None), consecutive duplicates removed."""
+    last_coord_key = None
+    for section in sections:
+        for segment in section.get('segments', []):
+            # Coords format: [[lon, lat, ele?], ...]
+            for coord in segment.get('geometry', {}).get('coordinates', []):
+                if len(coord) < 2: continue
+                lon = float(coord[0])
+                lat = float(coord[1])
+
+                # Deduplication key (simple string check)
+                coord_key = f"{lat:.6f},{lon:.6f}"
+                if coord_key == last_coord_key: continue
+                last_coord_key = coord_key
+
+                yield lat, lon, float(coord[2]) if len(coord) > 2 else None
+
+
+def _haversine(lat1, lon1, lat2, lon2) -> float:
+    R = 6371000
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+
+@lru_cache(maxsize=64)
+def _day_prefix(day: int) -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+
+
+def _time_str(seconds_offset: float) -> str:
+    """ISO-8601 UTC timestamp for TCX_START_EPOCH + offset (whole seconds, truncated)."""
+    day, rem = divmod(TCX_START_EPOCH + int(seconds_offset), 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes, seconds = divmod(rem, 60)
+    return f"{_day_prefix(day)}T{hours:02d}:{minutes:02d}:{seconds:02d}Z"
+
+
+def _chunked(parts: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Group small string fragments into UTF-8 chunks of roughly chunk_size bytes."""
+    buf: List[str] = []
+    size = 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(buf).encode('utf-8')
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode('utf-8')
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Incrementally gzip a byte stream (Content-Encoding: gzip)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
 class GpxExporter:
     def __init__(self, data: Dict[str, Any]):
         """
         data: Riduck Standard JSON format (specifically requiring 'editor_state')
         """
         self.data = data
-        self.sections = data.get('editor_state', {}).get('sections', [])
-        # If editor_state is missing but 'sections' is at root (frontend payload might vary), handle it
-        if not self.sections and 'sections' in data:
-            self.sections = data['sections']
+        self.sections = _get_sections(data)
+
+    def iter_xml(self) -> Iterator[str]:
+        """Yields the GPX document as indented XML fragments, in document order."""
+        yield XML_DECLARATION
+        yield (
+            '<gpx xmlns="http://www.topografix.com/GPX/1/1"'
+            ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+            ' xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd"'
+            f' xmlns:riduck="{RIDUCK_NS}" version="1.1" creator="Riduck">\n'
+        )
 
-    def to_xml_string(self) -> str:
-        # Namespace map
-        ns_map = {
-            "xmlns": "http://www.topografix.com/GPX/1/1",
-            "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
-            "xsi:schemaLocation": "http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd",
-            f"xmlns:riduck": RIDUCK_NS,
-            "version": "1.1",
-            "creator": "Riduck"
-        }
-
-        gpx = ET.Element("gpx", ns_map)
-        
         # Metadata
-        metadata = ET.SubElement(gpx, "metadata")
-        name = ET.SubElement(metadata, "name")
         first_section_name = self.sections[0].get('name', 'Riduck Route') if self.sections else 'Riduck Route'
-        name.text = self.data.get('title', first_section_name)
+        yield f"  <metadata>\n    <name>{_text(self.data.get('title', first_section_name))}</name>\n  </metadata>\n"
 
         # 1. Waypoints (Sections & POIs)
         for s_idx, section in enumerate(self.sections):
-            points = section.get('points', [])
             section_color = section.get('color', '#2a9e92')
             section_name = section.get('name', f'Section {s_idx + 1}')
-
-            for p_idx, point in enumerate(points):
-                # Ensure lat/lon are floats
-                lat = str(point.get('lat', 0))
-                lon = str(point.get('lng', 0)) # Frontend uses 'lng'
-                
-                wpt = ET.SubElement(gpx, "wpt", lat=lat, lon=lon)
-                
-                # Elevation if available
-                if 'ele' in point:
-                    ele = ET.SubElement(wpt, "ele")
-                    ele.text = str(point['ele'])
-                
-                # dist_km
-                dist_km = point.get('dist_km')
-                dist_km_str = f"{float(dist_km):.6f}" if dist_km is not None else None
-
-                # Section Start Logic (First point of section)
-                if p_idx == 0:
-                    n = ET.SubElement(wpt, "name")
-                    n.text = section_name
-
-                    desc = ET.SubElement(wpt, "desc")
-                    desc.text = f"Color:{section_color}" + (f";Riduck_DistKm={dist_km_str}" if dist_km_str else "")
-
-                    sym = ET.SubElement(wpt, "sym")
-                    sym.text = "Riduck_Section_Start"
-                else:
-                    # Regular Point
-                    p_name = point.get('name', '')
-                    if p_name:
-                        n = ET.SubElement(wpt, "name")
-                        n.text = p_name
-
-                    point_type = point.get('type', 'via')
-                    desc_parts = []
-                    if point_type and point_type != 'via':
-                        desc_parts.append(f"Riduck_Type:{point_type}")
-                        # Also set <sym> for external tool compatibility
-                        gpx_sym = INTERNAL_TO_GPX_SYM.get(point_type)
-                        if gpx_sym:
-                            sym_el = ET.SubElement(wpt, "sym")
-                            sym_el.text = gpx_sym
-                    if dist_km_str:
-                        desc_parts.append(f"Riduck_DistKm={dist_km_str}")
-                    if desc_parts:
-                        desc = ET.SubElement(wpt, "desc")
-                        desc.text = ";".join(desc_parts)
-
-                # extensions: riduck:dist_km (primary)
-                if dist_km_str:
-                    ext = ET.SubElement(wpt, "extensions")
-                    dk = ET.SubElement(ext, f"{{{RIDUCK_NS}}}dist_km")
-                    dk.text = dist_km_str
+            for p_idx, point in enumerate(section.get('points', [])):
+                yield self._wpt_xml(point, p_idx, section_name, section_color)
 
         # 2. Track (Merged)
-        trk = ET.SubElement(gpx, "trk")
-        trk_name = ET.SubElement(trk, "name")
-        trk_name.text = self.data.get('title', 'Riduck Track')
-        
-        trkseg = ET.SubElement(trk, "trkseg")
-        
-        last_coord_key = None
-        
-        for section in self.sections:
-            segments = section.get('segments', [])
-            for segment in segments:
-                coords = segment.get('geometry', {}).get('coordinates', [])
-                # Coords format: [[lon, lat, ele?], ...]
-                
-                for coord in coords:
-                    if len(coord) < 2: continue
-                    
-                    lon = float(coord[0])
-                    lat = float(coord[1])
-                    ele = float(coord[2]) if len(coord) > 2 else None
-                    
-                    # Deduplication key (simple string check)
-                    coord_key = f"{lat:.6f},{lon:.6f}"
-                    
-                    if coord_key != last_coord_key:
-                        trkpt = ET.SubElement(trkseg, "trkpt", lat=str(lat), lon=str(lon))
-                        if ele is not None:
-                            e = ET.SubElement(trkpt, "ele")
-                            e.text = str(ele)
-                        last_coord_key = coord_key
-
-        # Pretty Print
-        rough_string = ET.tostring(gpx, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        return reparsed.toprettyxml(indent="  ")
+        yield f"  <trk>\n    <name>{_text(self.data.get('title', 'Riduck Track'))}</name>\n    <trkseg>\n"
+        for lat, lon, ele in _iter_track_coords(self.sections):
+            if ele is not None:
+                yield f'      <trkpt lat="{lat}" lon="{lon}">\n        <ele>{ele}</ele>\n      </trkpt>\n'
+            else:
+                yield f'      <trkpt lat="{lat}" lon="{lon}"/>\n'
+        yield "    </trkseg>\n  </trk>\n</gpx>\n"
+
+    def _wpt_xml(self, point: Dict[str, Any], p_idx: int, section_name: str, section_color: str) -> str:
+        lat = str(point.get('lat', 0))
+        lon = str(point.get('lng', 0)) # Frontend uses 'lng'
+        children = []
+
+        # Elevation if available
+        if 'ele' in point:
+            children.append(f"<ele>{_text(point['ele'])}</ele>")
+
+        # dist_km
+        dist_km = point.get('dist_km')
+        dist_km_str = f"{float(dist_km):.6f}" if dist_km is not None else None
+
+        # Section Start Logic (First point of section)
+        if p_idx == 0:
+            desc = f"Color:{section_color}" + (f";Riduck_DistKm={dist_km_str}" if dist_km_str else "")
+            children.append(f"<name>{_text(section_name)}</name>")
+            children.append(f"<desc>{_text(desc)}</desc>")
+            children.append("<sym>Riduck_Section_Start</sym>")
+        else:
+            # Regular Point
+            p_name = point.get('name', '')
+            if p_name:
+                children.append(f"<name>{_text(p_name)}</name>")
+
+            point_type = point.get('type', 'via')
+            desc_parts = []
+            if point_type and point_type != 'via':
+                desc_parts.append(f"Riduck_Type:{point_type}")
+                # Also set <sym> for external tool compatibility
+                gpx_sym = INTERNAL_TO_GPX_SYM.get(point_type)
+                if gpx_sym:
+                    children.append(f"<sym>{gpx_sym}</sym>")
+            if dist_km_str:
+                desc_parts.append(f"Riduck_DistKm={dist_km_str}")
+            if desc_parts:
+                children.append(f"<desc>{_text(';'.join(desc_parts))}</desc>")
+
+        # extensions: riduck:dist_km (primary)
+        if dist_km_str:
+            children.append(f"<extensions>\n      <riduck:dist_km>{dist_km_str}</riduck:dist_km>\n    </extensions>")
+
+        if not children:
+            return f"  <wpt lat={quoteattr(lat)} lon={quoteattr(lon)}/>\n"
+        body = "".join(f"    {c}\n" for c in children)
+        return f"  <wpt lat={quoteattr(lat)} lon={quoteattr(lon)}>\n{body}  </wpt>\n"
+
+    def validate(self) -> None:
+        """Raises ValueError for payloads iter_xml cannot serialise (call before streaming)."""
+        _validate_sections(self.sections, numeric_latlng=False)
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        return _chunked(self.iter_xml(), chunk_size)
+
+    def to_xml_string(self) -> str:
+        return "".join(self.iter_xml())
 
 class TcxExporter:
     def __init__(self, data: Dict[str, Any]):
         self.data = data
-        self.sections = data.get('editor_state', {}).get('sections', [])
-        if not self.sections and 'sections' in data:
-            self.sections = data['sections']
+        self.sections = _get_sections(data)
 
     def _haversine_distance(self, lat1, lon1, lat2, lon2) -> float:
-        R = 6371000 
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        dphi, dlambda = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
-        a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-        return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+        return _haversine(lat1, lon1, lat2, lon2)
 
-    def to_xml_string(self) -> str:
+    def _total_distance(self) -> float:
+        """Numeric pre-pass over the merged track; Lap totals precede the Track in TCX."""
+        total_distance = 0.0
+        last_pt = None
+        for lat, lon, _ele in _iter_track_coords(self.sections):
+            if last_pt:
+                total_distance += _haversine(last_pt[0], last_pt[1], lat, lon)
+            last_pt = (lat, lon)
+        return total_distance
+
+    def iter_xml(self) -> Iterator[str]:
+        """Yields the TCX course as indented XML fragments, in document order."""
         ns_url = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
-        root = ET.Element("TrainingCenterDatabase", {"xmlns": ns_url})
-        
-        courses = ET.SubElement(root, "Courses")
-        course = ET.SubElement(courses, "Course")
-        
+        yield XML_DECLARATION
+        yield f'<TrainingCenterDatabase xmlns:riduck="{RIDUCK_NS}" xmlns="{ns_url}">\n  <Courses>\n    <Course>\n'
+
         # Course Name
-        name_elem = ET.SubElement(course, "Name")
         title = self.data.get('title', 'Riduck Route')
-        name_elem.text = title
+        yield f"      <Name>{_text(title)}</Name>\n"
 
-        lap = ET.SubElement(course, "Lap")
-        
-        # Track
-        track = ET.SubElement(course, "Track")
-        
-        total_distance = 0.0
-        last_pt = None
-        last_coord_key = None
-        
-        # Fake Start Time (Epoch or specific date)
-        # Using a fixed date ensures reproducibility. 
-        # 2026-02-20T10:00:00Z
-        start_epoch = 1771581600 
-        avg_speed_mps = 5.5 # ~20km/h
-
-        def get_time_str(seconds_offset):
-            import datetime
-            dt = datetime.datetime.utcfromtimestamp(start_epoch + seconds_offset)
-            return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+        # Lap Totals
+        total_distance = self._total_distance()
+        yield (
+            "      <Lap>\n"
+            f"        <TotalTimeSeconds>{total_distance / TCX_AVG_SPEED_MPS:.1f}</TotalTimeSeconds>\n"
+            f"        <DistanceMeters>{total_distance:.1f}</DistanceMeters>\n"
+            "      </Lap>\n"
+        )
 
         # 1. Track Points
-        for section in self.sections:
-            segments = section.get('segments', [])
-            for segment in segments:
-                coords = segment.get('geometry', {}).get('coordinates', [])
-                
-                for coord in coords:
-                    if len(coord) < 2: continue
-                    lon, lat = float(coord[0]), float(coord[1])
-                    ele = float(coord[2]) if len(coord) > 2 else 0.0
-                    
-                    coord_key = f"{lat:.6f},{lon:.6f}"
-                    if coord_key == last_coord_key: continue
-                    last_coord_key = coord_key
-
-                    if last_pt:
-                        dist = self._haversine_distance(last_pt[0], last_pt[1], lat, lon)
-                        total_distance += dist
-                    
-                    last_pt = (lat, lon)
-
-                    tp = ET.SubElement(track, "Trackpoint")
-                    
-                    # Time (Required)
-                    t_elem = ET.SubElement(tp, "Time")
-                    t_elem.text = get_time_str(total_distance / avg_speed_mps)
-
-                    pos = ET.SubElement(tp, "Position")
-                    lat_deg = ET.SubElement(pos, "LatitudeDegrees")
-                    lat_deg.text = f"{lat:.6f}"
-                    lon_deg = ET.SubElement(pos, "LongitudeDegrees")
-                    lon_deg.text = f"{lon:.6f}"
-                    
-                    alt = ET.SubElement(tp, "AltitudeMeters")
-                    alt.text = f"{ele:.1f}"
-                    
-                    dist_m = ET.SubElement(tp, "DistanceMeters")
-                    dist_m.text = f"{total_distance:.1f}"
+        yield "      <Track>\n"
+        cum_distance = 0.0
+        last_pt = None
+        for lat, lon, ele in _iter_track_coords(self.sections):
+            if last_pt:
+                cum_distance += _haversine(last_pt[0], last_pt[1], lat, lon)
+            last_pt = (lat, lon)
+
+            yield (
+                "        <Trackpoint>\n"
+                f"          <Time>{_time_str(cum_distance / TCX_AVG_SPEED_MPS)}</Time>\n"
+                "          <Position>\n"
+                f"            <LatitudeDegrees>{lat:.6f}</LatitudeDegrees>\n"
+                f"            <LongitudeDegrees>{lon:.6f}</LongitudeDegrees>\n"
+                "          </Position>\n"
+                f"          <AltitudeMeters>{(ele if ele is not None else 0.0):.1f}</AltitudeMeters>\n"
+                f"          <DistanceMeters>{cum_distance:.1f}</DistanceMeters>\n"
+                "        </Trackpoint>\n"
+            )
+        yield "      </Track>\n"
 
-        # Lap Totals
-        total_time_seconds = total_distance / avg_speed_mps
-        tot_time = ET.SubElement(lap, "TotalTimeSeconds")
-        tot_time.text = f"{total_time_seconds:.1f}"
-        dist_meters = ET.SubElement(lap, "DistanceMeters")
-        dist_meters.text = f"{total_distance:.1f}"
-        
         # 2. Course Points (Waypoints)
+        yield from self._iter_course_points()
+        yield "    </Course>\n  </Courses>\n</TrainingCenterDatabase>\n"
+
+    def _iter_course_points(self) -> Iterator[str]:
         # Re-calculate distance for mapping waypoints
         current_cumulative_dist = 0.0
-        
+
         for s_idx, section in enumerate(self.sections):
             points = section.get('points', [])
             segments = section.get('segments', [])
-            
+
             # The structure is usually: P0 --Seg0--> P1 --Seg1--> P2 ...
             # So Points[i] is at the START of Segments[i] (conceptually for distance calc)
             # Except the last point.
-            
-            # Note: Riduck's section model might share points. 
-            # If we iterate strictly, we assume `points[i]` corresponds to the start of `segments[i]` 
+
+            # Note: Riduck's section model might share points.
+            # If we iterate strictly, we assume `points[i]` corresponds to the start of `segments[i]`
             # and `points[i+1]` is the end of `segments[i]`.
-            
+
             segment_idx = 0
-            
+
             for p_idx, point in enumerate(points):
                 # Determine if this point should be exported
                 # We export:
                 # 1. Section Start (p_idx == 0)
                 # 2. Intermediate Points (Via)
                 # 3. End point (if it's the very last point of the entire route)
-                
+
                 # Check if this point is the start of the NEXT section (shared point)
                 is_last_in_section = (p_idx == len(points) - 1)
                 is_last_section = (s_idx == len(self.sections) - 1)
-                
-                # If it's the last point of a section BUT NOT the last section, 
+
+                # If it's the last point of a section BUT NOT the last section,
                 # it will be the first point of the next section. Skip to avoid duplicate/confusion.
                 if is_last_in_section and not is_last_section:
                     continue
@@ -289,7 +350,7 @@ class TcxExporter:
                 lat = float(point.get('lat', 0))
                 lon = float(point.get('lng', 0))
                 name = point.get('name', '')
-                
+
                 # dist_km
                 dist_km = point.get('dist_km')
                 dist_km_str = f"{float(dist_km):.6f}" if dist_km is not None else None
@@ -319,23 +380,28 @@ class TcxExporter:
                     notes = ";".join(notes_parts)
 
                 # Create Element
-                cp = ET.SubElement(course, "CoursePoint")
-                ET.SubElement(cp, "Name").text = str(name)
-                ET.SubElement(cp, "Time").text = get_time_str(current_cumulative_dist / avg_speed_mps)
-
-                pos = ET.SubElement(cp, "Position")
-                ET.SubElement(pos, "LatitudeDegrees").text = f"{lat:.6f}"
-                ET.SubElement(pos, "LongitudeDegrees").text = f"{lon:.6f}"
-
-                ET.SubElement(cp, "PointType").text = pt_type
+                parts = [
+                    "      <CoursePoint>\n",
+                    f"        <Name>{_text(name)}</Name>\n",
+                    f"        <Time>{_time_str(current_cumulative_dist / TCX_AVG_SPEED_MPS)}</Time>\n",
+                    "        <Position>\n",
+                    f"          <LatitudeDegrees>{lat:.6f}</LatitudeDegrees>\n",
+                    f"          <LongitudeDegrees>{lon:.6f}</LongitudeDegrees>\n",
+                    "        </Position>\n",
+                    f"        <PointType>{pt_type}</PointType>\n",
+                ]
                 if notes:
-                    ET.SubElement(cp, "Notes").text = notes
+                    parts.append(f"        <Notes>{_text(notes)}</Notes>\n")
 
                 # extensions: riduck:dist_km (primary)
                 if dist_km_str:
-                    ext = ET.SubElement(cp, "Extensions")
-                    dk = ET.SubElement(ext, f"{{{RIDUCK_NS}}}dist_km")
-                    dk.text = dist_km_str
+                    parts.append(
+                        "        <Extensions>\n"
+                        f"          <riduck:dist_km>{dist_km_str}</riduck:dist_km>\n"
+                        "        </Extensions>\n"
+                    )
+                parts.append("      </CoursePoint>\n")
+                yield "".join(parts)
 
                 # Advance distance for the NEXT point (which is at the end of current segment)
                 if not is_last_in_section:
@@ -345,11 +411,16 @@ class TcxExporter:
                         coords = seg.get('geometry', {}).get('coordinates', [])
                         seg_dist = 0.0
                         for k in range(len(coords)-1):
-                            seg_dist += self._haversine_distance(coords[k][1], coords[k][0], coords[k+1][1], coords[k+1][0])
+                            seg_dist += _haversine(coords[k][1], coords[k][0], coords[k+1][1], coords[k+1][0])
                         current_cumulative_dist += seg_dist
                         segment_idx += 1
 
-        # Pretty Print
-        rough_string = ET.tostring(root, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        return reparsed.toprettyxml(indent="  ")
+    def validate(self) -> None:
+        """Raises ValueError for payloads iter_xml cannot serialise (call before streaming)."""
+        _validate_sections(self.sections, numeric_latlng=True)
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        return _chunked(self.iter_xml(), chunk_size)
+
+    def to_xml_string(self) -> str:
+        return "".join(self.iter_xml())
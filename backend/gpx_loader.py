@@ -1,10 +1,28 @@
 from __future__ import annotations
 
+import io
+import os
 import re
 import math
 import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, BinaryIO, Iterator, Tuple, Union
+
+import numpy as np
+
+# Upload guards (Cloud Run 메모리 파일시스템 보호)
+MAX_TRACK_POINTS = int(os.environ.get("IMPORT_MAX_POINTS", 200000))
+MAX_TRACK_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", 25 * 1024 * 1024))  # 25MB
+MIN_POINT_SPACING = 0.5  # m, 이보다 가까운 연속 포인트는 제거
+
+RIDUCK_NS = 'https://riduck.dev/xmlns/1'
+
+TrackSource = Union[str, os.PathLike, bytes, bytearray, BinaryIO]
+
+class TrackTooLargeError(ValueError):
+    """Raised when an uploaded track exceeds MAX_TRACK_BYTES or MAX_TRACK_POINTS."""
 
 @dataclass
 class TrackPoint:
@@ -13,13 +31,213 @@ class TrackPoint:
     ele: float
     distance_from_start: float = 0.0
 
+class _LimitedReader(io.RawIOBase):
+    """Wraps a binary stream and fails once more than max_bytes have been read.
+    owns_stream=True 면 close() 시 감싼 스트림도 닫음 (경로로 직접 연 파일)"""
+    def __init__(self, stream: BinaryIO, max_bytes: int, owns_stream: bool = False):
+        self._stream = stream
+        self._remaining = max_bytes
+        self._max_bytes = max_bytes
+        self._owns_stream = owns_stream
+
+    def close(self):
+        try:
+            if self._owns_stream and not self.closed:
+                self._stream.close()
+        finally:
+            super().close()
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._remaining -= len(data)
+        if self._remaining < 0:
+            raise TrackTooLargeError(f"Track file exceeds {self._max_bytes / (1024 * 1024):.1f}MB limit.")
+        return data
+
+def _local(tag: str) -> str:
+    """'{namespace}name' -> 'name'"""
+    return tag.rsplit('}', 1)[-1]
+
+def _child(parent, local_name: str):
+    for child in parent:
+        if _local(child.tag) == local_name:
+            return child
+    return None
+
+def _child_text(parent, local_name: str) -> str:
+    child = _child(parent, local_name)
+    return child.text if child is not None and child.text else ""
+
+def _iter_elements(stream, local_names: Tuple[str, ...]) -> Iterator[ET.Element]:
+    """
+    iterparse로 local_names 에 해당하는 완성된 엘리먼트를 순서대로 반환.
+    처리된 엘리먼트는 부모에서 제거하여 트리가 메모리에 쌓이지 않게 함.
+    """
+    stack = []
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if _local(elem.tag) in local_names:
+            yield elem
+            if stack:
+                # 직전에 처리된 형제들은 이미 제거되었으므로 부모에는 이 엘리먼트만 남아 있음
+                del stack[-1][:]
+
+# Waypoint snapping
+SNAP_PASS_TOLERANCE = 25.0   # m, 최단거리 + 이 값 이내면 같은 후보(통과 지점)로 간주
+SNAP_MAX_FORWARD = 300.0     # m, 진행 방향 후보가 이보다 멀면 순서가 뒤섞인 웨이포인트로 보고 전체 검색
+
+def snap_waypoints(waypoints: List[Dict[str, Any]], lats, lons, dists=None) -> List[int]:
+    """
+    각 웨이포인트를 트랙 포인트 인덱스에 스냅 (파일 순서 기준, 진행 방향으로만 이동).
+
+    - 거리는 웨이포인트 기준 equirectangular 근사(m)로 numpy 일괄 계산
+    - 진행 커서 이후 구간에서 최단거리 + SNAP_PASS_TOLERANCE 이내인 후보 중
+      dist_km 힌트가 있으면 누적거리가 가장 가까운 곳, 없으면 가장 앞선 통과 지점 선택
+      → 왕복(out-and-back) 코스에서 복귀 구간 웨이포인트가 출발 구간에 붙지 않음
+    - 진행 방향 후보가 SNAP_MAX_FORWARD 보다 멀고 전체 최단이 더 가까우면
+      순서가 뒤섞인 웨이포인트로 간주, 전체에서 스냅하고 커서는 유지
+    """
+    lat_arr = np.asarray(lats, dtype=float)
+    lon_arr = np.asarray(lons, dtype=float)
+    n = len(lat_arr)
+    if n == 0:
+        return [0] * len(waypoints)
+    dist_arr = np.asarray(dists, dtype=float) if dists is not None and len(dists) == n else None
+
+    result = []
+    cursor = 0
+    for wpt in waypoints:
+        kx = 111320.0 * math.cos(math.radians(wpt['lat']))
+        d2 = ((lon_arr - wpt['lon']) * kx) ** 2 + ((lat_arr - wpt['lat']) * 110540.0) ** 2
+
+        fwd = d2[cursor:]
+        fwd_min = float(fwd.min())
+        global_idx = int(d2.argmin())
+        if math.sqrt(fwd_min) > SNAP_MAX_FORWARD and d2[global_idx] < fwd_min:
+            result.append(global_idx)
+            continue
+
+        limit = (math.sqrt(fwd_min) + SNAP_PASS_TOLERANCE) ** 2
+        candidates = np.flatnonzero(fwd <= limit) + cursor
+        dist_km = wpt.get('dist_km')
+        if dist_km is not None and dist_arr is not None:
+            best_idx = int(candidates[np.abs(dist_arr[candidates] - dist_km * 1000.0).argmin()])
+        else:
+            # 가장 앞선 통과 지점 내에서의 최근접 포인트
+            breaks = np.flatnonzero(np.diff(candidates) > 1)
+            first_pass = candidates[:breaks[0] + 1] if len(breaks) else candidates
+            best_idx = int(first_pass[d2[first_pass].argmin()])
+        result.append(best_idx)
+        cursor = best_idx
+    return result
+
 class BaseTrackLoader:
-    def __init__(self, file_path: str):
-        self.file_path = file_path
-        self.points: List[TrackPoint] = []
+    # 파싱 대상 엘리먼트 local name (서브클래스에서 지정)
+    TRACK_TAGS: Tuple[str, ...] = ()
+    WAYPOINT_TAGS: Tuple[str, ...] = ()
+
+    def __init__(self, source: TrackSource, max_points: int = MAX_TRACK_POINTS, max_bytes: int = MAX_TRACK_BYTES):
+        """source: 파일 경로, 업로드 bytes, 또는 binary stream (UploadFile.file 등)"""
+        self.file_path = source
+        self.max_points = max_points
+        self.max_bytes = max_bytes
+        self.lats = np.empty(0)
+        self.lons = np.empty(0)
+        self.eles = np.empty(0)
+        self.dists = np.empty(0)
         self.parsed_waypoints: List[Dict[str, Any]] = []
+        self._points: Optional[List[TrackPoint]] = None
 
     def load(self):
+        """Streams the source once, collecting track points into arrays and waypoints into dicts."""
+        lats, lons, eles = array('d'), array('d'), array('d')
+        self.parsed_waypoints = []
+
+        with self._open() as stream:
+            for elem in _iter_elements(stream, self.TRACK_TAGS + self.WAYPOINT_TAGS):
+                if _local(elem.tag) in self.TRACK_TAGS:
+                    pt = self._parse_track_point(elem)
+                    if pt is None: continue
+                    if len(lats) >= self.max_points:
+                        raise TrackTooLargeError(f"Track exceeds {self.max_points} points.")
+                    lats.append(pt[0]); lons.append(pt[1]); eles.append(pt[2])
+                else:
+                    wpt = self._parse_waypoint(elem)
+                    if wpt is not None:
+                        self.parsed_waypoints.append(wpt)
+
+        self._set_track(np.frombuffer(lats), np.frombuffer(lons), np.frombuffer(eles))
+
+    def _open(self):
+        src = self.file_path
+        if isinstance(src, (bytes, bytearray)):
+            if len(src) > self.max_bytes:
+                raise TrackTooLargeError(f"Track file exceeds {self.max_bytes / (1024 * 1024):.1f}MB limit.")
+            return io.BytesIO(src)
+        if isinstance(src, (str, os.PathLike)):
+            return _LimitedReader(open(src, 'rb'), self.max_bytes, owns_stream=True)
+        return _LimitedReader(src, self.max_bytes)
+
+    def _spacing_mask(self, lats: np.ndarray, lons: np.ndarray, step: np.ndarray) -> np.ndarray:
+        """마지막으로 남긴 포인트와의 (직선) 거리가 MIN_POINT_SPACING 이상인 포인트만 남기는 마스크.
+        직전 포인트가 남아 있으면 판정은 step 그대로라 벡터 연산으로 끝나고, 순차 처리는 포인트가
+        빠진 뒤 다시 MIN_POINT_SPACING 밖으로 나가는 포인트를 찾는 동안만 (정지 중 GPS 흔들림 등)"""
+        keep = np.concatenate(([True], step >= MIN_POINT_SPACING))
+        dropped = np.flatnonzero(~keep).tolist()  # 직전 포인트가 남아 있다면 빠지는 포인트
+        if not dropped: return keep
+        lat_list, lon_list = lats.tolist(), lons.tolist()
+        n = len(lat_list)
+        pos = 0
+        while pos < len(dropped):
+            j = dropped[pos]
+            k = j - 1  # 마지막으로 남긴 포인트 (dropped[pos]의 직전 포인트는 항상 남아 있음)
+            keep[j] = False
+            i = j + 1
+            while i < n and self._haversine_distance(lat_list[k], lon_list[k], lat_list[i], lon_list[i]) < MIN_POINT_SPACING:
+                keep[i] = False
+                i += 1
+            if i >= n: break
+            keep[i] = True
+            pos = bisect_right(dropped, i, pos)  # i는 남음 → 이후는 다시 직전 포인트 기준 (step)
+        return keep
+
+    def _set_track(self, lats: np.ndarray, lons: np.ndarray, eles: np.ndarray):
+        """마지막으로 남긴 포인트에서 0.5m 미만인 포인트 제거 후 누적 거리 계산."""
+        if len(lats) > 1:
+            step = self._haversine_array(lats[:-1], lons[:-1], lats[1:], lons[1:])
+            keep = self._spacing_mask(lats, lons, step)
+            lats, lons, eles = lats[keep], lons[keep], eles[keep]
+        self.lats, self.lons, self.eles = lats, lons, eles
+        if len(lats) > 1:
+            step = self._haversine_array(lats[:-1], lons[:-1], lats[1:], lons[1:])
+            self.dists = np.concatenate(([0.0], np.cumsum(step)))
+        else:
+            self.dists = np.zeros(len(lats))
+        self._points = None
+
+    @property
+    def points(self) -> List[TrackPoint]:
+        """TrackPoint 리스트 (기존 호출부 호환용, 최초 접근 시 생성)"""
+        if self._points is None:
+            self._points = [
+                TrackPoint(lat, lon, ele, dist)
+                for lat, lon, ele, dist in zip(self.lats.tolist(), self.lons.tolist(), self.eles.tolist(), self.dists.tolist())
+            ]
+        return self._points
+
+    def shape_points(self) -> List[Dict[str, float]]:
+        return [{"lat": lat, "lon": lon} for lat, lon in zip(self.lats.tolist(), self.lons.tolist())]
+
+    def _parse_track_point(self, elem) -> Optional[Tuple[float, float, float]]:
+        raise NotImplementedError
+
+    def _parse_waypoint(self, elem) -> Optional[Dict[str, Any]]:
         raise NotImplementedError
 
     def process_with_valhalla(self, valhalla_client) -> Dict[str, Any]:
@@ -27,29 +245,22 @@ class BaseTrackLoader:
         Uses Valhalla to analyze the track (surface, elevation) and snaps waypoints.
         Returns the final JSON structure for the frontend.
         """
-        if not self.points:
+        if not len(self.lats):
             raise ValueError("No track points loaded.")
 
         # 1. Valhalla Analysis
-        shape_points = [{"lat": p.lat, "lon": p.lon} for p in self.points]
+        shape_points = self.shape_points()
         standard_data = valhalla_client.get_standard_course(shape_points)
         
         v_lats = standard_data['points']['lat']
         v_lons = standard_data['points']['lon']
         v_eles = standard_data['points']['ele']
         
-        # 2. Snap Waypoints to Valhalla Track
+        # 2. Snap Waypoints to Valhalla Track (progress-aware, vectorized)
         updated_waypoints = []
         if self.parsed_waypoints:
-            for wpt in self.parsed_waypoints:
-                min_dist = float('inf')
-                best_idx = 0
-                for i in range(len(v_lats)):
-                    d = (wpt['lat'] - v_lats[i])**2 + (wpt['lon'] - v_lons[i])**2
-                    if d < min_dist:
-                        min_dist = d
-                        best_idx = i
-                
+            indices = snap_waypoints(self.parsed_waypoints, v_lats, v_lons, standard_data['points'].get('dist'))
+            for wpt, best_idx in zip(self.parsed_waypoints, indices):
                 wpt_copy = wpt.copy()
                 wpt_copy['index'] = best_idx
                 wpt_copy['lat'] = v_lats[best_idx]
@@ -92,13 +303,16 @@ class BaseTrackLoader:
             0: ("Unknown", "Unknown surface type.", "#9E9E9E")
         }
         
+        coords_2d = np.column_stack((np.asarray(v_lons, dtype=float), np.asarray(v_lats, dtype=float)))
+        coords_3d = np.column_stack((coords_2d, np.asarray(v_eles, dtype=float)))
+
         for i in range(len(segs['p_start'])):
             s_idx = segs['p_start'][i]
             e_idx = segs['p_end'][i]
             surf_id = segs['surf_id'][i]
             label, description, color = surface_info.get(surf_id, surface_info[0])
             
-            seg_coords = [[v_lons[k], v_lats[k]] for k in range(s_idx, e_idx + 1)]
+            seg_coords = coords_2d[s_idx:e_idx + 1].tolist()
             if len(seg_coords) >= 2:
                 features.append({
                     "type": "Feature",
@@ -119,12 +333,20 @@ class BaseTrackLoader:
             },
             "full_geometry": {
                 "type": "LineString",
-                "coordinates": [[float(v_lons[i]), float(v_lats[i]), float(v_eles[i])] for i in range(len(v_lats))]
+                "coordinates": coords_3d.tolist()
             },
             "display_geojson": {"type": "FeatureCollection", "features": features},
             "waypoints": updated_waypoints
         }
 
+    @staticmethod
+    def _haversine_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+        R = 6371000
+        phi1, phi2 = np.radians(lat1), np.radians(lat2)
+        dphi, dlambda = phi2 - phi1, np.radians(lon2 - lon1)
+        a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
+        return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
     def _haversine_distance(self, lat1, lon1, lat2, lon2) -> float:
         R = 6371000 
         phi1, phi2 = math.radians(lat1), math.radians(lat2)
@@ -132,255 +354,182 @@ class BaseTrackLoader:
         a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
         return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
 
+GPX_SYM_MAP = {
+    'Turn Left': 'turn_left',
+    'Turn Right': 'turn_right',
+    'Straight': 'straight',
+    'U-Turn': 'u_turn',
+    'Restaurant': 'food',
+    'Food': 'food',
+    'Water': 'water',
+    'Drinking Water': 'water',
+    'Summit': 'summit',
+    'Danger': 'danger',
+    'Caution': 'danger',
+    'Information': 'info',
+}
+
+TCX_POINT_TYPE_MAP = {
+    'Left': 'turn_left',
+    'Right': 'turn_right',
+    'Straight': 'straight',
+    'Food': 'food',
+    'Water': 'water',
+    'Summit': 'summit',
+    'Danger': 'danger',
+    'Valley': 'info',
+    'Generic': 'via',
+}
+
 class GpxLoader(BaseTrackLoader):
-    def __init__(self, gpx_path: str):
-        super().__init__(gpx_path)
+    """Parses GPX track points (trkpt) and waypoints (wpt), namespace agnostic."""
+    TRACK_TAGS = ('trkpt',)
+    WAYPOINT_TAGS = ('wpt',)
 
-    def load(self):
-        """Parses the GPX file to extract raw track points and waypoints."""
-        tree = ET.parse(self.file_path)
-        root = tree.getroot()
-        
-        # Handle Namespace
-        ns_url = 'http://www.topografix.com/GPX/1/1'
-        ns = {'gpx': ns_url}
-        if '}' in root.tag and ns_url not in root.tag:
-             ns_url = root.tag.split('}')[0].strip('{')
-             ns = {'gpx': ns_url}
-
-        # 1. Parse Track Points
-        trkpts = root.findall(".//gpx:trkpt", ns) or root.findall(".//trkpt")
-        self.points = []
-        total_dist = 0.0
-        prev_pt = None
-
-        for pt in trkpts:
+    def __init__(self, gpx_path: TrackSource, **limits):
+        super().__init__(gpx_path, **limits)
+
+    def _parse_track_point(self, pt):
+        try:
             lat = float(pt.attrib['lat'])
             lon = float(pt.attrib['lon'])
-            
-            # NOTE: `or` 를 쓰면 자식 없는 leaf 엘리먼트가 falsy 로 평가되어
-            # 두 번째 find 가 실행됨 → 항상 None 반환. is None 체크로 수정.
-            ele_node = pt.find('gpx:ele', ns)
-            if ele_node is None:
-                ele_node = pt.find('ele')
-            ele = float(ele_node.text) if ele_node is not None and ele_node.text else 0.0
-
-            current_pt = TrackPoint(lat, lon, ele)
-            if prev_pt:
-                d = self._haversine_distance(prev_pt.lat, prev_pt.lon, current_pt.lat, current_pt.lon)
-                if d < 0.5: continue
-                total_dist += d
-            
-            current_pt.distance_from_start = total_dist
-            self.points.append(current_pt)
-            prev_pt = current_pt
-            
-        # 2. Parse Waypoints
-        wpts = root.findall(".//gpx:wpt", ns) or root.findall(".//wpt")
-        self.parsed_waypoints = []
-        
-        def get_text(node, tag_names):
-            for tag in tag_names:
-                child = node.find(tag, ns) if ':' in tag else node.find(tag)
-                if child is not None and child.text:
-                    return child.text
-            return ""
-
-        RIDUCK_NS = 'https://riduck.dev/xmlns/1'
-
-        GPX_SYM_MAP = {
-            'Turn Left': 'turn_left',
-            'Turn Right': 'turn_right',
-            'Straight': 'straight',
-            'U-Turn': 'u_turn',
-            'Restaurant': 'food',
-            'Food': 'food',
-            'Water': 'water',
-            'Drinking Water': 'water',
-            'Summit': 'summit',
-            'Danger': 'danger',
-            'Caution': 'danger',
-            'Information': 'info',
-        }
-
-        for wpt in wpts:
+        except (KeyError, ValueError):
+            return None
+        ele_text = _child_text(pt, 'ele')
+        try:
+            ele = float(ele_text) if ele_text else 0.0
+        except ValueError:
+            ele = 0.0
+        return lat, lon, ele
+
+    def _parse_waypoint(self, wpt):
+        try:
             lat = float(wpt.attrib['lat'])
             lon = float(wpt.attrib['lon'])
+        except (KeyError, ValueError):
+            return None
 
-            name = get_text(wpt, ['gpx:name', 'name'])
-            sym = get_text(wpt, ['gpx:sym', 'sym'])
-            desc = get_text(wpt, ['gpx:desc', 'desc'])
-
-            color = "#2a9e92"
-            if "Riduck" in sym:
-                color_match = re.search(r"Color:(#[0-9a-fA-F]{6})", desc)
-                if color_match: color = color_match.group(1)
-
-            # Determine waypoint type
-            if "Riduck_Section_Start" in sym:
-                wpt_type = "section_start"
-            elif "Riduck_Type:" in desc:
-                type_match = re.search(r"Riduck_Type:(\w+)", desc)
-                wpt_type = type_match.group(1) if type_match else 'via'
-            else:
-                wpt_type = GPX_SYM_MAP.get(sym, 'via')
-
-            # dist_km: extensions 우선, desc fallback
-            dist_km = None
-            ext_node = wpt.find(f'gpx:extensions', ns) or wpt.find('extensions')
-            if ext_node is not None:
-                dk_node = ext_node.find(f'{{{RIDUCK_NS}}}dist_km')
-                if dk_node is not None and dk_node.text:
-                    try: dist_km = float(dk_node.text)
-                    except ValueError: pass
-            if dist_km is None:
-                dk_match = re.search(r"Riduck_DistKm=([\d.]+)", desc)
-                if dk_match:
-                    try: dist_km = float(dk_match.group(1))
-                    except ValueError: pass
-
-            self.parsed_waypoints.append({
-                "lat": lat, "lon": lon, "name": name, "sym": sym, "color": color,
-                "type": wpt_type,
-                "dist_km": dist_km
-            })
+        name = _child_text(wpt, 'name')
+        sym = _child_text(wpt, 'sym')
+        desc = _child_text(wpt, 'desc')
+
+        color = "#2a9e92"
+        if "Riduck" in sym:
+            color_match = re.search(r"Color:(#[0-9a-fA-F]{6})", desc)
+            if color_match: color = color_match.group(1)
+
+        # Determine waypoint type
+        if "Riduck_Section_Start" in sym:
+            wpt_type = "section_start"
+        elif "Riduck_Type:" in desc:
+            type_match = re.search(r"Riduck_Type:(\w+)", desc)
+            wpt_type = type_match.group(1) if type_match else 'via'
+        else:
+            wpt_type = GPX_SYM_MAP.get(sym, 'via')
+
+        # dist_km: extensions 우선, desc fallback
+        dist_km = None
+        ext_node = _child(wpt, 'extensions')
+        if ext_node is not None:
+            dk_node = ext_node.find(f'{{{RIDUCK_NS}}}dist_km')
+            if dk_node is not None and dk_node.text:
+                try: dist_km = float(dk_node.text)
+                except ValueError: pass
+        if dist_km is None:
+            dk_match = re.search(r"Riduck_DistKm=([\d.]+)", desc)
+            if dk_match:
+                try: dist_km = float(dk_match.group(1))
+                except ValueError: pass
+
+        return {
+            "lat": lat, "lon": lon, "name": name, "sym": sym, "color": color,
+            "type": wpt_type,
+            "dist_km": dist_km
+        }
 
 class TcxLoader(BaseTrackLoader):
-    def __init__(self, tcx_path: str):
-        super().__init__(tcx_path)
+    """Parses TCX Trackpoints and CoursePoints, namespace agnostic."""
+    TRACK_TAGS = ('Trackpoint',)
+    WAYPOINT_TAGS = ('CoursePoint',)
 
-    def load(self):
-        """Parses the TCX file to extract raw track points and course points."""
-        tree = ET.parse(self.file_path)
-        root = tree.getroot()
-        
-        self.points = []
-        self.parsed_waypoints = []
-        
-        total_dist = 0.0
-        prev_pt = None
-
-        # Helper to find child by local name (ignoring namespace)
-        def find_child(parent, local_name):
-            for child in parent:
-                if child.tag.endswith(local_name):
-                    return child
+    def __init__(self, tcx_path: TrackSource, **limits):
+        super().__init__(tcx_path, **limits)
+
+    @staticmethod
+    def _position(node) -> Optional[Tuple[float, float]]:
+        position = _child(node, 'Position')
+        if position is None: return None
+
+        lat_node = _child(position, 'LatitudeDegrees')
+        lon_node = _child(position, 'LongitudeDegrees')
+        if lat_node is None or lon_node is None: return None
+
+        try:
+            return float(lat_node.text), float(lon_node.text)
+        except (ValueError, TypeError):
             return None
 
-        # 1. Parse Track Points (Namespace Agnostic)
-        for elem in root.iter():
-            if elem.tag.endswith('Trackpoint'):
-                tp = elem
-                
-                position = find_child(tp, 'Position')
-                if position is None: continue
-                
-                lat_node = find_child(position, 'LatitudeDegrees')
-                lon_node = find_child(position, 'LongitudeDegrees')
-                
-                if lat_node is None or lon_node is None: continue
-                
-                try:
-                    lat = float(lat_node.text)
-                    lon = float(lon_node.text)
-                except (ValueError, AttributeError):
-                    continue
-                
-                alt_node = find_child(tp, 'AltitudeMeters')
-                ele = 0.0
-                if alt_node is not None and alt_node.text:
-                    try:
-                        ele = float(alt_node.text)
-                    except ValueError:
-                        pass
-
-                current_pt = TrackPoint(lat, lon, ele)
-                
-                if prev_pt:
-                    d = self._haversine_distance(prev_pt.lat, prev_pt.lon, current_pt.lat, current_pt.lon)
-                    if d < 0.5: continue
-                    total_dist += d
-                
-                current_pt.distance_from_start = total_dist
-                self.points.append(current_pt)
-                prev_pt = current_pt
-
-        # 2. Parse CoursePoints (Waypoints)
-        for elem in root.iter():
-            if elem.tag.endswith('CoursePoint'):
-                cp = elem
-                
-                name_node = find_child(cp, 'Name')
-                name = name_node.text if name_node is not None else "Point"
-                
-                notes_node = find_child(cp, 'Notes')
-                notes = notes_node.text if notes_node is not None else ""
-                
-                pt_type_node = find_child(cp, 'PointType')
-                pt_type = pt_type_node.text if pt_type_node is not None else "Generic"
-                
-                position = find_child(cp, 'Position')
-                if position is None: continue
-                
-                lat_node = find_child(position, 'LatitudeDegrees')
-                lon_node = find_child(position, 'LongitudeDegrees')
-                
-                if lat_node is None or lon_node is None: continue
-                
-                try:
-                    lat = float(lat_node.text)
-                    lon = float(lon_node.text)
-                except (ValueError, AttributeError):
-                    continue
-                
-                TCX_POINT_TYPE_MAP = {
-                    'Left': 'turn_left',
-                    'Right': 'turn_right',
-                    'Straight': 'straight',
-                    'Food': 'food',
-                    'Water': 'water',
-                    'Summit': 'summit',
-                    'Danger': 'danger',
-                    'Valley': 'info',
-                    'Generic': 'via',
-                }
-
-                # Riduck Specific Parsing from Notes
-                color = "#2a9e92"
-                is_section_start = False
-
-                if notes and "Riduck_Section" in notes:
-                    is_section_start = True
-                    color_match = re.search(r"Color:(#[0-9a-fA-F]{6})", notes)
-                    if color_match: color = color_match.group(1)
-
-                # Determine waypoint type
-                if is_section_start:
-                    wpt_type = "section_start"
-                elif notes and "Riduck_Type:" in notes:
-                    type_match = re.search(r"Riduck_Type:(\w+)", notes)
-                    wpt_type = type_match.group(1) if type_match else 'via'
-                else:
-                    wpt_type = TCX_POINT_TYPE_MAP.get(pt_type, 'via')
-
-                # dist_km: Extensions 우선, Notes fallback
-                RIDUCK_NS = 'https://riduck.dev/xmlns/1'
-                dist_km = None
-                ext_node = find_child(cp, 'Extensions')
-                if ext_node is not None:
-                    for child in ext_node:
-                        if child.tag.endswith('}dist_km') or child.tag == 'dist_km':
-                            try: dist_km = float(child.text)
-                            except (ValueError, TypeError): pass
-                if dist_km is None and notes:
-                    dk_match = re.search(r"Riduck_DistKm=([\d.]+)", notes)
-                    if dk_match:
-                        try: dist_km = float(dk_match.group(1))
-                        except ValueError: pass
-
-                self.parsed_waypoints.append({
-                    "lat": lat, "lon": lon, "name": name, "sym": pt_type, "color": color,
-                    "type": wpt_type,
-                    "dist_km": dist_km
-                })
+    def _parse_track_point(self, tp):
+        pos = self._position(tp)
+        if pos is None: return None
+
+        ele = 0.0
+        alt_text = _child_text(tp, 'AltitudeMeters')
+        if alt_text:
+            try:
+                ele = float(alt_text)
+            except ValueError:
+                pass
+        return pos[0], pos[1], ele
+
+    def _parse_waypoint(self, cp):
+        name_node = _child(cp, 'Name')
+        name = name_node.text if name_node is not None else "Point"
+
+        notes_node = _child(cp, 'Notes')
+        notes = notes_node.text if notes_node is not None else ""
+
+        pt_type_node = _child(cp, 'PointType')
+        pt_type = pt_type_node.text if pt_type_node is not None else "Generic"
+
+        pos = self._position(cp)
+        if pos is None: return None
+        lat, lon = pos
+
+        # Riduck Specific Parsing from Notes
+        color = "#2a9e92"
+        is_section_start = False
+
+        if notes and "Riduck_Section" in notes:
+            is_section_start = True
+            color_match = re.search(r"Color:(#[0-9a-fA-F]{6})", notes)
+            if color_match: color = color_match.group(1)
+
+        # Determine waypoint type
+        if is_section_start:
+            wpt_type = "section_start"
+        elif notes and "Riduck_Type:" in notes:
+            type_match = re.search(r"Riduck_Type:(\w+)", notes)
+            wpt_type = type_match.group(1) if type_match else 'via'
+        else:
+            wpt_type = TCX_POINT_TYPE_MAP.get(pt_type, 'via')
+
+        # dist_km: Extensions 우선, Notes fallback
+        dist_km = None
+        ext_node = _child(cp, 'Extensions')
+        if ext_node is not None:
+            for child in ext_node:
+                if _local(child.tag) == 'dist_km':
+                    try: dist_km = float(child.text)
+                    except (ValueError, TypeError): pass
+        if dist_km is None and notes:
+            dk_match = re.search(r"Riduck_DistKm=([\d.]+)", notes)
+            if dk_match:
+                try: dist_km = float(dk_match.group(1))
+                except ValueError: pass
 
+        return {
+            "lat": lat, "lon": lon, "name": name, "sym": pt_type, "color": color,
+            "type": wpt_type,
+            "dist_km": dist_km
+        }
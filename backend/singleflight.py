@@ -0,0 +1,113 @@
+"""
+Single-flight 요청 병합
+
+같은 키의 요청이 이미 진행 중이면 새로 호출하지 않고 진행 중인 호출의 결과를 공유.
+- 동기(스레드) 호출과 비동기(asyncio) 호출이 같은 테이블을 사용하므로
+  ValhallaClient(sync httpx)와 planner(async httpx)의 동일 요청도 하나로 합쳐짐
+- 결과는 공유되므로 호출자는 반환값을 변경하지 말 것 (httpx.Response는 .json()이 매번 새 객체를 만듦)
+- leader가 취소되면(asyncio.CancelledError 등) follower에는 전파하지 않고 follower 중 하나가 새 leader로 재시도
+- 키별 upstream/coalesced 카운터 제공
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+# leader가 Exception이 아닌 이유(취소 등)로 끝남: follower는 결과 없이 다시 _join
+_LEADER_GONE = object()
+
+
+def payload_key(endpoint: str, payload: Any) -> str:
+    """endpoint + 정규화된 JSON payload 해시"""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return f"{endpoint}:{hashlib.sha1(body.encode('utf-8')).hexdigest()}"
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class SingleFlight:
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._inflight: Dict[str, Tuple[Future, Any, str]] = {}  # key -> (future, leader의 event loop, label)
+        self._lock = threading.Lock()
+        self._upstream = defaultdict(int)
+        self._coalesced = defaultdict(int)
+
+    def _join(self, key: str, label: str, blocking: bool = False) -> Tuple[Future, bool]:
+        """(future, leader 여부). leader만 실제 호출을 수행"""
+        loop = _running_loop()
+        with self._lock:
+            entry = self._inflight.get(key)
+            # event loop 스레드에서 동기 대기하면 같은 loop의 async leader가 끝날 수 없으므로 병합하지 않음
+            if entry is not None and not (blocking and loop is not None and entry[1] is loop):
+                self._coalesced[label] += 1
+                return entry[0], False
+            fut = Future()
+            if entry is None: self._inflight[key] = (fut, loop, label)
+            self._upstream[label] += 1
+            return fut, True
+
+    def _finish(self, key: str, fut: Future, result: Any = None, error: BaseException = None) -> None:
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is fut: del self._inflight[key]
+        if error is not None: fut.set_exception(error)
+        else: fut.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], Any], label: str = "default") -> Any:
+        while True:
+            fut, leader = self._join(key, label, blocking=True)
+            if leader: break
+            result = fut.result()
+            if result is not _LEADER_GONE: return result
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key, fut, error=e)
+            raise
+        except BaseException:
+            self._finish(key, fut, _LEADER_GONE)
+            raise
+        self._finish(key, fut, result)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]], label: str = "default") -> Any:
+        while True:
+            fut, leader = self._join(key, label)
+            if leader: break
+            # shield: follower가 취소돼도 공유 future는 취소하지 않음
+            result = await asyncio.shield(asyncio.wrap_future(fut))
+            if result is not _LEADER_GONE: return result
+        try:
+            result = await fn()
+        except Exception as e:
+            self._finish(key, fut, error=e)
+            raise
+        except BaseException:
+            # leader 요청의 취소(클라이언트 연결 끊김 등)는 follower에 전파하지 않음 → follower가 다시 시도
+            self._finish(key, fut, _LEADER_GONE)
+            raise
+        self._finish(key, fut, result)
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """{label: {"upstream": n, "coalesced": m, "inflight": k}}"""
+        with self._lock:
+            labels = set(self._upstream) | set(self._coalesced)
+            inflight = defaultdict(int)
+            for _, _, label in self._inflight.values():
+                inflight[label] += 1
+            return {
+                label: {"upstream": self._upstream[label], "coalesced": self._coalesced[label], "inflight": inflight[label]}
+                for label in sorted(labels)
+            }
@@ -6,24 +6,49 @@ SHARED MODULE: Valhalla Client & Unified Parser
 로직 수정 시 반드시 양쪽 프로젝트의 파일을 모두 최신화해야 합니다.
 
 Source Location: bike_course_simulator/src/valhalla_client.py
+Dependencies: singleflight.py, valhalla_scheduler.py, valhalla_resilience.py, valhalla_metrics.py, metrics.py (함께 복사)
 ================================================================================
 """
 
 import os
 import math
 import httpx
+import numpy as np
 import polyline
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
+
+from singleflight import SingleFlight, payload_key
+from valhalla_scheduler import valhalla_scheduler, BATCH
+from valhalla_resilience import Attempt, valhalla_resilience, collect_degraded, report_degraded
+from valhalla_metrics import (course_span, stage, current_stage, current_trace, record_upstream,
+                              record_chunks, record_deviations, record_repair_winner, record_stitch)
 
 # --- Configuration (Environment Variables) ---
 VALHALLA_URL = os.environ.get("VALHALLA_URL", "http://localhost:8002")
 GRADE_THRESHOLD = float(os.environ.get("SIM_SEGMENT_GRADE_THRESHOLD", 0.005))   # 0.5%
 HEADING_THRESHOLD = float(os.environ.get("SIM_SEGMENT_HEADING_THRESHOLD", 10.0)) # 10.0 deg
 MAX_LENGTH = float(os.environ.get("SIM_SEGMENT_MAX_LENGTH", 200.0))             # 200m
-CHUNK_SIZE = int(os.environ.get("VALHALLA_CHUNK_SIZE", 3000))
+CHUNK_SIZE = int(os.environ.get("VALHALLA_CHUNK_SIZE", 3000))  # trace_attributes 1회 최대 포인트 (overlap 포함)
+CHUNK_OVERLAP_MIN = int(os.environ.get("VALHALLA_CHUNK_OVERLAP_MIN", 30))   # 직선 구간 경계의 overlap (경계 앞뒤 각각, 포인트)
+CHUNK_OVERLAP_MAX = int(os.environ.get("VALHALLA_CHUNK_OVERLAP_MAX", 120))  # 굴곡 구간 경계의 overlap
+CHUNK_SEARCH = int(os.environ.get("VALHALLA_CHUNK_SEARCH", 600))            # 경계 후보를 찾는 범위 (포인트)
+AMBIGUITY_WINDOW = 10       # 경계 후보의 앞뒤 방향을 잴 현(chord) 길이 (포인트, 30m 간격이면 ~300m)
+AMBIGUITY_TURN_DEG = 45.0   # 이 이상 꺾이는 구간은 최대 overlap
+AMBIGUITY_STRAIGHT_DEG = 5.0  # 이 이하면 직선으로 보고 가능한 한 뒤쪽 경계 선택 (청크 수 최소화)
+STITCH_EDGE_WINDOW = 300    # 이어 붙일 때 id를 비교할 기존 결과 끝쪽 edge 수
+STITCH_MAX_DIST_M = 1000.0  # 접합 edge는 경계 포인트에서 이 거리 안이어야 함
+STITCH_NODE_TOL_M = 5.0     # 양쪽 청크의 접합 edge 시작점이 같은 노드로 볼 거리
 MATCH_THRESHOLD = float(os.environ.get("VALHALLA_MATCH_THRESHOLD", 65.0))
 FALLBACK_MODE = os.environ.get("VALHALLA_FALLBACK_MODE", "true").lower() == "true"
 
+# 폴백/부분 실패로 처리하는 upstream 오류 (HTTP 오류, JSON 파싱 실패).
+# ValhallaOverloaded / ValhallaUnavailable 은 포함하지 않으므로 호출자까지 전파됨
+UPSTREAM_ERRORS = (httpx.HTTPError, ValueError)
+
+# 프로세스 전역 single-flight: 동시에 들어온 동일 payload 요청은 upstream 1회로 병합
+# (ValhallaClient와 app/routers/plan.py가 공유)
+valhalla_flight = SingleFlight("valhalla")
+
 # --- Constants & Mapping ---
 SURFACE_MAP = {
     0: "unknown",
@@ -50,91 +75,207 @@ def get_surface_id(edge: Dict[str, Any]) -> int:
     if surf in ["asphalt", "paved", "paved_smooth"]: return 1
     return 0
 
+def _ambiguity_scores(points: List[Dict[str, float]]) -> np.ndarray:
+    """
+    포인트별 매칭 모호도(도): AMBIGUITY_WINDOW 포인트 앞 → 현재 → 뒤 현(chord) 방향의 꺾임 각.
+    현 방향을 쓰므로 GPS 노이즈에 의한 포인트 간 방향 흔들림은 무시되고, 긴 직선일수록 0에 가까움
+    """
+    n, w = len(points), AMBIGUITY_WINDOW
+    lat = np.radians([p['lat'] for p in points])
+    lon = np.radians([p['lon'] for p in points])
+    idx = np.arange(n)
+    prev, nxt = np.maximum(0, idx - w), np.minimum(n - 1, idx + w)
+
+    def bearing(a, b):
+        dlon = lon[b] - lon[a]
+        y = np.sin(dlon) * np.cos(lat[b])
+        x = np.cos(lat[a]) * np.sin(lat[b]) - np.sin(lat[a]) * np.cos(lat[b]) * np.cos(dlon)
+        return np.degrees(np.arctan2(y, x))
+
+    turn = np.abs((bearing(idx, nxt) - bearing(prev, idx) + 180.0) % 360.0 - 180.0)
+    turn[(prev == idx) | (nxt == idx)] = 0.0  # 양 끝은 경계 후보가 아님
+    return turn
+
+
+def plan_chunks(points: List[Dict[str, float]], chunk_size: int = CHUNK_SIZE) -> List[Tuple[int, int, int, int]]:
+    """
+    긴 입력을 trace_attributes 청크로 분할. [(req_start, keep_start, keep_end, req_end)]
+    - 경계(keep_end)는 허용 범위 끝 CHUNK_SEARCH 포인트 안에서 고름: 직선 지점 중 가장 뒤쪽,
+      직선이 없으면 가장 덜 꺾인 지점
+    - overlap은 경계의 모호도에 비례 (직선 CHUNK_OVERLAP_MIN ~ 굴곡 CHUNK_OVERLAP_MAX), 경계 앞뒤로 대칭
+    - 요청 길이(req_end - req_start)는 chunk_size 이하
+    """
+    n = len(points)
+    if n <= chunk_size: return [(0, 0, n, n)]
+    max_ov = min(CHUNK_OVERLAP_MAX, chunk_size // 4)
+    min_ov = min(CHUNK_OVERLAP_MIN, max_ov)
+    scores = _ambiguity_scores(points)
+    overlaps = min_ov + ((max_ov - min_ov) * np.minimum(1.0, scores / AMBIGUITY_TURN_DEG)).astype(int)
+
+    chunks = []
+    keep_start = req_start = 0
+    while n - req_start > chunk_size:
+        limit = req_start + chunk_size  # 경계 + overlap 이 요청 한도를 넘지 않도록
+        cand = np.arange(max(keep_start + 1, limit - max_ov - CHUNK_SEARCH), limit - min_ov + 1)
+        cand = cand[cand + overlaps[cand] <= limit]
+        straight = np.flatnonzero(scores[cand] <= AMBIGUITY_STRAIGHT_DEG)
+        k = straight[-1] if straight.size else len(cand) - 1 - int(np.argmin(scores[cand][::-1]))
+        cut = int(cand[k])
+        ov = int(overlaps[cut])
+        chunks.append((req_start, keep_start, cut, min(n, cut + ov)))
+        keep_start, req_start = cut, cut - ov
+    chunks.append((req_start, keep_start, n, n))
+    return chunks
+
+
 class ValhallaClient:
-    def __init__(self, url: str = VALHALLA_URL):
+    def __init__(self, url: str = VALHALLA_URL, priority: int = BATCH):
         self.url = url
         self.timeout = 60.0 
+        self.priority = priority  # valhalla_scheduler 우선순위 (INTERACTIVE / BATCH)
+
+    def _post(self, endpoint: str, payload: Dict[str, Any], max_timeout: float) -> httpx.Response:
+        """
+        Valhalla POST (동일 요청 병합 + 동시성 제한 + breaker/hedging).
+        timeout은 payload 크기로 정하고 max_timeout을 상한으로 사용.
+        반환된 Response는 공유되므로 .json() 결과만 사용.
+        """
+        url = f"{self.url}{endpoint}"
+        stage_name, trace = current_stage(), current_trace()  # hedge 스레드에는 contextvar가 없으므로 미리 캡처
+        def send(timeout: float, hedge: bool, attempt: Attempt) -> httpx.Response:
+            # hedge 요청은 슬롯이 비어 있을 때만 (대기하지 않음)
+            with valhalla_scheduler.lane(endpoint).slot(self.priority, timeout=0 if hedge else None):
+                attempt.started()  # latency / hedge 타이머는 슬롯을 받은 뒤부터
+                with httpx.Client(timeout=timeout) as client:
+                    try:
+                        resp = client.post(url, json=payload, extensions=attempt.extensions)
+                    except httpx.HTTPError:
+                        record_upstream(endpoint, stage_name, trace)
+                        raise
+            record_upstream(endpoint, stage_name, trace, resp)
+            return resp
+        call = lambda: valhalla_resilience.call(endpoint, payload, send, cap=max_timeout)
+        return valhalla_flight.do(payload_key(url, payload), call, label=endpoint)
 
     def get_standard_course(self, shape_points: List[Dict[str, float]]) -> Dict[str, Any]:
-        """Valhalla API를 호출하여 표준 JSON(v1.0) 데이터를 생성"""
-        
+        """
+        Valhalla API를 호출하여 표준 JSON(v1.0) 데이터를 생성.
+        폴백/부분 실패가 있었으면 meta.degraded 에 [{stage, reason, ...}] 로 기록.
+        단계별 시간/요청 수는 valhalla_metrics (Prometheus 메트릭 + Sentry span) 로 집계.
+        """
+        with collect_degraded() as degraded, course_span(len(shape_points)):
+            result = self._build_standard_course(shape_points)
+        if degraded: result["meta"]["degraded"] = degraded
+        return result
+
+    def _build_standard_course(self, shape_points: List[Dict[str, float]]) -> Dict[str, Any]:
         # [Step 0] Smart Gap Filling & Upsampling
-        processed_input = self._fill_gaps_with_routing(shape_points, gap_threshold=500.0)
+        with stage("gap_fill"):
+            processed_input = self._fill_gaps_with_routing(shape_points, gap_threshold=500.0)
         # Add extra points at sharp turns (U-turns) to prevent map-matching errors (e.g. detours)
-        processed_input = self._densify_at_turns(processed_input, turn_degree=80.0, step=5.0)
-        processed_input = self._upsample_points(processed_input, max_interval=30.0)
+        with stage("densify"):
+            processed_input = self._densify_at_turns(processed_input, turn_degree=80.0, step=5.0)
+        with stage("upsample"):
+            processed_input = self._upsample_points(processed_input, max_interval=30.0)
         
         total_points = len(processed_input)
         if total_points <= CHUNK_SIZE:
+            record_chunks(1)
             return self._request_and_parse(processed_input)
             
-        print(f"Input points {total_points} > {CHUNK_SIZE}, splitting into chunks...")
-        
-        OVERLAP = 200 
+        chunks = plan_chunks(processed_input)
+        overlap_pts = sum(req_end - req_start for req_start, _, _, req_end in chunks) - total_points
+        print(f"Input points {total_points} > {CHUNK_SIZE}, splitting into {len(chunks)} chunks (overlap {overlap_pts} pts)...")
+        record_chunks(len(chunks))
+
         merged_edges = []
         merged_shape = [] # [[lat,lon], ...]
-        
-        current_idx = 0
-        while current_idx < total_points:
-            end_idx = min(current_idx + CHUNK_SIZE, total_points)
-            req_start = max(0, current_idx - OVERLAP)
-            req_end = end_idx
-            
-            chunk_input = processed_input[req_start : req_end]
-            result = self._request_raw_data_no_ele(chunk_input)
-            
-            edges = result["edges"]
-            shape = result["shape_points"]
-            
-            # --- Geometric Stitching Logic ---
-            if current_idx == 0:
-                merged_edges.extend(edges)
-                merged_shape.extend(shape)
-            else:
-                if not merged_shape:
-                    merged_shape.extend(shape)
-                    merged_edges.extend(edges)
-                else:
-                    last_pt = merged_shape[-1]
-                    best_idx = 0
-                    min_dist = float('inf')
-                    search_limit = min(len(shape), OVERLAP * 2) 
-                    
-                    for k in range(search_limit):
-                        curr_pt = shape[k]
-                        d = (last_pt[0] - curr_pt[0])**2 + (last_pt[1] - curr_pt[1])**2
-                        if d < min_dist:
-                            min_dist = d
-                            best_idx = k
-                    
-                    shape_to_append = shape[best_idx:]
-                    if len(shape_to_append) > 1:
-                        shape_to_append = shape_to_append[1:]
-                        best_idx += 1
-                    
-                    prev_shape_len = len(merged_shape)
-                    merged_shape.extend(shape_to_append)
-                    
-                    for edge in edges:
-                        start_i = edge.get("begin_shape_index", 0)
-                        end_i = edge.get("end_shape_index", 0)
-                        if end_i < best_idx: continue
-                        
-                        new_start_i = max(start_i, best_idx)
-                        mapped_start = prev_shape_len + (new_start_i - best_idx)
-                        mapped_end = prev_shape_len + (end_i - best_idx)
-                        
-                        edge["begin_shape_index"] = mapped_start
-                        edge["end_shape_index"] = mapped_end
-                        merged_edges.append(edge)
-
-            current_idx += CHUNK_SIZE - OVERLAP 
-            if req_end == total_points: break
+        for req_start, keep_start, _, req_end in chunks:
+            result = self._request_raw_data_no_ele(processed_input[req_start : req_end])
+            boundary = processed_input[keep_start]
+            method = self._stitch_chunk(merged_edges, merged_shape, result["edges"], result["shape_points"], boundary)
+            record_stitch(method)
 
         print(f"Fetching bulk elevations for {len(merged_shape)} points...")
         final_elevations = self._get_bulk_elevations(merged_shape)
         return self._parse_to_standard_format({"edges": merged_edges}, merged_shape, final_elevations)
 
+    def _stitch_chunk(self, merged_edges, merged_shape, edges, shape, boundary) -> str:
+        """
+        새 청크 결과를 기존 결과에 이어 붙임. 반환값은 사용한 방식.
+        - edge_id / way_id: overlap 구간에서 양쪽이 같은 edge(또는 같은 way의 같은 노드에서 시작하는 edge)로
+          매칭된 지점 중 경계 포인트에 가장 가까운 곳에서 교체 (기존 결과의 그 뒤는 버리고 새 청크 결과 사용)
+        - nearest: 공통 edge가 없으면 (repair로 만든 합성 edge 등) 기존 끝점과 가장 가까운 좌표에서 접합
+        """
+        if not merged_shape:
+            merged_shape.extend(shape)
+            merged_edges.extend(edges)
+            return "first"
+        splice = self._find_splice(merged_edges, merged_shape, edges, shape, boundary)
+        if splice is None:
+            self._stitch_nearest(merged_edges, merged_shape, edges, shape)
+            return "nearest"
+
+        m_idx, n_idx, method = splice
+        cut = merged_edges[m_idx]["begin_shape_index"]
+        base = edges[n_idx]["begin_shape_index"]
+        del merged_edges[m_idx:]
+        del merged_shape[cut + 1:]
+        merged_shape.extend(shape[base + 1:])
+        for edge in edges[n_idx:]:
+            edge["begin_shape_index"] += cut - base
+            edge["end_shape_index"] += cut - base
+            merged_edges.append(edge)
+        return method
+
+    def _find_splice(self, merged_edges, merged_shape, edges, shape, boundary) -> Optional[Tuple[int, int, str]]:
+        """
+        (기존 edge index, 새 청크 edge index, 방식). 같은 edge id(없으면 같은 way id)이면서 시작 노드 좌표가 일치하는 쌍만 후보.
+        양쪽 청크의 첫/마지막 edge는 trace 시작·끝에서 잘린 edge라 제외
+        """
+        by_id, by_way = {}, {}
+        last = len(merged_edges) - 1
+        for m in range(last - 1, max(-1, last - STITCH_EDGE_WINDOW), -1):
+            edge = merged_edges[m]
+            if edge.get("id") is not None: by_id.setdefault(edge["id"], []).append(m)
+            if edge.get("way_id") is not None: by_way.setdefault(edge["way_id"], []).append(m)
+        if not by_id and not by_way: return None
+
+        def same_node(m, pt):
+            mb = merged_edges[m]["begin_shape_index"]
+            return mb < len(merged_shape) and self._haversine(merged_shape[mb][0], merged_shape[mb][1], pt[0], pt[1]) < STITCH_NODE_TOL_M
+
+        best, best_d = None, STITCH_MAX_DIST_M
+        for j in range(1, len(edges) - 1):
+            b = edges[j].get("begin_shape_index", 0)
+            if b >= len(shape): continue
+            d = self._haversine(boundary['lat'], boundary['lon'], shape[b][0], shape[b][1])
+            if d >= best_d: continue
+            for method, table, key in (("edge_id", by_id, "id"), ("way_id", by_way, "way_id")):
+                m = next((m for m in table.get(edges[j].get(key), ()) if same_node(m, shape[b])), None)
+                if m is not None:
+                    best, best_d = (m, j, method), d
+                    break
+        return best
+
+    def _stitch_nearest(self, merged_edges, merged_shape, edges, shape) -> None:
+        """기존 결과 끝점과 가장 가까운 새 청크 shape 포인트 다음부터 이어 붙임"""
+        if not shape: return
+        head = np.asarray(shape[:min(len(shape), CHUNK_OVERLAP_MAX * 4)], dtype=float)
+        last_pt = np.asarray(merged_shape[-1], dtype=float)
+        best_idx = int(np.argmin(((head - last_pt) ** 2).sum(axis=1)))
+        if best_idx + 1 < len(shape): best_idx += 1
+
+        prev_shape_len = len(merged_shape)
+        merged_shape.extend(shape[best_idx:])
+        for edge in edges:
+            start_i = edge.get("begin_shape_index", 0)
+            end_i = edge.get("end_shape_index", 0)
+            if end_i < best_idx: continue
+            edge["begin_shape_index"] = prev_shape_len + (max(start_i, best_idx) - best_idx)
+            edge["end_shape_index"] = prev_shape_len + (end_i - best_idx)
+            merged_edges.append(edge)
+
     def _densify_at_turns(self, points: List[Dict[str, float]], turn_degree=80.0, step=5.0) -> List[Dict[str, float]]:
         """Identify sharp turns and add extra points to aid map matching."""
         if len(points) < 3: return points
@@ -183,21 +324,38 @@ class ValhallaClient:
         return new_points
 
     def _get_bulk_elevations(self, shape: List[Tuple[float, float]]) -> List[float]:
+        with stage("elevation"):
+            return self._fetch_bulk_elevations(shape)
+
+    def _fetch_bulk_elevations(self, shape: List[Tuple[float, float]]) -> List[float]:
         H_CHUNK = 4000
         all_heights = []
         for i in range(0, len(shape), H_CHUNK):
             chunk = shape[i : i + H_CHUNK]
             payload = {"shape": [{"lat": l, "lon": r} for l, r in chunk], "range": False}
             try:
-                with httpx.Client(timeout=30.0) as client:
-                    resp = client.post(f"{self.url}/height", json=payload)
-                    resp.raise_for_status()
-                    heights = resp.json().get("height", [0.0]*len(chunk))
-                    all_heights.extend([h if h is not None else 0.0 for h in heights])
-            except Exception as e:
-                print(f"  Warning: Elevation fetch failed for chunk {i}: {e}")
-                all_heights.extend([0.0]*len(chunk))
-        return all_heights
+                resp = self._post("/height", payload, max_timeout=30.0)
+                resp.raise_for_status()
+                heights = resp.json().get("height", [None]*len(chunk))
+                all_heights.extend(heights)
+            except UPSTREAM_ERRORS as e:
+                report_degraded("elevation", e, chunk_start=i, points=len(chunk))
+                all_heights.extend([None]*len(chunk))
+        return self._interpolate_missing(all_heights)
+
+    def _interpolate_missing(self, values: List[Any]) -> List[float]:
+        """None 값을 앞뒤 유효값으로 선형 보간 (양 끝은 가장 가까운 값, 전부 없으면 0.0)"""
+        known = [i for i, v in enumerate(values) if v is not None]
+        if not known: return [0.0] * len(values)
+        if len(known) == len(values): return values
+        out = list(values)
+        for i in range(known[0]): out[i] = values[known[0]]
+        for i in range(known[-1] + 1, len(values)): out[i] = values[known[-1]]
+        for a, b in zip(known, known[1:]):
+            if b - a > 1:
+                va, vb = values[a], values[b]
+                for i in range(a + 1, b): out[i] = va + (vb - va) * (i - a) / (b - a)
+        return out
 
     def _fill_gaps_with_routing(self, points: List[Dict[str, float]], gap_threshold=500.0) -> List[Dict[str, float]]:
         if not points or len(points) < 2: return points
@@ -211,7 +369,8 @@ class ValhallaClient:
                     if len(route_shape) > 2:
                         for pt in route_shape[1:-1]:
                             filled_points.append({"lat": pt[0], "lon": pt[1]})
-                except: pass
+                except UPSTREAM_ERRORS as e:
+                    report_degraded("gap_fill", e, index=i)
             filled_points.append(curr)
         return filled_points
 
@@ -227,11 +386,10 @@ class ValhallaClient:
                 }
             }
         }
-        with httpx.Client(timeout=10.0) as client:
-            resp = client.post(f"{self.url}/route", json=payload)
-            resp.raise_for_status()
-            shape_str = resp.json().get("trip", {}).get("legs", [{}])[0].get("shape", "")
-            return polyline.decode(shape_str, 6) if shape_str else []
+        resp = self._post("/route", payload, max_timeout=10.0)
+        resp.raise_for_status()
+        shape_str = resp.json().get("trip", {}).get("legs", [{}])[0].get("shape", "")
+        return polyline.decode(shape_str, 6) if shape_str else []
 
     def _upsample_points(self, points: List[Dict[str, float]], max_interval=30.0) -> List[Dict[str, float]]:
         if not points: return []
@@ -271,7 +429,7 @@ class ValhallaClient:
             }, 
             "filters": {
                 "attributes": [
-                    "edge.use", "edge.surface", "edge.begin_shape_index", "edge.end_shape_index", "shape", 
+                    "edge.id", "edge.way_id", "edge.use", "edge.surface", "edge.begin_shape_index", "edge.end_shape_index", "shape", 
                     "matched.point", "matched.edge_index", "matched.type", "matched.distance_from_trace_point"
                 ],
                 "action": "include"
@@ -279,52 +437,54 @@ class ValhallaClient:
         }
         
         try:
-            with httpx.Client(timeout=self.timeout) as client:
-                resp = client.post(f"{self.url}/trace_attributes", json=trace_payload)
+            with stage("match"):
+                resp = self._post("/trace_attributes", trace_payload, max_timeout=self.timeout)
                 resp.raise_for_status()
                 data = resp.json()
-                
-                # --- 국소 경쟁 수술 (Repair) ---
-                # 이탈 구간에 대해 Strict(자전거) vs Auto(차) 경쟁 붙임
+            
+            # --- 국소 경쟁 수술 (Repair) ---
+            # 이탈 구간에 대해 Strict(자전거) vs Auto(차) 경쟁 붙임
+            with stage("repair"):
                 repaired_data = self._repair_segments(data, shape_points)
+            
+            raw_shape = polyline.decode(repaired_data.get("shape", ""), 6)
+            
+            # 매칭률 계산 (로그용)
+            matched_points = repaired_data.get("matched_points", [])
+            valid_count = 0
+            for mp in matched_points:
+                if mp.get("type") == "matched" and mp.get("distance_from_trace_point", 0.0) < 100.0:
+                    valid_count += 1
+            
+            ratio = (valid_count / len(shape_points)) * 100 if shape_points else 0
+            print(f"    [Valhalla] Result: Input {len(shape_points)} -> Valid {valid_count} ({ratio:.1f}%)")
+            
+            return {
+                "edges": repaired_data.get("edges", []),
+                "matched_points": matched_points,
+                "shape_points": raw_shape
+            }
                 
-                raw_shape = polyline.decode(repaired_data.get("shape", ""), 6)
-                
-                # 매칭률 계산 (로그용)
-                matched_points = repaired_data.get("matched_points", [])
-                valid_count = 0
-                for mp in matched_points:
-                    if mp.get("type") == "matched" and mp.get("distance_from_trace_point", 0.0) < 100.0:
-                        valid_count += 1
-                
-                ratio = (valid_count / len(shape_points)) * 100 if shape_points else 0
-                print(f"    [Valhalla] Result: Input {len(shape_points)} -> Valid {valid_count} ({ratio:.1f}%)")
-                
-                return {
-                    "edges": repaired_data.get("edges", []),
-                    "matched_points": matched_points,
-                    "shape_points": raw_shape
-                }
-                    
-        except Exception as e:
+        except UPSTREAM_ERRORS as e:
             print(f"    [Valhalla] Try 1 (Bicycle) Failed: {e}. Fallback to 'auto' mode...")
+            report_degraded("trace_bicycle", e, fallback="auto", points=len(shape_points))
 
         # --- 2차 시도: Auto (전체 폴백) ---
         trace_payload["costing"] = "auto"
         
-        with httpx.Client(timeout=self.timeout) as client:
-            resp = client.post(f"{self.url}/trace_attributes", json=trace_payload)
+        with stage("match_fallback"):
+            resp = self._post("/trace_attributes", trace_payload, max_timeout=self.timeout)
             resp.raise_for_status()
             data = resp.json()
-            raw_shape = polyline.decode(data.get("shape", ""), 6)
-            
-            print(f"    [Valhalla] Try 2 (Auto): Input {len(shape_points)} -> Output {len(raw_shape)}")
-            
-            return {
-                "edges": data.get("edges", []),
-                "matched_points": data.get("matched_points", []),
-                "shape_points": raw_shape
-            }
+        raw_shape = polyline.decode(data.get("shape", ""), 6)
+        
+        print(f"    [Valhalla] Try 2 (Auto): Input {len(shape_points)} -> Output {len(raw_shape)}")
+        
+        return {
+            "edges": data.get("edges", []),
+            "matched_points": data.get("matched_points", []),
+            "shape_points": raw_shape
+        }
 
     def _repair_segments(self, data: Dict[str, Any], original_input: List[Dict[str, float]]) -> Dict[str, Any]:
         """
@@ -335,6 +495,7 @@ class ValhallaClient:
         if not matched_points: return data
 
         deviations = self._detect_deviations(matched_points, threshold=100.0)
+        record_deviations(len(deviations))
         if not deviations:
             return data
 
@@ -407,6 +568,7 @@ class ValhallaClient:
                     winner_name = "Auto(Route)"
             
             print(f"      dev[{dev_start}~{dev_end}, len={len(bad_subset)}]: Strict={dist_strict:.1f}m, Auto={dist_auto:.1f}m -> Winner: {winner_name}")
+            record_repair_winner(winner_name)
             
             self._append_result(new_edges, new_shape, winner_res)
             last_input_idx = dev_end + 1
@@ -436,14 +598,14 @@ class ValhallaClient:
                     "avoid_unpaved": 1.0
                 }
             }
-        with httpx.Client(timeout=10.0) as client:
-            try:
-                resp = client.post(f"{self.url}/route", json=payload)
-                resp.raise_for_status()
-                shape_str = resp.json().get("trip", {}).get("legs", [{}])[0].get("shape", "")
-                return polyline.decode(shape_str, 6) if shape_str else []
-            except:
-                return []
+        try:
+            resp = self._post("/route", payload, max_timeout=10.0)
+            resp.raise_for_status()
+            shape_str = resp.json().get("trip", {}).get("legs", [{}])[0].get("shape", "")
+            return polyline.decode(shape_str, 6) if shape_str else []
+        except UPSTREAM_ERRORS as e:
+            report_degraded("route_shape", e, costing=costing)
+            return []
 
     def _trace_subset(self, points, mode="bicycle", strict=False):
         """
@@ -477,17 +639,17 @@ class ValhallaClient:
             "costing": mode,
             "shape_match": "map_snap",
             "trace_options": options,
-            "filters": {"attributes": ["edge.use", "edge.surface", "edge.begin_shape_index", "edge.end_shape_index", "shape"], "action": "include"}
+            "filters": {"attributes": ["edge.id", "edge.way_id", "edge.use", "edge.surface", "edge.begin_shape_index", "edge.end_shape_index", "shape"], "action": "include"}
         }
         
         try:
-            with httpx.Client(timeout=30.0) as client:
-                resp = client.post(f"{self.url}/trace_attributes", json=payload)
-                resp.raise_for_status()
-                d = resp.json()
-                shp = polyline.decode(d.get("shape", ""), 6)
-                return {"edges": d.get("edges", []), "shape": shp}
-        except:
+            resp = self._post("/trace_attributes", payload, max_timeout=30.0)
+            resp.raise_for_status()
+            d = resp.json()
+            shp = polyline.decode(d.get("shape", ""), 6)
+            return {"edges": d.get("edges", []), "shape": shp}
+        except UPSTREAM_ERRORS as e:
+            report_degraded("trace_subset", e, mode=mode, strict=strict, points=len(points))
             return {"edges": [], "shape": []}
 
     def _calculate_mean_distance(self, original_points, result_shape):
@@ -598,11 +760,13 @@ class ValhallaClient:
         return self._parse_to_standard_format({"edges": raw["edges"]}, raw["shape_points"], elevations)
 
     def _parse_to_standard_format(self, data: Dict[str, Any], raw_shape: List[Tuple[float, float]], elevations: List[float]) -> Dict[str, Any]:
-        smoothed_ele = self._smooth_elevation(elevations, window_size=21)
-        edges = data.get("edges", [])
-        resampled_points = self._enrich_points_and_resample(raw_shape, smoothed_ele, edges)
-        final_points = self._filter_outliers_post_resample(resampled_points, max_grade=0.20)
-        segments = self._generate_segments(final_points)
+        with stage("resample"):
+            smoothed_ele = self._smooth_elevation(elevations, window_size=21)
+            edges = data.get("edges", [])
+            resampled_points = self._enrich_points_and_resample(raw_shape, smoothed_ele, edges)
+            final_points = self._filter_outliers_post_resample(resampled_points, max_grade=0.20)
+        with stage("segment"):
+            segments = self._generate_segments(final_points)
         total_dist = final_points[-1][3] if final_points else 0
         ascent = sum(max(0, final_points[i][2] - final_points[i-1][2]) for i in range(1, len(final_points)))
 
@@ -0,0 +1,179 @@
+"""
+Valhalla Unified Parser 계측
+
+get_standard_course 한 번을 course, 그 안의 단계(gap_fill / match / repair / elevation ...)를 stage로 보고
+- Prometheus 스타일 메트릭 (metrics.registry → GET /metrics)
+- Sentry span (op="valhalla.course" / "valhalla.stage", 요청 트랜잭션 하위)
+- 호출 단위 요약 (CourseTrace) : 단계별 시간, upstream 요청 수·바이트, chunk 수, 이탈 구간 수, repair 우승자 분포
+- chunk 접합 방식 분포 (edge_id / way_id / nearest)
+upstream 요청은 호출 시점의 stage 라벨로 집계되므로 "느린 저장"이 Valhalla / repair / resample 중 어디서 생겼는지 구분 가능.
+sentry_sdk가 없는 환경(시뮬레이터 등)에서는 span만 생략.
+"""
+
+import threading
+import time
+from collections import Counter as TallyCounter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import httpx
+
+from metrics import registry
+
+try:
+    import sentry_sdk
+except ImportError:
+    sentry_sdk = None
+
+STAGE_SECONDS = registry.histogram(
+    "valhalla_stage_duration_seconds", "Unified Parser stage wall time", ("stage",))
+COURSE_SECONDS = registry.histogram(
+    "valhalla_course_duration_seconds", "get_standard_course wall time", ("outcome",))
+UPSTREAM_REQUESTS = registry.counter(
+    "valhalla_upstream_requests_total", "Valhalla HTTP requests actually sent (hedges included)", ("endpoint", "stage", "status"))
+UPSTREAM_BYTES = registry.counter(
+    "valhalla_upstream_bytes_total", "Valhalla HTTP body bytes", ("endpoint", "stage", "direction"))
+COURSE_CHUNKS = registry.histogram(
+    "valhalla_course_chunks", "trace_attributes chunks per course", buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32))
+DEVIATIONS = registry.counter(
+    "valhalla_deviations_total", "Deviation segments detected after map matching")
+STITCHES = registry.counter(
+    "valhalla_chunk_stitch_total", "How chunk results were joined (edge_id / way_id / nearest)", ("method",))
+REPAIR_WINNERS = registry.counter(
+    "valhalla_repair_winners_total", "Competitive repair winners per deviation segment", ("winner",))
+
+_trace: ContextVar[Optional["CourseTrace"]] = ContextVar("valhalla_course_trace", default=None)
+_stage: ContextVar[str] = ContextVar("valhalla_stage", default="other")
+
+
+class CourseTrace:
+    """get_standard_course 1회 요약. hedge 스레드에서도 기록되므로 lock 사용"""
+    def __init__(self, input_points: int = 0):
+        self.input_points = input_points
+        self.stages: Dict[str, float] = {}
+        self.requests: Dict[str, int] = TallyCounter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.chunks = 0
+        self.deviations = 0
+        self.winners: Dict[str, int] = TallyCounter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, elapsed: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def add_request(self, endpoint: str, sent: int, received: int) -> None:
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def add_deviations(self, count: int) -> None:
+        with self._lock:
+            self.deviations += count
+
+    def add_winner(self, winner: str) -> None:
+        with self._lock:
+            self.winners[winner] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "input_points": self.input_points,
+                "stages": {k: round(v, 4) for k, v in self.stages.items()},
+                "requests": dict(self.requests),
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "chunks": self.chunks,
+                "deviations": self.deviations,
+                "winners": dict(self.winners),
+            }
+
+
+def _span(op: str, name: str):
+    if sentry_sdk is None: return nullcontext()
+    return sentry_sdk.start_span(op=op, name=name)
+
+
+def current_trace() -> Optional[CourseTrace]:
+    return _trace.get()
+
+
+def current_stage() -> str:
+    return _stage.get()
+
+
+@contextmanager
+def course_span(input_points: int):
+    """get_standard_course 전체. 종료 시 요약을 Sentry span data로 첨부하고 한 줄 로그 출력"""
+    trace = CourseTrace(input_points)
+    token = _trace.set(trace)
+    started = time.perf_counter()
+    outcome = "ok"
+    with _span("valhalla.course", "get_standard_course") as span:
+        try:
+            yield trace
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _trace.reset(token)
+            COURSE_SECONDS.observe(elapsed, outcome=outcome)
+            summary = trace.as_dict()
+            if span is not None:
+                for key, value in summary.items(): span.set_data(key, value)
+            print(f"    [Valhalla] Course {outcome} in {elapsed:.2f}s: {summary}")
+
+
+@contextmanager
+def stage(name: str):
+    """단계 구간. 중첩되면 안쪽 stage가 upstream 요청 라벨이 됨 (시간은 각 stage에 inclusive로 기록)"""
+    token = _stage.set(name)
+    started = time.perf_counter()
+    try:
+        with _span("valhalla.stage", name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _stage.reset(token)
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _trace.get()
+        if trace is not None: trace.add_stage(name, elapsed)
+
+
+def record_upstream(endpoint: str, stage_name: str, trace: Optional[CourseTrace],
+                    resp: Optional[httpx.Response] = None) -> None:
+    """실제로 전송된 Valhalla 요청 1건 (resp=None 이면 전송 오류/timeout).
+    hedge 스레드에서 호출되므로 stage/trace는 호출자가 미리 캡처해서 전달"""
+    status = str(resp.status_code) if resp is not None else "error"
+    UPSTREAM_REQUESTS.inc(endpoint=endpoint, stage=stage_name, status=status)
+    if resp is None: return
+    sent, received = len(resp.request.content), len(resp.content)
+    UPSTREAM_BYTES.inc(sent, endpoint=endpoint, stage=stage_name, direction="sent")
+    UPSTREAM_BYTES.inc(received, endpoint=endpoint, stage=stage_name, direction="received")
+    if trace is not None: trace.add_request(endpoint, sent, received)
+
+
+def record_chunks(count: int) -> None:
+    COURSE_CHUNKS.observe(count)
+    trace = _trace.get()
+    if trace is not None: trace.chunks = count
+
+
+def record_stitch(method: str) -> None:
+    if method != "first": STITCHES.inc(method=method)
+
+
+def record_deviations(count: int) -> None:
+    if count: DEVIATIONS.inc(count)
+    trace = _trace.get()
+    if trace is not None: trace.add_deviations(count)
+
+
+def record_repair_winner(winner: str) -> None:
+    REPAIR_WINNERS.inc(winner=winner)
+    trace = _trace.get()
+    if trace is not None: trace.add_winner(winner)
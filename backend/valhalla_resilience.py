@@ -0,0 +1,334 @@
+"""
+Valhalla 호출 복원력 (resilience) 레이어
+
+- payload 크기 기반 endpoint별 timeout (고정 60초 대신)
+- hedged request: 응답이 최근 p95를 넘기면 동일 요청을 한 번 더 보내 먼저 온 응답 사용
+- circuit breaker: 연속 실패 시 일정 시간 즉시 실패 (ValhallaUnavailable)
+- degraded 결과 보고: 폴백/부분 실패를 호출 단위로 모아 결과 meta에 기록
+"""
+
+import asyncio
+import math
+import os
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from valhalla_scheduler import ValhallaOverloaded
+
+# endpoint -> (기본 timeout, 포인트당 추가 초, 상한)
+TIMEOUT_POLICY = {
+    "/route": (5.0, 0.5, 30.0),                # 포인트 = locations
+    "/trace_attributes": (5.0, 0.01, 60.0),    # 3000 pts ≈ 35s
+    "/height": (3.0, 0.002, 30.0),
+}
+DEFAULT_TIMEOUT_POLICY = (10.0, 0.0, 60.0)
+
+HEDGE_ENABLED = os.environ.get("VALHALLA_HEDGE", "true").lower() == "true"
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+BREAKER_FAILURES = int(os.environ.get("VALHALLA_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.environ.get("VALHALLA_BREAKER_COOLDOWN", 30.0))
+
+
+class ValhallaUnavailable(ValhallaOverloaded):
+    """circuit breaker open: Valhalla 장애로 판단되어 호출하지 않음 (API에서는 과부하와 같이 503 처리)"""
+    def __init__(self, retry_after: int):
+        Exception.__init__(self, f"Valhalla is unavailable. Retry after {retry_after}s")
+        self.endpoint = "*"
+        self.retry_after = retry_after
+
+
+def payload_size(payload: Dict[str, Any]) -> int:
+    return len(payload.get("shape") or payload.get("locations") or [])
+
+
+def timeout_for(endpoint: str, payload: Dict[str, Any], cap: Optional[float] = None) -> float:
+    base, per_point, limit = TIMEOUT_POLICY.get(endpoint, DEFAULT_TIMEOUT_POLICY)
+    if cap is not None: limit = min(limit, cap)
+    return min(limit, base + per_point * payload_size(payload))
+
+
+def is_failure(resp: Optional[httpx.Response] = None, error: Optional[BaseException] = None) -> bool:
+    """breaker에 실패로 집계할지. 4xx(경로 없음 등)는 Valhalla 정상 응답으로 간주"""
+    if error is not None: return isinstance(error, httpx.TransportError)
+    return resp is not None and resp.status_code >= 500
+
+
+# --- Degraded 결과 보고 ---
+_degraded: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("valhalla_degraded", default=None)
+
+
+@contextmanager
+def collect_degraded():
+    """with 블록 안에서 report_degraded()로 기록된 항목을 list로 수집"""
+    items: List[Dict[str, Any]] = []
+    token = _degraded.set(items)
+    try:
+        yield items
+    finally:
+        _degraded.reset(token)
+
+
+def report_degraded(stage: str, reason: Any, **detail) -> None:
+    entry = {"stage": stage, "reason": str(reason)[:200], **detail}
+    print(f"    [Valhalla] Degraded: {entry}")
+    items = _degraded.get()
+    if items is not None: items.append(entry)
+
+
+# --- Latency / Breaker ---
+class LatencyTracker:
+    """endpoint + payload 크기 버킷(2의 거듭제곱)별 최근 응답 시간"""
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(endpoint: str, size: int):
+        return endpoint, int(math.log2(size)) if size > 0 else 0
+
+    def record(self, endpoint: str, size: int, elapsed: float) -> None:
+        with self._lock:
+            self._samples[self._key(endpoint, size)].append(elapsed)
+
+    def percentile(self, endpoint: str, size: int, q: float = HEDGE_PERCENTILE) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(self._key(endpoint, size), ()))
+        if len(samples) < HEDGE_MIN_SAMPLES: return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class CircuitBreaker:
+    """closed → (연속 실패 N회) → open → (cooldown) → half-open(시험 호출 1회) → closed/open"""
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None: return "closed"
+        return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None: return
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial:
+                raise ValhallaUnavailable(max(1, math.ceil(remaining)))
+            self._trial = True
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._consecutive, self._opened_at, self._trial = 0, None, False
+
+    def on_neutral(self) -> None:
+        """장애와 무관한 예외(과부하 거절 등): half-open 시험 호출 기회만 반납"""
+        with self._lock:
+            self._trial = False
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or self._consecutive >= self.failures:
+                if self._opened_at is None or self._trial:
+                    print(f"    [Valhalla] Circuit breaker OPEN ({self._consecutive} consecutive failures)")
+                self._opened_at, self._trial = time.monotonic(), False
+
+
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("VALHALLA_HEDGE_WORKERS", 16)), thread_name_prefix="valhalla-hedge")
+
+
+class Attempt:
+    """
+    send 한 번의 상태. send는 스케줄러 슬롯을 받은 직후 started()를 호출하고,
+    동기 httpx 요청에는 extensions=attempt.extensions를 넘김.
+    - latency / hedge 타이머는 started() 이후부터 (슬롯 대기 시간 제외)
+    - abort(): hedge가 먼저 응답하면 호출 스레드에서 대기 중인 primary의 소켓을 끊음
+    """
+    def __init__(self, on_start: Optional[Callable[[], None]] = None):
+        self.started_at: Optional[float] = None
+        self._on_start = on_start
+        self._sockets: List[socket.socket] = []
+        self._aborted = False
+        self._lock = threading.Lock()
+        self.extensions = {"trace": self._trace}
+
+    def started(self) -> None:
+        self.started_at = time.monotonic()
+        if self._on_start: self._on_start()
+
+    def elapsed(self) -> Optional[float]:
+        return None if self.started_at is None else time.monotonic() - self.started_at
+
+    def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        if event != "connection.connect_tcp.complete": return
+        sock = info["return_value"].get_extra_info("socket")
+        if sock is None: return
+        with self._lock:
+            self._sockets.append(sock)
+            aborted = self._aborted
+        if aborted: self._shutdown(sock)
+
+    @staticmethod
+    def _shutdown(sock: socket.socket) -> None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)  # close()와 달리 다른 스레드의 blocking recv도 깨움
+        except OSError:
+            pass
+
+    def abort(self) -> None:
+        with self._lock:
+            self._aborted = True
+            sockets = list(self._sockets)
+        for sock in sockets:
+            self._shutdown(sock)
+
+
+class ResilientCaller:
+    """
+    send(timeout, hedge, attempt) 콜러블을 받아 breaker / timeout / hedging을 적용해 호출.
+    hedge=True 호출은 스케줄러 슬롯을 기다리지 않도록 send 쪽에서 처리.
+    동기 호출의 primary는 호출 스레드에서 실행하고 _hedge_pool은 hedge 요청에만 사용
+    (BATCH primary가 큐 대기로 hedge 스레드를 잡고 있지 않도록).
+    """
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def _settle(self, endpoint: str, size: int, attempt: Optional[Attempt] = None, resp=None, error=None) -> None:
+        if is_failure(resp, error): self.breaker.on_failure()
+        elif error is not None: self.breaker.on_neutral()
+        else:
+            self.breaker.on_success()
+            elapsed = attempt.elapsed() if attempt else None
+            if elapsed is not None: self.latency.record(endpoint, size, elapsed)
+
+    def call(self, endpoint: str, payload: Dict[str, Any], send: Callable[[float, bool, Attempt], httpx.Response],
+             cap: Optional[float] = None) -> httpx.Response:
+        self.breaker.before_call()
+        size, timeout = payload_size(payload), timeout_for(endpoint, payload, cap)
+        delay = self.latency.percentile(endpoint, size) if HEDGE_ENABLED else None
+        try:
+            if delay is None or delay >= timeout:
+                attempt = Attempt()
+                resp = send(timeout, False, attempt)
+            else:
+                resp, attempt = self._call_hedged(send, timeout, delay)
+        except BaseException as e:
+            self._settle(endpoint, size, error=e)
+            raise
+        self._settle(endpoint, size, attempt, resp)
+        return resp
+
+    def _call_hedged(self, send, timeout: float, delay: float):
+        """primary는 호출 스레드에서. 슬롯을 받은 뒤 delay초 안에 끝나지 않으면 hedge를 _hedge_pool에서 실행,
+        hedge가 먼저 성공하면 primary를 abort. 반환: (응답, 응답한 Attempt)"""
+        hedges = []
+        primary_done = False
+
+        def fire_hedge():
+            with self._lock:
+                if primary_done: return
+                self.hedged += 1
+                attempt = Attempt()
+                future = _hedge_pool.submit(send, max(1.0, timeout - delay), True, attempt)
+                hedges.append((future, attempt))
+            future.add_done_callback(lambda f: f.exception() is None and primary.abort())
+
+        timer = threading.Timer(delay, fire_hedge)
+        timer.daemon = True
+        primary = Attempt(on_start=timer.start)
+        try:
+            return send(timeout, False, primary), primary
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                primary_done = True
+            timer.cancel()
+
+        if not hedges: raise error
+        future, attempt = hedges[0]
+        try:
+            resp = future.result()
+        except Exception:
+            raise error
+        with self._lock:
+            self.hedge_wins += 1
+        return resp, attempt
+
+    async def call_async(self, endpoint: str, payload: Dict[str, Any], send: Callable[[float, bool, Attempt], Awaitable[httpx.Response]],
+                         cap: Optional[float] = None) -> httpx.Response:
+        self.breaker.before_call()
+        size, timeout = payload_size(payload), timeout_for(endpoint, payload, cap)
+        delay = self.latency.percentile(endpoint, size) if HEDGE_ENABLED else None
+        try:
+            if delay is None or delay >= timeout:
+                attempt = Attempt()
+                resp = await send(timeout, False, attempt)
+            else:
+                resp, attempt = await self._call_hedged_async(send, timeout, delay)
+        except BaseException as e:
+            self._settle(endpoint, size, error=e)
+            raise
+        self._settle(endpoint, size, attempt, resp)
+        return resp
+
+    async def _call_hedged_async(self, send, timeout: float, delay: float):
+        slotted = asyncio.Event()
+        attempts = {}
+        primary_attempt = Attempt(on_start=slotted.set)
+        primary = asyncio.ensure_future(send(timeout, False, primary_attempt))
+        attempts[primary] = primary_attempt
+        pending = {primary}
+        try:
+            # hedge 타이머는 primary가 슬롯을 받은 뒤부터
+            started = asyncio.ensure_future(slotted.wait())
+            try:
+                await asyncio.wait({primary, started}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                started.cancel()
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=delay)
+            if primary.done(): return primary.result(), primary_attempt
+
+            self.hedged += 1
+            hedge_attempt = Attempt()
+            hedge = asyncio.ensure_future(send(max(1.0, timeout - delay), True, hedge_attempt))
+            attempts[hedge] = hedge_attempt
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge: self.hedge_wins += 1
+                        return task.result(), attempts[task]
+                    if task is primary or error is None: error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                if not task.done(): task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"breaker": self.breaker.state, "hedged": self.hedged, "hedge_wins": self.hedge_wins}
+
+
+valhalla_resilience = ResilientCaller()
@@ -0,0 +1,198 @@
+"""
+Valhalla 요청 스케줄러 (admission control)
+
+Valhalla VM은 server_threads가 작은 고정 자원이므로 프로세스 단위로 동시 요청 수를 제한.
+- endpoint 종류(route / trace_attributes / height)별 lane, lane마다 동시 실행 한도
+- 우선순위: INTERACTIVE(플래너 클릭) > BATCH(저장·임포트·자동 태그·스크립트)
+  대기열에서는 INTERACTIVE가 먼저 슬롯을 받고, BATCH는 lane 한도에서 INTERACTIVE 예약분을 뺀 만큼만 사용
+- 대기 deadline 초과 또는 대기열 초과 시 ValhallaOverloaded(retry_after) → API에서 503 + Retry-After
+- 동기(스레드)·비동기(asyncio) 호출 모두 같은 lane을 공유
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+INTERACTIVE = 0
+BATCH = 1
+
+LANE_LIMITS = {
+    "/route": int(os.environ.get("VALHALLA_CONCURRENCY_ROUTE", 4)),
+    "/trace_attributes": int(os.environ.get("VALHALLA_CONCURRENCY_TRACE", 2)),
+    "/height": int(os.environ.get("VALHALLA_CONCURRENCY_HEIGHT", 4)),
+}
+INTERACTIVE_RESERVED = int(os.environ.get("VALHALLA_INTERACTIVE_RESERVED", 1))  # lane별 BATCH가 쓸 수 없는 슬롯 수
+QUEUE_TIMEOUT = {
+    INTERACTIVE: float(os.environ.get("VALHALLA_QUEUE_TIMEOUT_INTERACTIVE", 5.0)),
+    BATCH: float(os.environ.get("VALHALLA_QUEUE_TIMEOUT_BATCH", 120.0)),
+}
+MAX_QUEUE = int(os.environ.get("VALHALLA_MAX_QUEUE", 64))  # lane별 최대 대기 수
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class ValhallaOverloaded(Exception):
+    """대기열이 가득 찼거나 deadline 안에 슬롯을 받지 못함"""
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(f"Valhalla is busy ({endpoint}). Retry after {retry_after}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "cancelled", "event", "loop", "future")
+
+    def __init__(self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(True))
+        else:
+            self.event.set()
+
+
+class _Lane:
+    def __init__(self, endpoint: str, limit: int):
+        self.endpoint = endpoint
+        self.limit = max(1, limit)
+        self.batch_limit = max(1, self.limit - INTERACTIVE_RESERVED)
+        self.active = {INTERACTIVE: 0, BATCH: 0}
+        self._queue = []  # (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._avg_service = 1.0  # 초, EWMA
+        self.rejected = 0
+
+    # --- 내부 (lock 보유 상태에서 호출) ---
+    def _can_run(self, priority: int) -> bool:
+        total = self.active[INTERACTIVE] + self.active[BATCH]
+        if total >= self.limit: return False
+        return priority == INTERACTIVE or self.active[BATCH] < self.batch_limit
+
+    def _dispatch(self) -> None:
+        """대기열 앞에서부터 실행 가능한 waiter에게 슬롯 배정"""
+        skipped = []
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            waiter = item[2]
+            if waiter.cancelled: continue
+            if not self._can_run(waiter.priority):
+                skipped.append(item)
+                if waiter.priority == INTERACTIVE: break
+                continue
+            self.active[waiter.priority] += 1
+            waiter.granted = True
+            waiter.wake()
+        for item in skipped: heapq.heappush(self._queue, item)
+
+    def _retry_after(self) -> int:
+        pending = sum(1 for _, _, w in self._queue if not w.cancelled) + 1
+        return max(1, math.ceil(pending * self._avg_service / self.limit))
+
+    def _enter(self, priority: int, loop=None) -> Optional[_Waiter]:
+        """즉시 실행 가능하면 None, 아니면 대기열에 등록된 waiter 반환"""
+        with self._lock:
+            ahead = any(w.priority <= priority and not w.cancelled for _, _, w in self._queue)
+            if not ahead and self._can_run(priority):
+                self.active[priority] += 1
+                return None
+            if len(self._queue) >= MAX_QUEUE:
+                self.rejected += 1
+                raise ValhallaOverloaded(self.endpoint, self._retry_after())
+            waiter = _Waiter(priority, loop)
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """deadline 초과. 이미 슬롯을 받았으면 False (그대로 실행)"""
+        with self._lock:
+            if waiter.granted: return False
+            waiter.cancelled = True
+            self.rejected += 1
+            return True
+
+    def _release(self, priority: int, elapsed: float) -> None:
+        with self._lock:
+            self.active[priority] -= 1
+            self._avg_service = 0.8 * self._avg_service + 0.2 * elapsed
+            self._dispatch()
+
+    # --- public ---
+    @contextmanager
+    def slot(self, priority: int = BATCH, timeout: Optional[float] = None):
+        waiter = self._enter(priority)
+        if waiter is not None:
+            if timeout is None: timeout = QUEUE_TIMEOUT[priority]
+            # event loop 스레드에서 블로킹 대기하면 슬롯을 가진 async 요청이 끝날 수 없으므로 즉시 판정
+            if _on_event_loop(): timeout = 0
+            waiter.event.wait(timeout)
+            if self._abandon(waiter):
+                raise ValhallaOverloaded(self.endpoint, self._retry_after())
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(priority, time.monotonic() - started)
+
+    @asynccontextmanager
+    async def slot_async(self, priority: int = INTERACTIVE, timeout: Optional[float] = None):
+        waiter = self._enter(priority, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), QUEUE_TIMEOUT[priority] if timeout is None else timeout)
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                # 요청 취소: 슬롯을 이미 받았다면 반납
+                if not self._abandon(waiter): self._release(priority, 0.0)
+                raise
+            if self._abandon(waiter):
+                raise ValhallaOverloaded(self.endpoint, self._retry_after())
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(priority, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active_interactive": self.active[INTERACTIVE],
+                "active_batch": self.active[BATCH],
+                "queued": sum(1 for _, _, w in self._queue if not w.cancelled),
+                "rejected": self.rejected,
+            }
+
+
+class ValhallaScheduler:
+    def __init__(self, limits: Dict[str, int] = LANE_LIMITS):
+        self._lanes = {endpoint: _Lane(endpoint, limit) for endpoint, limit in limits.items()}
+        self._default = _Lane("other", max(limits.values()) if limits else 2)
+
+    def lane(self, endpoint: str) -> _Lane:
+        return self._lanes.get(endpoint, self._default)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {endpoint: lane.stats() for endpoint, lane in self._lanes.items()}
+
+
+valhalla_scheduler = ValhallaScheduler()
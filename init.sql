@@ -5,6 +5,9 @@ CREATE EXTENSION IF NOT EXISTS pg_trgm;
 DROP TABLE IF EXISTS route_waypoints CASCADE;
 DROP TABLE IF EXISTS waypoints CASCADE;
 DROP TABLE IF EXISTS auth_mapping_temp CASCADE;
+DROP TABLE IF EXISTS tag_popularity CASCADE;
+DROP TABLE IF EXISTS auto_tag_batch_progress CASCADE;
+DROP TABLE IF EXISTS route_embeddings CASCADE;
 DROP TABLE IF EXISTS route_tags CASCADE;
 DROP TABLE IF EXISTS tags CASCADE;
 DROP TABLE IF EXISTS route_segments CASCADE;
@@ -95,6 +98,31 @@ CREATE INDEX idx_routes_summary_path ON routes USING GIST (summary_path);
 CREATE INDEX idx_routes_title_trgm ON routes USING GIN (title gin_trgm_ops);
 CREATE INDEX idx_routes_desc_trgm ON routes USING GIN (description gin_trgm_ops);
 
+-- 자연어 코스 검색 (GET /api/routes/search). 제목/설명/태그/코스 성격 문서를 MRL 768차원으로 임베딩
+-- 백엔드가 코스 저장 후 백그라운드로 갱신, source_hash가 같으면 재임베딩 생략
+CREATE TABLE route_embeddings (
+    route_id BIGINT PRIMARY KEY REFERENCES routes(id) ON DELETE CASCADE,
+    embedding halfvec(768) NOT NULL,
+    source_hash CHAR(40) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_route_embeddings_hnsw ON route_embeddings
+    USING hnsw (embedding halfvec_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+-- 자동 태그/설명 배치 실행 체크포인트 (backend/app/services/auto_tag_batch.py)
+-- status: generated(생성만 됨) / written(반영 완료) / error. 같은 job 재실행 시 written은 건너뜀
+CREATE TABLE auto_tag_batch_progress (
+    job VARCHAR(100) NOT NULL,
+    route_id BIGINT NOT NULL REFERENCES routes(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL,
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (job, route_id)
+);
+
 CREATE TABLE route_stats (
     route_id BIGINT PRIMARY KEY,
     view_count INTEGER DEFAULT 0 NOT NULL,
@@ -139,6 +167,8 @@ CREATE TABLE tags (
 CREATE INDEX idx_tags_embedding ON tags
     USING hnsw (embedding halfvec_cosine_ops)
     WITH (m = 16, ef_construction = 64);
+-- 태그 자동완성 LIKE '%q%' 용
+CREATE INDEX idx_tags_slug_trgm ON tags USING GIN (slug gin_trgm_ops);
 
 CREATE TABLE route_tags (
     route_id BIGINT NOT NULL,
@@ -147,6 +177,14 @@ CREATE TABLE route_tags (
 );
 CREATE INDEX idx_route_tags_tag_id ON route_tags(tag_id);
 
+-- 태그별 공개 코스 수 요약 (GET /api/routes/tags, 빈 검색어 자동완성). 저장/삭제 시 증분 갱신
+CREATE TABLE tag_popularity (
+    tag_id INTEGER PRIMARY KEY REFERENCES tags(id) ON DELETE CASCADE,
+    public_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_tag_popularity_count ON tag_popularity(public_count DESC) WHERE public_count > 0;
+
 CREATE TABLE waypoints (
     id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
     uuid UUID DEFAULT gen_random_uuid() UNIQUE NOT NULL,
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+코스 태그/설명 일괄 재생성 (backend/app/services/auto_tag_batch.py)
+
+삭제되지 않은 코스 전체(Suimi + 사용자 코스)를 auto_tag_service와 같은 프롬프트로 다시 태깅.
+진행 상황은 auto_tag_batch_progress에 체크포인트되므로 중단 후 같은 명령으로 이어서 실행.
+--dry-run 결과는 generated로 남고, 다음 일반 실행이 시작할 때 먼저 DB에 반영됨.
+처리량은 --rpm 상한(토큰 버킷)으로 고정: 265개 코스 @ 60rpm ≈ 5분.
+
+Usage:
+  python scripts/auto_tag_batch.py                          # 전체 (이어서)
+  python scripts/auto_tag_batch.py --user-id 100000000      # Suimi 코스만
+  python scripts/auto_tag_batch.py --route-ids 283 280      # 지정 코스만
+  python scripts/auto_tag_batch.py --dry-run --limit 10     # 반영 없이 결과만 (--export로 JSON 저장)
+  python scripts/auto_tag_batch.py --reset --refresh        # 처음부터, auto_tag_cache 무시
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from dotenv import load_dotenv
+load_dotenv(PROJECT_ROOT / "backend" / ".env")
+
+from app.services.auto_tag_batch import (
+    AUTO_TAG_BATCH_RPM, AUTO_TAG_BATCH_WORKERS, BatchRunner,
+    auto_tag_item, auto_tag_lookup, load_results, write_tags_and_description,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="코스 태그/설명 일괄 재생성")
+    parser.add_argument("--job", default="auto_tag", help="체크포인트 키 (다른 이름이면 별도 진행)")
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--route-ids", type=int, nargs="+", default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=AUTO_TAG_BATCH_WORKERS)
+    parser.add_argument("--rpm", type=float, default=AUTO_TAG_BATCH_RPM, help="분당 Gemini 호출 상한")
+    parser.add_argument("--reset", action="store_true", help="이 job의 체크포인트 삭제 후 처음부터")
+    parser.add_argument("--refresh", action="store_true", help="auto_tag_cache 무시하고 새로 생성")
+    parser.add_argument("--dry-run", action="store_true", help="DB 반영 없이 체크포인트만")
+    parser.add_argument("--export", type=Path, default=None, help="체크포인트 결과를 JSON으로 저장")
+    args = parser.parse_args()
+
+    conditions, params = ["TRUE"], {}
+    if args.user_id is not None:
+        conditions.append("r.user_id = %(user_id)s")
+        params["user_id"] = args.user_id
+    if args.route_ids:
+        conditions.append("r.id = ANY(%(route_ids)s)")
+        params["route_ids"] = args.route_ids
+
+    runner = BatchRunner(
+        args.job,
+        lambda item: auto_tag_item(item, use_cache=not args.refresh),
+        write_tags_and_description,
+        workers=args.workers, rpm=args.rpm, dry_run=args.dry_run,
+        lookup=None if args.refresh else auto_tag_lookup,
+    )
+    runner.install_signal_handlers()
+    counts = runner.run(" AND ".join(conditions), params, limit=args.limit, reset=args.reset)
+
+    if counts["written"]:
+        print("태그 인기도는 반영 트랜잭션에서 갱신됨. 새 태그 임베딩: scripts/data_refinement/embed_existing_tags.py, "
+              "코스 임베딩: scripts/data_refinement/embed_routes.py")
+
+    if args.export:
+        results = load_results(args.job, args.route_ids)
+        args.export.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.export, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"📄 JSON: {args.export} ({len(results)}개)")
+
+
+if __name__ == "__main__":
+    main()
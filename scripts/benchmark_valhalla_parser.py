@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Unified Parser (backend/valhalla.py) 벤치마크
+
+고정 시드로 생성한 코스 코퍼스(짧은 코스 / 50 / 150 / 600 km + 노이즈·U턴·끊김 포함 코스)에 대해
+ValhallaClient.get_standard_course 를 실행하고 측정:
+  - 단계별 wall time (gap_fill, densify, upsample, match, repair, elevation, resample, segment, other)
+    단계는 메서드 래핑으로 측정하며 중첩 호출은 제외한 exclusive time
+  - upstream 요청 수 / 요청·응답 바이트
+  - tracemalloc 피크 할당량, 프로세스 peak RSS (케이스마다 별도 프로세스)
+  - 입력/처리/출력 포인트 수, 세그먼트 수
+
+Valhalla는 기본적으로 scripts/valhalla_stub.py 합성 스텁을 프로세스 내에서 띄워 사용
+(--valhalla-url 로 실제 서버 또는 녹화본 재생 서버 지정 가능).
+
+결과는 JSON으로 저장하고 --baseline 과 비교해 threshold 이상 느려지면 exit code 1.
+
+Usage:
+  python scripts/benchmark_valhalla_parser.py                                  # 전체 코퍼스, 스텁
+  python scripts/benchmark_valhalla_parser.py --cases short,50km --repeat 5
+  python scripts/benchmark_valhalla_parser.py --save-baseline                  # 현재 결과를 baseline으로 저장
+  python scripts/benchmark_valhalla_parser.py --baseline scripts/benchmark_valhalla_parser_baseline.json --threshold 0.15
+  python scripts/benchmark_valhalla_parser.py --valhalla-url http://localhost:8002
+
+Output:
+  scripts/benchmark_valhalla_parser_results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing as mp
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+RESULTS_FILE = PROJECT_ROOT / "scripts" / "benchmark_valhalla_parser_results.json"
+BASELINE_FILE = PROJECT_ROOT / "scripts" / "benchmark_valhalla_parser_baseline.json"
+
+# name -> 생성 파라미터
+CORPUS = {
+    "short":        {"km": 5,   "seed": 1},
+    "50km":         {"km": 50,  "seed": 2},
+    "150km":        {"km": 150, "seed": 3},
+    "600km":        {"km": 600, "seed": 4},
+    "noisy_50km":   {"km": 50,  "seed": 5, "noise_m": 6.0, "uturns": 6, "gaps": 4, "spikes": 12},
+    "noisy_150km":  {"km": 150, "seed": 6, "noise_m": 8.0, "uturns": 12, "gaps": 8, "spikes": 30},
+}
+
+# 단계 이름 -> 측정할 ValhallaClient 메서드
+STAGES = {
+    "gap_fill":  ["_fill_gaps_with_routing"],
+    "densify":   ["_densify_at_turns"],
+    "upsample":  ["_upsample_points"],
+    "match":     ["_request_raw_data_no_ele"],
+    "repair":    ["_repair_segments"],
+    "elevation": ["_get_bulk_elevations"],
+    "resample":  ["_smooth_elevation", "_enrich_points_and_resample", "_filter_outliers_post_resample"],
+    "segment":   ["_generate_segments"],
+}
+
+# baseline 비교 시 이 값보다 작은 절대 차이는 무시 (타이머 노이즈)
+MIN_ABS_DIFF = {"wall_s": 0.05, "stage_s": 0.05, "peak_rss_mb": 10.0, "alloc_peak_mb": 5.0}
+
+
+# --- Corpus ---
+def make_track(km: float, seed: int, noise_m: float = 0.0, uturns: int = 0, gaps: int = 0, spikes: int = 0,
+               step_m: float = 10.0) -> List[Dict[str, float]]:
+    """디바이스 기록과 비슷한 ~10m 간격 트랙. 방향은 완만한 랜덤 워크 + 가끔 교차로 회전"""
+    rng = random.Random(seed)
+    lat, lon, heading = 37.55, 126.98, rng.uniform(0, 360)
+    m_lat = 1 / 110540.0
+    n = int(km * 1000 / step_m)
+    pts = []
+    for _ in range(n):
+        if rng.random() < 0.004: heading += rng.choice([-90, 90])
+        heading += rng.gauss(0, 3.0)
+        rad = math.radians(heading)
+        lat += step_m * math.cos(rad) * m_lat
+        lon += step_m * math.sin(rad) * m_lat / math.cos(math.radians(lat))
+        pts.append([lat, lon])
+
+    # U턴: 임의 지점에서 300m 나갔다 같은 길로 복귀
+    for _ in range(uturns):
+        i = rng.randrange(1, len(pts) - 1)
+        spur = pts[max(0, i - 30):i]
+        pts[i:i] = spur[::-1][:-1] + spur
+    # 끊김: 800m 구간 삭제 (gap fill 라우팅 유발)
+    for _ in range(gaps):
+        i = rng.randrange(100, max(101, len(pts) - 100))
+        del pts[i:i + 80]
+    # GPS 노이즈 + 스파이크
+    for p in pts:
+        if noise_m:
+            p[0] += rng.gauss(0, noise_m) * m_lat
+            p[1] += rng.gauss(0, noise_m) * m_lat
+    for _ in range(spikes):
+        p = pts[rng.randrange(len(pts))]
+        off = rng.uniform(150, 300)
+        p[0] += off * m_lat * rng.choice([-1, 1])
+    return [{"lat": round(a, 6), "lon": round(b, 6)} for a, b in pts]
+
+
+# --- Instrumentation ---
+class StageTimer:
+    """메서드를 감싸서 단계별 exclusive time / 호출 수 집계"""
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._stack: List[float] = []
+
+    def wrap(self, obj, attr: str, stage: str):
+        fn = getattr(obj, attr)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            self._stack.append(0.0)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                child = self._stack.pop()
+                self.totals[stage] += elapsed - child
+                self.calls[stage] += 1
+                if self._stack: self._stack[-1] += elapsed
+        setattr(obj, attr, wrapper)
+
+
+def instrument(client, timer: StageTimer, upstream: Dict[str, int]):
+    for stage, attrs in STAGES.items():
+        for attr in attrs:
+            timer.wrap(client, attr, stage)
+    post = client._post
+    def counted_post(endpoint, payload, max_timeout):
+        resp = post(endpoint, payload, max_timeout)
+        upstream["requests"] += 1
+        upstream[f"requests{endpoint}"] += 1
+        upstream["bytes_out"] += len(json.dumps(payload, separators=(",", ":")))
+        upstream["bytes_in"] += len(resp.content)
+        return resp
+    client._post = counted_post
+
+
+def run_case(name: str, params: Dict[str, Any], url: str, repeat: int, measure_alloc: bool, verbose: bool) -> Dict[str, Any]:
+    """자식 프로세스에서 실행. 케이스 1개를 repeat회 측정"""
+    sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+    from valhalla import ValhallaClient
+
+    track = make_track(**params)
+    out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+    walls, stage_runs, upstream, result = [], [], None, None
+    for _ in range(repeat):
+        client = ValhallaClient(url)
+        timer, counts = StageTimer(), defaultdict(int)
+        instrument(client, timer, counts)
+        started = time.perf_counter()
+        with out:
+            result = client.get_standard_course(track)
+        wall = time.perf_counter() - started
+        stages = {s: timer.totals.get(s, 0.0) for s in STAGES}
+        stages["other"] = max(0.0, wall - sum(stages.values()))
+        walls.append(wall)
+        stage_runs.append(stages)
+        upstream = dict(counts)
+        calls = dict(timer.calls)
+
+    # tracemalloc 오버헤드가 섞이지 않도록 RSS는 측정 실행 직후 기록
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    alloc_peak = None
+    if measure_alloc:
+        client = ValhallaClient(url)
+        tracemalloc.start()
+        with out:
+            client.get_standard_course(track)
+        alloc_peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+    return {
+        "params": params,
+        "points_in": len(track),
+        "points_out": result["stats"]["points_count"],
+        "segments": result["stats"]["segments_count"],
+        "distance_m": result["stats"]["distance"],
+        "degraded": len(result["meta"].get("degraded", [])),
+        "wall_s": round(statistics.median(walls), 4),
+        "wall_runs_s": [round(w, 4) for w in walls],
+        "stages_s": {s: round(statistics.median(r[s] for r in stage_runs), 4) for s in stage_runs[0]},
+        "stage_calls": calls,
+        "upstream": upstream,
+        "alloc_peak_mb": round(alloc_peak, 2) if alloc_peak is not None else None,
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+# --- Baseline comparison ---
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    def check(case, metric, new, old, min_abs):
+        if new is None or old is None or old <= 0: return
+        if new > old * (1 + threshold) and new - old > min_abs:
+            regressions.append(f"{case}.{metric}: {old} -> {new} (+{(new / old - 1) * 100:.1f}%)")
+
+    for case, cur in results["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        if not base: continue
+        check(case, "wall_s", cur["wall_s"], base["wall_s"], MIN_ABS_DIFF["wall_s"])
+        for stage, val in cur["stages_s"].items():
+            check(case, f"stages_s.{stage}", val, base["stages_s"].get(stage), MIN_ABS_DIFF["stage_s"])
+        check(case, "peak_rss_mb", cur["peak_rss_mb"], base.get("peak_rss_mb"), MIN_ABS_DIFF["peak_rss_mb"])
+        check(case, "alloc_peak_mb", cur.get("alloc_peak_mb"), base.get("alloc_peak_mb"), MIN_ABS_DIFF["alloc_peak_mb"])
+        if cur["points_out"] != base["points_out"]:
+            print(f"  note: {case} points_out changed {base['points_out']} -> {cur['points_out']}")
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unified Parser benchmark")
+    parser.add_argument("--cases", default=",".join(CORPUS), help=f"쉼표 구분 ({', '.join(CORPUS)})")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--valhalla-url", default=None, help="미지정 시 합성 스텁 서버 사용")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--stub-latency-per-point-ms", type=float, default=0.0)
+    parser.add_argument("--stub-unmatched-rate", type=float, default=0.01, help="스텁 trace의 unmatched 셀 비율 (repair 경로)")
+    parser.add_argument("--no-alloc", action="store_true", help="tracemalloc 측정 생략")
+    parser.add_argument("--output", type=Path, default=RESULTS_FILE)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--threshold", type=float, default=0.15, help="baseline 대비 허용 증가율")
+    parser.add_argument("--save-baseline", action="store_true", help=f"결과를 {BASELINE_FILE.name}에도 저장")
+    parser.add_argument("--verbose", action="store_true", help="valhalla.py 로그 출력")
+    args = parser.parse_args()
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CORPUS]
+    if unknown: parser.error(f"unknown cases: {unknown}")
+
+    server = None
+    url = args.valhalla_url
+    if not url:
+        from valhalla_stub import StubConfig, start_stub
+        server, url = start_stub(StubConfig(
+            synthesize=True, cassette_dir=PROJECT_ROOT / "scripts" / "output" / "valhalla_cassettes_none",
+            latency_ms=args.stub_latency_ms, latency_per_point_ms=args.stub_latency_per_point_ms,
+            unmatched_rate=args.stub_unmatched_rate,
+        ))
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "valhalla": args.valhalla_url or "stub (synthetic)",
+            "repeat": args.repeat,
+        },
+        "cases": {},
+    }
+
+    ctx = mp.get_context("spawn")
+    print(f"{'case':<14}{'pts in':>9}{'pts out':>9}{'wall s':>9}{'match':>8}{'repair':>8}{'elev':>8}{'resamp':>8}{'req':>6}{'RSS MB':>9}")
+    for name in cases:
+        with ctx.Pool(1) as pool:
+            r = pool.apply(run_case, (name, CORPUS[name], url, args.repeat, not args.no_alloc, args.verbose))
+        results["cases"][name] = r
+        st = r["stages_s"]
+        print(f"{name:<14}{r['points_in']:>9}{r['points_out']:>9}{r['wall_s']:>9.3f}{st['match']:>8.3f}{st['repair']:>8.3f}"
+              f"{st['elevation']:>8.3f}{st['resample']:>8.3f}{r['upstream'].get('requests', 0):>6}{r['peak_rss_mb']:>9.1f}")
+
+    if server: server.shutdown()
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"\nSaved: {args.output}")
+    if args.save_baseline:
+        BASELINE_FILE.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"Baseline saved: {BASELINE_FILE}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.threshold * 100:.0f}% vs {args.baseline.name}):")
+            for line in regressions: print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline.name} (threshold {args.threshold * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
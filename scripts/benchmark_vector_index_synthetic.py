@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+벡터 인덱스 벤치마크 v3 — 오프라인 / 결정적 (합성 임베딩)
+
+v1/v2는 Vertex AI로 실제 임베딩을 받아오므로 같은 숫자를 다시 낼 수 없음.
+여기서는 seed로 고정된 합성 임베딩을 만들어 HNSW 파라미터를 고르는 데 씀.
+
+합성 데이터 (실제 태그 임베딩 분포 흉내):
+  - 공통 방향(anisotropy) + Zipf 분포 클러스터 중심(주제) + 행별 노이즈 → 같은 주제 cos ~0.8, 다른 주제 ~0.55
+  - 차원별 분산이 앞쪽에 몰리도록 감쇠 스펙트럼 적용 → MRL처럼 앞 d차원만 잘라도 순위가 대부분 유지
+  - 1024행 블록마다 seed를 따로 써서, 작은 스케일 데이터가 큰 스케일 데이터의 앞부분과 동일 (스케일 간 비교 가능)
+  - 쿼리는 별도 seed로 같은 분포에서 생성 (데이터셋에 포함되지 않음)
+
+스윕: 스케일(227 → 100k) × 저장 타입(halfvec / vector) × MRL 차원 × HNSW m × ef_construction × ef_search
+측정: recall@k (3072 float32 완전 탐색 기준 = 실제 검색 품질)
+      index_recall@k (같은 타입/차원 완전 탐색 기준 = 인덱스 근사 손실만)
+      쿼리 latency p50/p95, 인덱스 빌드 시간/크기, 완전 탐색 latency
+
+엔진:
+  pgvector (기본) : 로컬 Postgres + pgvector (docker-compose db). 합성 데이터를 binary COPY로 적재 후 실제 HNSW 측정.
+                    Vertex AI 불필요. pgvector HNSW 레벨 배정은 난수라 빌드마다 recall이 소폭 흔들릴 수 있음
+  numpy           : DB 없이 프로세스 내 HNSW (같은 알고리즘: 레벨 샘플링 + 이웃 선택 휴리스틱).
+                    recall 경향 확인용. latency는 Python 구현 기준이라 pgvector와 직접 비교 불가, 5k 이하 권장
+
+Usage:
+  python scripts/benchmark_vector_index_synthetic.py                        # pgvector, 기본 스윕
+  python scripts/benchmark_vector_index_synthetic.py --engine numpy --scales 227,1000,5000
+  python scripts/benchmark_vector_index_synthetic.py --scales 100000 --dims 768 --types halfvec,vector \\
+      --m 16,24,32 --ef-construction 64,128 --ef-search 40,100,200 --k 10
+"""
+
+import argparse
+import heapq
+import io
+import json
+import math
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+SCRIPT_DIR = Path(__file__).parent
+
+FULL_DIM = 3072            # gemini-embedding-001
+BLOCK_ROWS = 1024          # 블록 단위 seed → 스케일 간 데이터 prefix 동일
+N_CLUSTERS = 48            # 주제 수 (태그 227개 기준 대략 20~50개 주제)
+ZIPF_S = 1.1               # 주제 크기 분포 (한강/업힐 같은 큰 주제 + 긴 꼬리)
+SPECTRUM_DECAY = 0.5       # 차원 i의 표준편차 ∝ (i+1)^-decay (MRL 앞쪽 집중)
+# 성분 가중치 (제곱합 1): 공통 방향 / 주제 / 개별 노이즈
+W_GLOBAL, W_CLUSTER, W_NOISE = math.sqrt(0.55), math.sqrt(0.25), math.sqrt(0.20)
+VECTOR_MAX_INDEX_DIM = 2000   # pgvector vector HNSW 한계 (halfvec은 4000)
+
+DEFAULT_SCALES = "227,1000,5000,20000,100000"
+DEFAULT_SCALES_NUMPY = "227,1000,5000"
+
+
+# --- 합성 데이터 ---
+def _spectrum(dim: int) -> np.ndarray:
+    return (1.0 + np.arange(dim, dtype=np.float32)) ** -SPECTRUM_DECAY
+
+
+def _directions(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    vec = rng.standard_normal((count, dim), dtype=np.float32) * _spectrum(dim)
+    return vec / np.linalg.norm(vec, axis=1, keepdims=True)
+
+
+class SyntheticEmbeddings:
+    """seed 고정 합성 임베딩 생성기 (FULL_DIM, L2 정규화)"""
+    def __init__(self, seed: int):
+        self.seed = seed
+        rng = np.random.default_rng([seed, 0])
+        self.global_dir = _directions(rng, 1, FULL_DIM)[0]
+        self.centers = _directions(rng, N_CLUSTERS, FULL_DIM)
+        weights = 1.0 / (1.0 + np.arange(N_CLUSTERS)) ** ZIPF_S
+        self.cluster_p = weights / weights.sum()
+
+    def _sample(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        clusters = rng.choice(N_CLUSTERS, size=count, p=self.cluster_p)
+        noise_scale = rng.uniform(0.6, 1.4, size=(count, 1)).astype(np.float32)  # 구체적/일반적 태그
+        vec = (W_GLOBAL * self.global_dir
+               + W_CLUSTER * self.centers[clusters]
+               + W_NOISE * noise_scale * _directions(rng, count, FULL_DIM))
+        return (vec / np.linalg.norm(vec, axis=1, keepdims=True)).astype(np.float32)
+
+    def rows(self, n: int) -> np.ndarray:
+        blocks = []
+        for b in range(math.ceil(n / BLOCK_ROWS)):
+            blocks.append(self._sample(np.random.default_rng([self.seed, 1, b]), BLOCK_ROWS))
+        return np.concatenate(blocks)[:n] if blocks else np.zeros((0, FULL_DIM), np.float32)
+
+    def queries(self, count: int) -> np.ndarray:
+        return self._sample(np.random.default_rng([self.seed, 2]), count)
+
+
+def represent(data: np.ndarray, dim: int, vtype: str) -> np.ndarray:
+    """저장 표현: MRL 축소(앞 dim개 + 재정규화) 후 halfvec이면 float16 반올림. 계산은 float32"""
+    vec = data[:, :dim]
+    vec = vec / np.linalg.norm(vec, axis=1, keepdims=True)
+    if vtype == "halfvec": vec = vec.astype(np.float16)
+    return np.ascontiguousarray(vec, dtype=np.float32)
+
+
+def exact_topk(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """cosine 완전 탐색 top-k (정규화된 벡터 → 내적 최대)"""
+    scores = queries @ data.T
+    k = min(k, data.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall(found: List[List[int]], truth: np.ndarray, k: int) -> float:
+    return float(np.mean([len(set(f[:k]) & set(t[:k].tolist())) / min(k, len(t)) for f, t in zip(found, truth)]))
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    a = np.asarray(samples) * 1000
+    return {"p50": round(float(np.percentile(a, 50)), 4), "p95": round(float(np.percentile(a, 95)), 4)}
+
+
+# --- numpy HNSW ---
+class NumpyHNSW:
+    """Malkov & Yashunin HNSW (cosine, 정규화 벡터). pgvector와 같은 파라미터 의미:
+    m = 레벨별 최대 이웃 수 (레벨 0은 2m), ef_construction = 삽입 시 후보 수, ef_search = 검색 시 후보 수"""
+    def __init__(self, data: np.ndarray, m: int, ef_construction: int, seed: int):
+        self.data = data
+        self.m, self.m0 = m, 2 * m
+        self.ef_construction = ef_construction
+        self.rng = np.random.default_rng([seed, 3, m, ef_construction])
+        self.ml = 1.0 / math.log(m)
+        self.graph: List[Dict[int, List[int]]] = []
+        self.entry: Optional[int] = None
+        for i in range(len(data)):
+            self._insert(i)
+
+    def _dist(self, q: np.ndarray, ids) -> np.ndarray:
+        return 1.0 - self.data[ids] @ q
+
+    def _search_layer(self, q: np.ndarray, entries: List[int], ef: int, level: int) -> List[tuple]:
+        layer = self.graph[level]
+        visited = set(entries)
+        dists = self._dist(q, entries)
+        candidates = [(float(d), e) for d, e in zip(dists, entries)]
+        heapq.heapify(candidates)
+        results = [(-d, e) for d, e in candidates]  # max-heap
+        heapq.heapify(results)
+        while len(results) > ef: heapq.heappop(results)
+        while candidates:
+            d, c = heapq.heappop(candidates)
+            if d > -results[0][0]: break
+            neighbors = [n for n in layer.get(c, ()) if n not in visited]
+            if not neighbors: continue
+            visited.update(neighbors)
+            for nd, n in zip(self._dist(q, neighbors).tolist(), neighbors):
+                if len(results) < ef or nd < -results[0][0]:
+                    heapq.heappush(candidates, (nd, n))
+                    heapq.heappush(results, (-nd, n))
+                    if len(results) > ef: heapq.heappop(results)
+        return sorted((-d, e) for d, e in results)
+
+    def _select(self, candidates: List[tuple], limit: int) -> List[int]:
+        """이웃 선택 휴리스틱: 이미 고른 이웃보다 후보 자신에 더 가까운 것만 (다양한 방향 유지)"""
+        selected: List[int] = []
+        for d, c in candidates:
+            if len(selected) >= limit: break
+            if not selected or d < float(np.min(self._dist(self.data[c], selected))):
+                selected.append(c)
+        return selected
+
+    def _connect(self, node: int, neighbors: List[int], level: int) -> None:
+        layer = self.graph[level]
+        layer[node] = neighbors
+        limit = self.m0 if level == 0 else self.m
+        for n in neighbors:
+            links = layer.setdefault(n, [])
+            links.append(node)
+            if len(links) > limit:
+                dists = self._dist(self.data[n], links)
+                layer[n] = self._select(sorted(zip(dists.tolist(), links)), limit)
+
+    def _insert(self, i: int) -> None:
+        level = int(-math.log(1.0 - self.rng.random()) * self.ml)
+        while len(self.graph) <= level: self.graph.append({})
+        if self.entry is None:
+            for lv in range(level + 1): self.graph[lv][i] = []
+            self.entry, self.top = i, level
+            return
+        q = self.data[i]
+        ep = [self.entry]
+        for lv in range(self.top, level, -1):
+            ep = [self._search_layer(q, ep, 1, lv)[0][1]]
+        for lv in range(min(level, self.top), -1, -1):
+            candidates = self._search_layer(q, ep, self.ef_construction, lv)
+            self._connect(i, self._select(candidates, self.m0 if lv == 0 else self.m), lv)
+            ep = [c for _, c in candidates]
+        for lv in range(self.top + 1, level + 1): self.graph[lv][i] = []
+        if level > self.top: self.entry, self.top = i, level
+
+    def search(self, q: np.ndarray, k: int, ef_search: int) -> List[int]:
+        ep = [self.entry]
+        for lv in range(self.top, 0, -1):
+            ep = [self._search_layer(q, ep, 1, lv)[0][1]]
+        return [c for _, c in self._search_layer(q, ep, max(ef_search, k), 0)[:k]]
+
+    def nbytes(self, element_size: int = 4) -> int:
+        links = sum(len(v) for layer in self.graph for v in layer.values())
+        return self.data.size * element_size + links * 4
+
+
+class NumpyEngine:
+    name = "numpy"
+
+    def __init__(self, args):
+        self.seed = args.seed
+        self.repeat = args.repeat
+        self.data = None
+
+    def load(self, data: np.ndarray, vtype: str, dim: int) -> None:
+        self.data = data
+        self.element_size = 2 if vtype == "halfvec" else 4  # 크기는 저장 타입 기준 (계산은 float32)
+
+    def build(self, m: int, ef_construction: int) -> Dict[str, float]:
+        started = time.perf_counter()
+        self.index = NumpyHNSW(self.data, m, ef_construction, self.seed)
+        return {"build_s": round(time.perf_counter() - started, 3), "index_mb": round(self.index.nbytes(self.element_size) / 2**20, 3)}
+
+    def query(self, queries: np.ndarray, k: int, ef_search: int):
+        found, samples = [], []
+        for q in queries:
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                ids = self.index.search(q, k, ef_search)
+                samples.append(time.perf_counter() - started)
+            found.append(ids)
+        return found, samples
+
+    def exact(self, queries: np.ndarray, k: int) -> List[float]:
+        samples = []
+        for q in queries:
+            started = time.perf_counter()
+            exact_topk(self.data, q[None, :], k)
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    def close(self) -> None:
+        pass
+
+
+# --- pgvector ---
+def _copy_binary(ids: np.ndarray, vectors: np.ndarray, vtype: str) -> bytes:
+    """COPY ... FROM STDIN (FORMAT binary) 페이로드: (id bigint, embedding vector/halfvec)
+    vector_recv / halfvec_recv 형식 = int16 dim, int16 unused, big-endian float32/float16 * dim"""
+    n, dim = vectors.shape
+    elem = ">f4" if vtype == "vector" else ">f2"
+    esize = np.dtype(elem).itemsize
+    row = np.dtype([
+        ("fields", ">i2"), ("id_len", ">i4"), ("id", ">i8"),
+        ("vec_len", ">i4"), ("dim", ">i2"), ("unused", ">i2"), ("vec", elem, (dim,)),
+    ])
+    rows = np.empty(n, dtype=row)
+    rows["fields"], rows["id_len"], rows["id"] = 2, 8, ids
+    rows["vec_len"], rows["dim"], rows["unused"] = 4 + dim * esize, dim, 0
+    rows["vec"] = vectors
+    return b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0) + rows.tobytes() + struct.pack(">h", -1)
+
+
+class PgvectorEngine:
+    name = "pgvector"
+    TABLE = "bench_synthetic"
+
+    def __init__(self, args):
+        import psycopg2
+        from dotenv import load_dotenv
+        load_dotenv(PROJECT_ROOT / "backend" / ".env")
+        self.conn = psycopg2.connect(
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", 5432)),
+            dbname=os.getenv("DB_NAME", "postgres"),
+            user=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD", ""),
+        )
+        self.conn.autocommit = True
+        self.repeat = args.repeat
+        with self.conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            cur.execute("SET maintenance_work_mem = %s", (args.maintenance_work_mem,))
+            cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            self.version = cur.fetchone()[0]
+
+    def load(self, data: np.ndarray, vtype: str, dim: int) -> None:
+        self.vtype, self.dim = vtype, dim
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {self.TABLE}")
+            cur.execute(f"CREATE UNLOGGED TABLE {self.TABLE} (id BIGINT PRIMARY KEY, embedding {vtype}({dim}) NOT NULL)")
+            for start in range(0, len(data), 5000):
+                chunk = data[start:start + 5000]
+                payload = _copy_binary(np.arange(start, start + len(chunk)), chunk, vtype)
+                cur.copy_expert(f"COPY {self.TABLE} (id, embedding) FROM STDIN (FORMAT binary)", io.BytesIO(payload))
+            cur.execute(f"VACUUM ANALYZE {self.TABLE}")
+
+    def build(self, m: int, ef_construction: int) -> Dict[str, float]:
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP INDEX IF EXISTS {self.TABLE}_hnsw")
+            started = time.perf_counter()
+            cur.execute(
+                f"CREATE INDEX {self.TABLE}_hnsw ON {self.TABLE} USING hnsw (embedding {self.vtype}_cosine_ops) "
+                f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+            )
+            elapsed = time.perf_counter() - started
+            cur.execute(f"SELECT pg_relation_size('{self.TABLE}_hnsw')")
+            size = cur.fetchone()[0]
+        return {"build_s": round(elapsed, 3), "index_mb": round(size / 2**20, 3)}
+
+    def _literal(self, q: np.ndarray) -> str:
+        return "[" + ",".join(map(str, q.tolist())) + "]"
+
+    def query(self, queries: np.ndarray, k: int, ef_search: int):
+        found, samples = [], []
+        sql = f"SELECT id FROM {self.TABLE} ORDER BY embedding <=> %s::{self.vtype} LIMIT {int(k)}"
+        with self.conn.cursor() as cur:
+            cur.execute("SET hnsw.ef_search = %s", (ef_search,))
+            for q in queries:
+                literal = self._literal(q)
+                for _ in range(self.repeat):
+                    started = time.perf_counter()
+                    cur.execute(sql, (literal,))
+                    rows = cur.fetchall()
+                    samples.append(time.perf_counter() - started)
+                found.append([r[0] for r in rows])
+        return found, samples
+
+    def exact(self, queries: np.ndarray, k: int) -> List[float]:
+        """인덱스 없이 순차 스캔 latency (v2의 fullscan과 같은 의미)"""
+        samples = []
+        sql = f"SELECT id FROM {self.TABLE} ORDER BY embedding <=> %s::{self.vtype} LIMIT {int(k)}"
+        with self.conn.cursor() as cur:
+            cur.execute("SET enable_indexscan = off")
+            try:
+                for q in queries:
+                    started = time.perf_counter()
+                    cur.execute(sql, (self._literal(q),))
+                    cur.fetchall()
+                    samples.append(time.perf_counter() - started)
+            finally:
+                cur.execute("RESET enable_indexscan")
+        return samples
+
+    def close(self) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {self.TABLE}")
+        self.conn.close()
+
+
+# --- 실행 ---
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _variants(types: List[str], dims: List[int]) -> List[tuple]:
+    out = []
+    for vtype in types:
+        for dim in dims:
+            if vtype == "vector" and dim > VECTOR_MAX_INDEX_DIM:
+                print(f"  skip vector({dim}): pgvector vector HNSW는 {VECTOR_MAX_INDEX_DIM}차원까지")
+                continue
+            out.append((vtype, dim))
+    return out
+
+
+def run(args) -> dict:
+    engine = PgvectorEngine(args) if args.engine == "pgvector" else NumpyEngine(args)
+    gen = SyntheticEmbeddings(args.seed)
+    scales = _ints(args.scales or (DEFAULT_SCALES if args.engine == "pgvector" else DEFAULT_SCALES_NUMPY))
+    variants = _variants(args.types.split(","), _ints(args.dims))
+    queries_full = gen.queries(args.queries)
+    started = time.perf_counter()
+    all_data = gen.rows(max(scales))
+    print(f"합성 데이터 {len(all_data)}×{FULL_DIM} 생성 ({time.perf_counter() - started:.1f}s, seed={args.seed})")
+
+    results = []
+    try:
+        for n in scales:
+            data_full = all_data[:n]
+            truth_full = exact_topk(data_full, queries_full, args.k)  # 3072 float32 완전 탐색 = 정답
+            for vtype, dim in variants:
+                data = represent(data_full, dim, vtype)
+                queries = represent(queries_full, dim, vtype)
+                truth = exact_topk(data, queries, args.k)
+                load_started = time.perf_counter()
+                engine.load(data, vtype, dim)
+                load_s = time.perf_counter() - load_started
+                exact_ms = percentiles(engine.exact(queries, args.k))
+                print(f"\n--- n={n} {vtype}({dim}) load {load_s:.1f}s, exact p50 {exact_ms['p50']:.2f}ms ---")
+                for m in _ints(args.m):
+                    for efc in _ints(args.ef_construction):
+                        built = engine.build(m, efc)
+                        for ef in _ints(args.ef_search):
+                            found, samples = engine.query(queries, args.k, ef)
+                            row = {
+                                "n": n, "type": vtype, "dim": dim, "m": m, "ef_construction": efc, "ef_search": ef,
+                                **built,
+                                "recall": round(recall(found, truth_full, args.k), 4),
+                                "index_recall": round(recall(found, truth, args.k), 4),
+                                "latency_ms": percentiles(samples),
+                                "exact_ms": exact_ms,
+                            }
+                            results.append(row)
+                            print(f"  m={m:<3d} efc={efc:<4d} ef={ef:<4d} build {built['build_s']:>7.2f}s "
+                                  f"{built['index_mb']:>8.2f}MB  recall@{args.k} {row['recall']:.3f} "
+                                  f"(index {row['index_recall']:.3f})  p50 {row['latency_ms']['p50']:.2f}ms "
+                                  f"p95 {row['latency_ms']['p95']:.2f}ms")
+    finally:
+        engine.close()
+
+    return {
+        "config": {
+            "engine": args.engine, "seed": args.seed, "k": args.k, "queries": args.queries, "repeat": args.repeat,
+            "full_dim": FULL_DIM, "clusters": N_CLUSTERS, "zipf_s": ZIPF_S, "spectrum_decay": SPECTRUM_DECAY,
+            "pgvector": getattr(engine, "version", None),
+        },
+        "results": results,
+    }
+
+
+def summarize(report: dict, target: float) -> None:
+    """스케일별로 목표 recall을 넘는 설정 중 p50이 가장 낮은 것"""
+    k = report["config"]["k"]
+    print("\n" + "=" * 96)
+    print(f"recall@{k} >= {target} 중 p50 최소 설정")
+    print(f"{'n':>7s} | {'type(dim)':>14s} | {'m':>3s} {'efc':>4s} {'ef':>4s} | {'recall':>6s} | {'p50':>8s} | {'p95':>8s} | {'index':>9s} | {'build':>8s}")
+    print("-" * 96)
+    for n in sorted({r["n"] for r in report["results"]}):
+        rows = [r for r in report["results"] if r["n"] == n]
+        ok = [r for r in rows if r["recall"] >= target]
+        if not ok:
+            best = max(rows, key=lambda r: r["recall"])
+            print(f"{n:>7d} | 목표 미달 (최고 recall {best['recall']:.3f}: {best['type']}({best['dim']}) m={best['m']} efc={best['ef_construction']} ef={best['ef_search']})")
+            continue
+        r = min(ok, key=lambda r: (r["latency_ms"]["p50"], r["index_mb"]))
+        print(f"{n:>7d} | {r['type'] + '(' + str(r['dim']) + ')':>14s} | {r['m']:>3d} {r['ef_construction']:>4d} {r['ef_search']:>4d} | "
+              f"{r['recall']:>6.3f} | {r['latency_ms']['p50']:>6.2f}ms | {r['latency_ms']['p95']:>6.2f}ms | "
+              f"{r['index_mb']:>7.2f}MB | {r['build_s']:>7.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline deterministic HNSW benchmark with synthetic embeddings")
+    parser.add_argument("--engine", choices=("pgvector", "numpy"), default="pgvector")
+    parser.add_argument("--scales", default=None, help=f"콤마 구분 행 수 (기본 pgvector {DEFAULT_SCALES}, numpy {DEFAULT_SCALES_NUMPY})")
+    parser.add_argument("--types", default="halfvec,vector", help="halfvec,vector")
+    parser.add_argument("--dims", default="768,1536,3072", help="MRL 차원 (vector는 2000 이하만)")
+    parser.add_argument("--m", default="16,32")
+    parser.add_argument("--ef-construction", default="64,128")
+    parser.add_argument("--ef-search", default="40,100,200")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5, help="쿼리당 반복 (latency 측정)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="pgvector 인덱스 빌드용")
+    parser.add_argument("--output", default=str(SCRIPT_DIR / "benchmark_vector_synthetic_results.json"))
+    args = parser.parse_args()
+
+    print(f"=== 벡터 인덱스 벤치마크 (synthetic, engine={args.engine}) ===")
+    report = run(args)
+    summarize(report, args.target_recall)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n→ JSON 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
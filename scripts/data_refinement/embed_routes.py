@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Backfill route_embeddings (자연어 코스 검색용 MRL 768차원 임베딩).
+
+기본: 임베딩이 없거나 마지막 임베딩 이후 수정된 코스만.
+--all: 삭제되지 않은 전체 코스를 다시 확인 (문서 해시가 같으면 API 호출 없이 건너뜀).
+문서 구성/차원(ROUTE_EMBEDDING_DIM)을 바꾼 뒤에는 --all로 돌리면 바뀐 코스만 재임베딩됨.
+
+Usage:
+    python scripts/data_refinement/embed_routes.py
+    python scripts/data_refinement/embed_routes.py --limit 20
+    python scripts/data_refinement/embed_routes.py --all
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add backend to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', 'backend', '.env'))
+
+from app.core.database import get_db_conn
+from app.services.route_embedding_service import ROUTE_EMBED_BATCH, embed_routes, stale_route_ids
+
+
+def all_route_ids(limit=None) -> list[int]:
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM routes WHERE status != 'DELETED' ORDER BY id LIMIT %s", (limit,))
+            return [row["id"] for row in cur.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill route embeddings")
+    parser.add_argument("--all", action="store_true", help="전체 코스 확인 (해시가 같으면 생략)")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    route_ids = all_route_ids(args.limit) if args.all else stale_route_ids(args.limit)
+    print(f"Found {len(route_ids)} routes to check")
+
+    totals = {"embedded": 0, "unchanged": 0, "error": 0}
+    chunk = ROUTE_EMBED_BATCH * 4
+    started = time.time()
+    for i in range(0, len(route_ids), chunk):
+        counts = embed_routes(route_ids[i:i + chunk])
+        for key, value in counts.items():
+            totals[key] += value
+        print(f"  [{min(i + chunk, len(route_ids))}/{len(route_ids)}] {counts}")
+        if counts["error"]: time.sleep(1)  # Rate limit backoff
+
+    print(f"\nDone in {time.time() - started:.1f}s: {totals}")
+
+
+if __name__ == "__main__":
+    main()
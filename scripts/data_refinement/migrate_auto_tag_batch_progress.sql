@@ -0,0 +1,14 @@
+-- 자동 태그/설명 배치 실행 체크포인트 (backend/app/services/auto_tag_batch.py, scripts/auto_tag_batch.py)
+-- 스크립트마다 쓰던 진행 파일(scripts/output/*_progress.jsonl, refinement_candidates.json)을 대체.
+-- status: generated(생성만 됨, dry-run/반영 실패) / written(반영 완료) / error(attempts < 3이면 재시도)
+
+CREATE TABLE IF NOT EXISTS auto_tag_batch_progress (
+    job VARCHAR(100) NOT NULL,
+    route_id BIGINT NOT NULL REFERENCES routes(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL,
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (job, route_id)
+);
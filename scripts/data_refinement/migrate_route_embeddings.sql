@@ -0,0 +1,18 @@
+-- 코스 임베딩 테이블 (GET /api/routes/search 하이브리드 검색)
+-- gemini-embedding-001을 MRL로 768차원 축소 → halfvec(768) + HNSW (cosine)
+-- 생성 후 python scripts/data_refinement/embed_routes.py 로 기존 코스 백필
+
+CREATE TABLE IF NOT EXISTS route_embeddings (
+    route_id BIGINT PRIMARY KEY REFERENCES routes(id) ON DELETE CASCADE,
+    embedding halfvec(768) NOT NULL,
+    source_hash CHAR(40) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_route_embeddings_hnsw ON route_embeddings
+    USING hnsw (embedding halfvec_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+-- 텍스트 쪽 후보 (init.sql에 이미 있으면 생략됨)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_routes_title_trgm ON routes USING GIN (title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_routes_desc_trgm ON routes USING GIN (description gin_trgm_ops);
@@ -0,0 +1,21 @@
+-- 태그 인기도 요약 테이블 (GET /api/routes/tags, /tags/search 빈 검색어)
+-- 요청마다 tags × route_tags × routes(PUBLIC) GROUP BY 하던 것을 이 테이블 조회로 대체.
+-- 코스 저장/삭제 시 백엔드가 증분 갱신하고, 스크립트로 routes/route_tags를 직접 바꾼 뒤에는
+-- scripts/refresh_tag_popularity.py 로 전체 재계산.
+
+CREATE TABLE IF NOT EXISTS tag_popularity (
+    tag_id INTEGER PRIMARY KEY REFERENCES tags(id) ON DELETE CASCADE,
+    public_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_tag_popularity_count ON tag_popularity(public_count DESC) WHERE public_count > 0;
+
+-- 초기 적재
+INSERT INTO tag_popularity (tag_id, public_count, updated_at)
+SELECT t.id, COUNT(r.id), CURRENT_TIMESTAMP
+FROM tags t
+LEFT JOIN route_tags rt ON rt.tag_id = t.id
+LEFT JOIN routes r ON r.id = rt.route_id AND r.status = 'PUBLIC'
+GROUP BY t.id
+ON CONFLICT (tag_id) DO UPDATE
+    SET public_count = EXCLUDED.public_count, updated_at = EXCLUDED.updated_at;
@@ -0,0 +1,8 @@
+-- 태그 자동완성(/api/routes/tags/search)의 slug LIKE '%q%' 검색용 트라이그램 인덱스
+-- B-Tree(UNIQUE slug)는 앞부분 일치만 가능하므로 부분 일치는 GIN(gin_trgm_ops) 필요
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 운영 중 테이블 잠금 없이 생성 (트랜잭션 밖에서 실행)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tags_slug_trgm ON tags
+    USING GIN (slug gin_trgm_ops);
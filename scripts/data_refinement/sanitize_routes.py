@@ -1,32 +1,31 @@
 import os
+import sys
 import json
-import time
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import google.generativeai as genai
+from google import genai
+from google.genai import types
 from dotenv import load_dotenv
 
+# Add backend to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+
 # Load environment variables
 load_dotenv("backend/.env")
 
+from app.services.auto_tag_batch import BatchRunner, load_results
+
 # Gemini Configuration
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
 # Using the latest flash preview as requested
-model = genai.GenerativeModel("gemini-3-flash-preview")
-
-def get_db_connection():
-    return psycopg2.connect(
-        host=os.environ.get("DB_HOST"),
-        port=os.environ.get("DB_PORT"),
-        user=os.environ.get("DB_USER"),
-        password=os.environ.get("DB_PASSWORD"),
-        dbname=os.environ.get("DB_NAME")
-    )
+MODEL = "gemini-3-flash-preview"
+
+# analyze 결과 체크포인트 (auto_tag_batch_progress). 중단 후 다시 실행하면 이어서 진행
+JOB = "sanitize_routes"
+RESULT_PATH = "scripts/data_refinement/refinement_candidates.json"
 
 def sanitize_content(title, description):
     prompt = f"""
-당신은 사이클링 코스 데이터 정제 전문가입니다. 
-다음은 블로그나 커뮤니티에서 수집된 코스 데이터입니다. 
+당신은 사이클링 코스 데이터 정제 전문가입니다.
+다음은 블로그나 커뮤니티에서 수집된 코스 데이터입니다.
 저작권 문제나 개인정보 노출을 방지하기 위해 다음 규칙에 따라 텍스트를 정제해 주세요.
 
 규칙:
@@ -47,90 +46,68 @@ def sanitize_content(title, description):
   "new_description": "정제된 설명"
 }}
 """
-    try:
-        response = model.generate_content(prompt)
-        content = response.text.strip()
-        # Extract JSON from potential markdown blocks
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-        
-        return json.loads(content)
-    except Exception as e:
-        print(f"AI refinement error: {e}")
-        return None
+    # 실패 시 예외 → BatchRunner가 백오프 후 재시도, 끝내 실패하면 error로 기록
+    response = client.models.generate_content(
+        model=MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(response_mime_type="application/json"),
+    )
+    refined = json.loads(response.text)
+    if not refined.get("new_title"):
+        raise ValueError("empty refinement result")
+    return refined
+
+def refine_route(item):
+    refined = sanitize_content(item['title'], item['description'] or "")
+    return {
+        "id": item['id'],
+        "old_title": item['title'],
+        "new_title": refined['new_title'],
+        "old_description": item['description'],
+        "new_description": refined['new_description']
+    }
 
 def analyze_all():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    print("Reading data from DB...")
-    cur.execute("SELECT id, title, description FROM routes ORDER BY id")
-    routes = cur.fetchall()
-    
-    candidates = []
-    print(f"Analyzing {len(routes)} routes.")
-    
-    # Create the result file if it doesn't exist to store partial results
-    result_path = "scripts/data_refinement/refinement_candidates.json"
-    
-    for i, route in enumerate(routes):
-        print(f"[{i+1}/{len(routes)}] Analyzing: {route['title']}")
-        
-        # AI Refinement request
-        refined = sanitize_content(route['title'], route['description'] or "")
-        
-        if refined:
-            candidates.append({
-                "id": route['id'],
-                "old_title": route['title'],
-                "new_title": refined['new_title'],
-                "old_description": route['description'],
-                "new_description": refined['new_description']
-            })
-        
-        # Save every 10 items or at the end to prevent data loss
-        if (i + 1) % 10 == 0 or (i + 1) == len(routes):
-            with open(result_path, "w", encoding="utf-8") as f:
-                json.dump(candidates, f, ensure_ascii=False, indent=2)
-        
-        time.sleep(0.5) # Reduced sleep for flash model
-        
-    print(f"Analysis complete! Check {result_path}")
-    cur.close()
-    conn.close()
+    # 정제 결과는 검토 후 generate-sql로 적용하므로 DB에는 반영하지 않음 (체크포인트만)
+    runner = BatchRunner(JOB, refine_route, workers=4, rpm=60, with_pois=False, require_data=False)
+    runner.install_signal_handlers()
+    runner.run()
+
+    candidates = [row["result"] for row in load_results(JOB).values() if row["result"]]
+    with open(RESULT_PATH, "w", encoding="utf-8") as f:
+        json.dump(candidates, f, ensure_ascii=False, indent=2)
+
+    print(f"Analysis complete! Check {RESULT_PATH}")
 
 def generate_sql():
-    input_path = "scripts/data_refinement/refinement_candidates.json"
+    input_path = RESULT_PATH
     output_path = "scripts/data_refinement/update_routes.sql"
-    
+
     if not os.path.exists(input_path):
         print(f"Error: {input_path} not found. Run 'analyze' first.")
         return
 
     with open(input_path, "r", encoding="utf-8") as f:
         candidates = json.load(f)
-        
+
     sql_lines = ["BEGIN;"]
-    
+
     for c in candidates:
         # Basic escaping for SQL
         new_title = c['new_title'].replace("'", "''")
         new_desc = c['new_description'].replace("'", "''")
-        
+
         sql = f"UPDATE routes SET title = '{new_title}', description = '{new_desc}', updated_at = CURRENT_TIMESTAMP WHERE id = {c['id']};"
         sql_lines.append(sql)
-        
+
     sql_lines.append("COMMIT;")
-    
+
     with open(output_path, "w", encoding="utf-8") as f:
         f.write("\n".join(sql_lines))
-        
+
     print(f"SQL file generated: {output_path}")
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) < 2:
         print("Usage: python sanitize_routes.py [analyze|generate-sql]")
     elif sys.argv[1] == "analyze":
@@ -4,7 +4,7 @@ Production Deployment  [Step 2/2: 운영 배포]
 =============================================
 import_suimi_routes.py 실행 후 생성된 파일들을 운영 환경에 배포.
 
-  Step 1 (GCS): backend/storage/routes/*.json + thumbnails/*.png → GCS 업로드
+  Step 1 (GCS): backend/storage/routes/*.json + thumbnails/*.{png,webp} → GCS 업로드
   Step 2 (DB) : scripts/output/import_suimi_*.sql → 운영 VM docker exec psql 실행
 
 == 전제 조건 ==
@@ -52,7 +52,7 @@ DOCKER_CONTAINER    = "postgres"
 
 def upload_to_gcs(gcs_bucket: str, gcs_prefix: str = "routes") -> None:
     """
-    backend/storage/routes/*.json + backend/storage/thumbnails/*.png 을 GCS에 병렬 업로드.
+    backend/storage/routes/*.json + backend/storage/thumbnails/*.{png,webp} 을 GCS에 병렬 업로드.
     gsutil -m cp (병렬) 사용.
     """
     json_files = list(LOCAL_JSON_DIR.glob("*.json"))
@@ -73,18 +73,21 @@ def upload_to_gcs(gcs_bucket: str, gcs_prefix: str = "routes") -> None:
         sys.exit(1)
     print(f"routes 업로드 완료: {gcs_routes_dest}")
 
-    # thumbnails PNG 업로드
-    thumb_files = list(LOCAL_THUMB_DIR.glob("*.png"))
+    # thumbnails 업로드 (WebP 기본, 기존 PNG 포함)
+    thumb_files = list(LOCAL_THUMB_DIR.glob("*.png")) + list(LOCAL_THUMB_DIR.glob("*.webp"))
     if thumb_files:
         gcs_thumb_dest = f"gs://{gcs_bucket}/thumbnails/"
         print(f"\nGCS 업로드 (thumbnails): {len(thumb_files)}개 파일 → {gcs_thumb_dest}")
-        result = subprocess.run(
-            f"gsutil -m cp '{LOCAL_THUMB_DIR}/*.png' {gcs_thumb_dest}",
-            shell=True, text=True,
-        )
-        if result.returncode != 0:
-            print("ERROR: thumbnails GCS 업로드 실패")
-            sys.exit(1)
+        for ext in ("png", "webp"):
+            if not any(f.suffix == f".{ext}" for f in thumb_files):
+                continue
+            result = subprocess.run(
+                f"gsutil -m -h 'Content-Type:image/{ext}' cp '{LOCAL_THUMB_DIR}/*.{ext}' {gcs_thumb_dest}",
+                shell=True, text=True,
+            )
+            if result.returncode != 0:
+                print("ERROR: thumbnails GCS 업로드 실패")
+                sys.exit(1)
         print(f"thumbnails 업로드 완료: {gcs_thumb_dest}")
     else:
         print(f"WARNING: thumbnails 없음 → {LOCAL_THUMB_DIR} (건너뜀)")
@@ -6,14 +6,27 @@ Routes imported via import_suimi_routes.py don't have thumbnails.
 This script:
   1. Queries all routes with NULL thumbnail_url
   2. Loads each route's JSON from backend/storage/routes/{uuid}.json
-  3. Generates a thumbnail using PIL
-  4. Saves to backend/storage/thumbnails/{uuid}.png
+  3. Renders thumbnails with the shared renderer (app/services/thumbnail_renderer.py)
+  4. Saves to backend/storage/thumbnails/{uuid}.webp (+ retina/share sizes)
   5. Updates routes.thumbnail_url in the DB
 
+Batch mode (--batch) streams route IDs with a server-side cursor, renders in
+a process pool sized to the machine and commits thumbnail_url updates in
+batched execute_values statements. Progress is appended after each commit,
+so an interrupted run picks up where it left off. Each mode keeps its own
+progress file (scripts/output/thumbnail_progress_{job}.jsonl, job = "missing"
+or "all" by default): a missing-only run never makes --all skip routes.
+--all re-renders every route (e.g. after a thumbnail style change) instead of
+only the NULL ones; give each style change its own --job (or --reset) so a
+finished earlier full run is not treated as done.
+
 Usage:
   python scripts/generate_missing_thumbnails.py
   python scripts/generate_missing_thumbnails.py --limit 10   # test run
   python scripts/generate_missing_thumbnails.py --dry-run    # no DB update
+  python scripts/generate_missing_thumbnails.py --batch --all            # full re-thumbnail
+  python scripts/generate_missing_thumbnails.py --batch --all --reset    # ignore previous progress
+  python scripts/generate_missing_thumbnails.py --batch --all --job style-v2   # separate progress per style change
 """
 
 from __future__ import annotations
@@ -22,8 +35,9 @@ import sys
 import os
 import json
 import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT / "backend"))
@@ -32,17 +46,17 @@ from dotenv import load_dotenv
 load_dotenv(PROJECT_ROOT / "backend" / ".env")
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 
 try:
-    from PIL import Image, ImageDraw
-    PIL_AVAILABLE = True
-except ImportError:
-    print("ERROR: Pillow not installed. pip install Pillow")
+    from app.services.thumbnail_renderer import render_thumbnails, thumbnail_filename, THUMBNAIL_FORMAT, SAVE_SIZES
+except ImportError as e:
+    print(f"ERROR: thumbnail renderer unavailable ({e}). pip install Pillow numpy")
     sys.exit(1)
 
 LOCAL_ROUTES_DIR    = PROJECT_ROOT / "backend" / "storage" / "routes"
 LOCAL_THUMBNAIL_DIR = PROJECT_ROOT / "backend" / "storage" / "thumbnails"
+PROGRESS_DIR        = PROJECT_ROOT / "scripts" / "output"
 
 DB_CONFIG = {
     "host":     os.getenv("DB_HOST", "127.0.0.1"),
@@ -73,54 +87,183 @@ def extract_latlons(data: dict) -> tuple[List[float], List[float]]:
     return [], []
 
 
-def generate_thumbnail(lats: List[float], lons: List[float], route_uuid: str) -> Optional[str]:
-    """PIL 썸네일 생성 → backend/storage/thumbnails/{uuid}.png 저장 → URL 반환."""
+def generate_thumbnail(lats: List[float], lons: List[float], route_uuid: str,
+                       eles: Optional[List[float]] = None) -> Optional[str]:
+    """공용 렌더러로 썸네일 생성 → backend/storage/thumbnails/ 저장 → 카드 URL 반환."""
     if len(lats) < 2:
         return None
     try:
-        min_lat, max_lat = min(lats), max(lats)
-        min_lon, max_lon = min(lons), max(lons)
-
-        step = max(1, len(lats) // 500)
-        s_lats = lats[::step]
-        s_lons = lons[::step]
-        if s_lats[-1] != lats[-1]:
-            s_lats.append(lats[-1])
-            s_lons.append(lons[-1])
-
-        W, H, padding = 600, 240, 40
-        img = Image.new('RGB', (W, H), color='#111827')
-        draw = ImageDraw.Draw(img)
-
-        lat_range = max(max_lat - min_lat, 0.0001)
-        lon_range = max(max_lon - min_lon, 0.0001)
-        scale = min((W - 2 * padding) / lon_range, (H - 2 * padding) / lat_range)
-        off_x = (W - lon_range * scale) / 2
-        off_y = (H - lat_range * scale) / 2
-
-        pts = [(off_x + (lon - min_lon) * scale,
-                off_y + (max_lat - lat) * scale)
-               for lat, lon in zip(s_lats, s_lons)]
-
-        draw.line(pts, fill='#2a9e92', width=5, joint='curve')
-        r = 5
-        draw.ellipse((pts[0][0]-r,  pts[0][1]-r,  pts[0][0]+r,  pts[0][1]+r),  fill='#10B981', outline='white', width=1)
-        draw.ellipse((pts[-1][0]-r, pts[-1][1]-r, pts[-1][0]+r, pts[-1][1]+r), fill='#EF4444', outline='white', width=1)
-
+        images = render_thumbnails(lats, lons, eles, sizes=SAVE_SIZES, fmt=THUMBNAIL_FORMAT)
         LOCAL_THUMBNAIL_DIR.mkdir(parents=True, exist_ok=True)
-        img.save(str(LOCAL_THUMBNAIL_DIR / f"{route_uuid}.png"), format='PNG')
-        return f"/api/thumbnails/{route_uuid}.png"
+        for size, img_bytes in images.items():
+            (LOCAL_THUMBNAIL_DIR / thumbnail_filename(route_uuid, size)).write_bytes(img_bytes)
+        return f"/api/thumbnails/{thumbnail_filename(route_uuid, 'card')}"
     except Exception as e:
         print(f"  [WARN] PIL error: {e}")
         return None
 
 
+def process_route(route_id: int, route_uuid: str, title: str) -> Tuple[str, int, Optional[str], str]:
+    """
+    route 1개 처리: JSON 로드 → 렌더 → 파일 저장.
+    Returns (status, route_id, thumb_url, message), status = 'ok' | 'skip' | 'fail'.
+    ProcessPoolExecutor 워커에서도 호출되므로 DB 접근 없음.
+    """
+    json_path = LOCAL_ROUTES_DIR / f"{route_uuid}.json"
+    if not json_path.exists():
+        return "skip", route_id, None, f"JSON not found: {json_path.name}"
+
+    try:
+        data = json.loads(json_path.read_text(encoding='utf-8'))
+    except Exception as e:
+        return "skip", route_id, None, f"JSON parse error: {e}"
+
+    lats, lons = extract_latlons(data)
+    if not lats:
+        return "skip", route_id, None, f"no coordinates found ({title[:40]})"
+
+    eles = data.get("points", {}).get("ele") if isinstance(data.get("points"), dict) else None
+    thumb_url = generate_thumbnail(lats, lons, route_uuid, eles)
+    if not thumb_url:
+        return "fail", route_id, None, f"thumbnail generation error ({title[:40]})"
+    return "ok", route_id, thumb_url, title[:50]
+
+
+def load_completed(progress_file: Path) -> set[int]:
+    completed = set()
+    if not progress_file.exists():
+        return completed
+    with open(progress_file, encoding="utf-8") as f:
+        for line in f:
+            try:
+                completed.add(json.loads(line)["route_id"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return completed
+
+
+def append_progress(route_ids: List[int], progress_file: Path):
+    with open(progress_file, "a", encoding="utf-8") as f:
+        for rid in route_ids:
+            f.write(json.dumps({"route_id": rid}) + "\n")
+
+
+def progress_file_for(job: str) -> Path:
+    """모드(job)별 진행 파일. 누락분 실행 기록이 전체 재생성(--all)을 건너뛰게 하지 않도록 분리"""
+    return PROGRESS_DIR / f"thumbnail_progress_{job}.jsonl"
+
+
+def flush_updates(write_conn, pending: List[Tuple[int, str]], dry_run: bool, progress_file: Path):
+    """thumbnail_url UPDATE를 execute_values 한 번으로 커밋하고 progress 기록."""
+    if not pending:
+        return
+    if not dry_run:
+        with write_conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                UPDATE routes AS r SET thumbnail_url = v.url
+                FROM (VALUES %s) AS v(id, url)
+                WHERE r.id = v.id
+                """,
+                pending,
+                page_size=len(pending),
+            )
+        write_conn.commit()
+    append_progress([rid for rid, _ in pending], progress_file)
+    pending.clear()
+
+
+def run_batch(args):
+    """Server-side cursor로 route를 스트리밍하며 프로세스 풀에서 렌더링."""
+    job = args.job or ("all" if args.all else "missing")
+    progress_file = progress_file_for(job)
+    progress_file.parent.mkdir(parents=True, exist_ok=True)
+    if args.reset and progress_file.exists():
+        progress_file.unlink()
+        print(f"Progress reset ({progress_file.name})")
+    completed = load_completed(progress_file)
+    if completed:
+        print(f"Resuming job '{job}': {len(completed)} routes already done")
+
+    workers = args.workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+
+    # 읽기(named cursor)와 쓰기(commit) 연결 분리: commit 시 server-side cursor가 닫히지 않도록
+    read_conn  = psycopg2.connect(**DB_CONFIG)
+    write_conn = psycopg2.connect(**DB_CONFIG)
+    read_cur = read_conn.cursor(name="thumbnail_backfill")
+    read_cur.itersize = 1000
+
+    query = "SELECT id, uuid::text, title FROM routes WHERE status != 'DELETED'"
+    if not args.all:
+        query += " AND thumbnail_url IS NULL"
+    query += " ORDER BY id"
+    if args.limit:
+        query += f" LIMIT {int(args.limit)}"
+    read_cur.execute(query)
+
+    print(f"Batch mode: {workers} workers, batch size {args.batch_size}")
+    ok = skip = fail = 0
+    pending: List[Tuple[int, str]] = []
+    in_flight = set()
+
+    def collect(done):
+        nonlocal ok, skip, fail
+        for fut in done:
+            status, route_id, thumb_url, msg = fut.result()
+            if status == "ok":
+                ok += 1
+                pending.append((route_id, thumb_url))
+            elif status == "skip":
+                skip += 1
+                print(f"  [{route_id}] SKIP — {msg}")
+            else:
+                fail += 1
+                print(f"  [{route_id}] FAIL — {msg}")
+        if len(pending) >= args.batch_size:
+            flush_updates(write_conn, pending, args.dry_run, progress_file)
+            print(f"  ... {ok} generated, {skip} skipped, {fail} failed")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for route_id, route_uuid, title in read_cur:
+                if route_id in completed:
+                    continue
+                in_flight.add(executor.submit(process_route, route_id, route_uuid, title or ""))
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+            if in_flight:
+                done, _ = wait(in_flight)
+                collect(done)
+        flush_updates(write_conn, pending, args.dry_run, progress_file)
+    finally:
+        read_cur.close()
+        read_conn.close()
+        write_conn.close()
+
+    print(f"\nDone: {ok} generated, {skip} skipped, {fail} failed")
+    if args.dry_run:
+        print("(dry-run: DB not updated)")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Backfill missing thumbnails")
     parser.add_argument("--limit",   type=int, default=0,     help="Process at most N routes (0 = all)")
     parser.add_argument("--dry-run", action="store_true",      help="Generate thumbnails but skip DB update")
+    parser.add_argument("--batch",   action="store_true",      help="Process pool + batched DB updates")
+    parser.add_argument("--all",     action="store_true",      help="Re-render every route, not only NULL thumbnail_url (batch mode)")
+    parser.add_argument("--workers", type=int, default=0,      help="Worker processes (0 = CPU count)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Routes per UPDATE commit (batch mode)")
+    parser.add_argument("--reset",   action="store_true",      help="Discard batch progress and start over")
+    parser.add_argument("--job",     default=None,             help="Progress key (default: 'all' with --all, else 'missing')")
     args = parser.parse_args()
 
+    if args.batch:
+        run_batch(args)
+        return
+
     conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
     cur  = conn.cursor()
 
@@ -134,32 +277,13 @@ def main():
     ok = skip = fail = 0
 
     for row in rows:
-        route_id   = row['id']
-        route_uuid = row['uuid']
-        title      = row['title']
-
-        json_path = LOCAL_ROUTES_DIR / f"{route_uuid}.json"
-        if not json_path.exists():
-            print(f"  [{route_id}] SKIP — JSON not found: {json_path.name}")
+        status, route_id, thumb_url, msg = process_route(row['id'], str(row['uuid']), row['title'] or "")
+        if status == "skip":
+            print(f"  [{route_id}] SKIP — {msg}")
             skip += 1
             continue
-
-        try:
-            data = json.loads(json_path.read_text(encoding='utf-8'))
-        except Exception as e:
-            print(f"  [{route_id}] SKIP — JSON parse error: {e}")
-            skip += 1
-            continue
-
-        lats, lons = extract_latlons(data)
-        if not lats:
-            print(f"  [{route_id}] SKIP — no coordinates found ({title[:40]})")
-            skip += 1
-            continue
-
-        thumb_url = generate_thumbnail(lats, lons, route_uuid)
-        if not thumb_url:
-            print(f"  [{route_id}] FAIL — thumbnail generation error ({title[:40]})")
+        if status == "fail":
+            print(f"  [{route_id}] FAIL — {msg}")
             fail += 1
             continue
 
@@ -170,7 +294,7 @@ def main():
             )
             conn.commit()
 
-        print(f"  [{route_id}] OK — {title[:50]}")
+        print(f"  [{route_id}] OK — {msg}")
         ok += 1
 
     conn.close()
@@ -49,56 +49,28 @@ sys.path.insert(0, str(PROJECT_ROOT / "backend"))
 from gpx_loader import GpxLoader, TrackPoint  # noqa: E402
 
 try:
-    from PIL import Image, ImageDraw
+    from app.services.thumbnail_renderer import (  # noqa: E402
+        render_thumbnails, thumbnail_filename, THUMBNAIL_FORMAT, SAVE_SIZES,
+    )
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
-    print("[WARN] Pillow not installed — thumbnails will be skipped. pip install Pillow")
+    print("[WARN] Pillow/numpy not installed — thumbnails will be skipped. pip install Pillow numpy")
 
 LOCAL_THUMBNAIL_DIR = PROJECT_ROOT / "backend" / "storage" / "thumbnails"
 
 
-def generate_thumbnail_local(lats: List[float], lons: List[float], route_uuid: str) -> Optional[str]:
-    """PIL로 썸네일 생성 후 backend/storage/thumbnails/{uuid}.png 에 저장. URL 반환."""
+def generate_thumbnail_local(lats: List[float], lons: List[float], route_uuid: str,
+                             eles: Optional[List[float]] = None) -> Optional[str]:
+    """공용 렌더러로 썸네일 생성 후 backend/storage/thumbnails/ 에 저장. 카드 URL 반환."""
     if not PIL_AVAILABLE or len(lats) < 2:
         return None
     try:
-        min_lat, max_lat = min(lats), max(lats)
-        min_lon, max_lon = min(lons), max(lons)
-
-        step = max(1, len(lats) // 500)
-        s_lats = lats[::step]
-        s_lons = lons[::step]
-        if s_lats[-1] != lats[-1]:
-            s_lats.append(lats[-1])
-            s_lons.append(lons[-1])
-
-        W, H, padding = 600, 240, 40
-        img = Image.new('RGB', (W, H), color='#111827')
-        draw = ImageDraw.Draw(img)
-
-        lat_range = max(max_lat - min_lat, 0.0001)
-        lon_range = max(max_lon - min_lon, 0.0001)
-        scale = min((W - 2 * padding) / lon_range, (H - 2 * padding) / lat_range)
-        off_x = (W - lon_range * scale) / 2
-        off_y = (H - lat_range * scale) / 2
-
-        pts = [(off_x + (lon - min_lon) * scale,
-                off_y + (max_lat - lat) * scale)
-               for lat, lon in zip(s_lats, s_lons)]
-
-        if len(pts) > 1:
-            draw.line(pts, fill='#2a9e92', width=5, joint='curve')
-            r = 5
-            draw.ellipse((pts[0][0]-r, pts[0][1]-r, pts[0][0]+r, pts[0][1]+r),
-                         fill='#10B981', outline='white', width=1)
-            draw.ellipse((pts[-1][0]-r, pts[-1][1]-r, pts[-1][0]+r, pts[-1][1]+r),
-                         fill='#EF4444', outline='white', width=1)
-
+        images = render_thumbnails(lats, lons, eles, sizes=SAVE_SIZES, fmt=THUMBNAIL_FORMAT)
         LOCAL_THUMBNAIL_DIR.mkdir(parents=True, exist_ok=True)
-        out_path = LOCAL_THUMBNAIL_DIR / f"{route_uuid}.png"
-        img.save(str(out_path), format='PNG')
-        return f"/api/thumbnails/{route_uuid}.png"
+        for size, img_bytes in images.items():
+            (LOCAL_THUMBNAIL_DIR / thumbnail_filename(route_uuid, size)).write_bytes(img_bytes)
+        return f"/api/thumbnails/{thumbnail_filename(route_uuid, 'card')}"
     except Exception as e:
         print(f"[WARN] Thumbnail generation failed: {e}")
         return None
@@ -21,7 +21,7 @@ sys.path.insert(0, str(PROJECT_ROOT / "backend"))
 load_dotenv(PROJECT_ROOT / "backend" / ".env")
 
 from app.core.database import get_db_conn
-from app.services.embedding_service import set_cache, query_cache
+from app.services.embedding_worker import embed_pending
 
 MODEL = "gemini-3.1-pro-preview"
 API_KEY = os.getenv("GEMINI_API_KEY")
@@ -118,27 +118,6 @@ def generate_ai_keywords_single(client, attempt_index):
 
     raise last_error
 
-def worker_embed_and_save(keyword):
-    """Worker function to embed and save to DB."""
-    if _shutdown:
-        return keyword, "SHUTDOWN"
-        
-    try:
-        if query_cache(keyword) is not None:
-            return keyword, "SKIPPED"
-
-        # Vertex AI client for embedding (backend standard)
-        client = genai.Client(vertexai=True, location="us-central1")
-        result = client.models.embed_content(
-            model="gemini-embedding-001",
-            contents=keyword,
-        )
-        embedding_values = result.embeddings[0].values
-        set_cache(keyword, embedding_values)
-        return keyword, "SUCCESS"
-    except Exception as e:
-        return keyword, f"ERROR: {e}"
-
 def load_progress():
     completed_batches = []
     if not PROGRESS_FILE.exists():
@@ -195,7 +174,8 @@ def run_ai_generation(ai_client, ai_batches, ai_workers):
 
 def main():
     parser = argparse.ArgumentParser(description="Prefill DB Embedding Cache with Gemini 3.1 Pro")
-    parser.add_argument("--workers", type=int, default=10, help="Number of concurrent workers for embedding")
+    parser.add_argument("--embed", action="store_true",
+                        help="정제된 키워드를 search_query_cache에 기록 (배치 임베딩, 동시성/속도는 EMBED_WORKER_* 환경변수)")
     parser.add_argument("--ai-workers", type=int, default=3, help="Number of concurrent workers for AI generation")
     parser.add_argument("--ai-batches", type=int, default=20, help="Number of AI batches to run (50 words each)")
     parser.add_argument("--reset", action="store_true", help="처음부터 다시 (progress 삭제)")
@@ -255,7 +235,14 @@ def main():
         print(f"💾 Refined keywords (to be embedded) saved to: {refined_out_path}")
         
         print(f"\n🎉 Extraction and Refining Complete! Total unique keywords ready for embedding: {len(to_process)}")
-        print("Stopping before DB insertion as requested.")
+        if not args.embed:
+            print("Stopping before DB insertion as requested. (--embed로 기록)")
+            return
+
+        print("\n--- [Phase 4] Batch Embedding ---")
+        # EMBED_WORKER_BATCH개씩 multi-input embed_content, 배치마다 multi-row INSERT (이미 캐시된 키워드는 건너뜀)
+        counts = embed_pending(to_process, tags=False)
+        print(f"✅ {counts['embedded']} embedded, {counts['cached']} already cached, {counts['error']} errors")
 
     finally:
         conn.close()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+tag_popularity 전체 재계산 (태그별 공개 코스 수)
+
+백엔드는 코스 저장/삭제 시 tag_popularity를 증분 갱신하지만, import_suimi_routes.py /
+sanitize_routes.py / test_auto_tag.py 처럼 routes·route_tags를 직접 바꾸는 작업은 반영되지 않음.
+그런 작업 뒤에 한 번, 또는 cron / Cloud Scheduler로 주기 실행해서 누적 오차를 바로잡음.
+값이 바뀐 행만 UPDATE 하므로 자주 돌려도 부담 없음.
+
+Usage:
+  python scripts/refresh_tag_popularity.py
+  python scripts/refresh_tag_popularity.py --interval 600   # 10분마다 반복
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from dotenv import load_dotenv
+load_dotenv(PROJECT_ROOT / "backend" / ".env")
+
+from app.services.tag_popularity import refresh_all
+
+
+def run_once() -> None:
+    started = time.perf_counter()
+    updated = refresh_all()
+    print(f"[TagPopularity] {updated} tags updated in {time.perf_counter() - started:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute tag_popularity from routes / route_tags")
+    parser.add_argument("--interval", type=float, default=0, help="반복 주기(초). 0이면 한 번만 실행")
+    args = parser.parse_args()
+
+    run_once()
+    while args.interval > 0:
+        time.sleep(args.interval)
+        try:
+            run_once()
+        except Exception as e:
+            print(f"[TagPopularity] refresh failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
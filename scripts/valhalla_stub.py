@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Valhalla record/replay 하네스 + 로컬 스텁 서버
+
+실제 Valhalla(한국 타일) 없이 ValhallaClient / 플래너를 벤치마크·회귀 테스트하기 위한 도구.
+
+모드:
+  record   실제 Valhalla 앞에 프록시로 떠서 /route, /trace_attributes, /height 응답을 카세트로 저장
+  serve    카세트를 재생하는 스텁 서버. 카세트에 없는 요청은 --synthesize 시 합성 응답 생성
+           (--synthesize 없이 카세트도 없으면 404)
+
+카세트:
+  {cassette_dir}/{endpoint}_{sha1(payload)}.json.gz
+  키는 backend/singleflight.payload_key 와 같은 정규화 JSON 해시라서 동일 payload는 항상 같은 파일
+
+합성 응답 (결정적, --seed):
+  /route             location 사이를 ~25m 간격 직선 보간, leg별 length(km)/time
+  /trace_attributes  입력 shape를 이동평균으로 스냅한 결과를 매칭 shape로 반환 (스파이크는 이탈로 보임). edge는 ~200m 격자 셀 단위로 나누고
+                     id/way_id는 셀 좌표 해시라서 청크가 달라도 같은 구간은 같은 id
+  /height            위경도 기반의 매끄러운 합성 고도
+
+장애 주입:
+  --latency-ms / --latency-per-point-ms / --jitter-ms   응답 지연 (payload 크기 비례 가능)
+  --fail-rate                                           해당 비율로 503 응답
+  --timeout-rate                                        해당 비율로 응답 없이 --hang-s 초 대기
+  --unmatched-rate                                      합성 trace에서 일부 격자 셀을 unmatched로 (repair 경로)
+
+Usage:
+  # 1) 실제 Valhalla 응답 녹화
+  python scripts/valhalla_stub.py record --upstream http://localhost:8002 --port 8012
+  VALHALLA_URL=http://localhost:8012 python test_valhalla_perf.py
+
+  # 2) 녹화본 재생 (없는 요청은 합성), 지연 50ms + 1% 실패
+  python scripts/valhalla_stub.py serve --port 8012 --synthesize --latency-ms 50 --fail-rate 0.01
+
+  # 3) 코드에서 사용 (벤치마크 등)
+  from valhalla_stub import StubConfig, start_stub
+  server, url = start_stub(StubConfig(synthesize=True))
+  client = ValhallaClient(url) ...
+  server.shutdown()
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+import httpx
+import polyline
+
+from singleflight import payload_key
+
+DEFAULT_CASSETTE_DIR = PROJECT_ROOT / "scripts" / "output" / "valhalla_cassettes"
+ENDPOINTS = ("/route", "/trace_attributes", "/height")
+
+SYNTH_ROUTE_STEP_M = 25.0
+SYNTH_CELL_DEG = 0.002          # edge 분할 격자 (~200m)
+SYNTH_SMOOTH_WINDOW = 5         # 합성 매칭 이동평균 창
+SYNTH_SPEED_KMH = 18.0
+SURFACES = [("paved_smooth", "road"), ("paved", "cycleway"), ("asphalt", "road"),
+            ("compacted", "path"), ("paved", "residential"), ("gravel", "track")]
+
+
+@dataclass
+class StubConfig:
+    cassette_dir: Path = DEFAULT_CASSETTE_DIR
+    upstream: Optional[str] = None      # 설정 시 record 모드 (프록시 + 저장)
+    synthesize: bool = False
+    latency_ms: float = 0.0
+    latency_per_point_ms: float = 0.0
+    jitter_ms: float = 0.0
+    fail_rate: float = 0.0
+    timeout_rate: float = 0.0
+    hang_s: float = 120.0
+    unmatched_rate: float = 0.0         # 합성 trace에서 unmatched 처리할 격자 셀 비율 (repair 경로 재현)
+    seed: int = 42
+    stats: Dict[str, int] = field(default_factory=lambda: {"replayed": 0, "recorded": 0, "synthesized": 0, "failed": 0, "missing": 0})
+
+
+# --- Cassette ---
+def cassette_path(cassette_dir: Path, endpoint: str, payload: Dict[str, Any]) -> Path:
+    digest = payload_key(endpoint, payload).split(":", 1)[1]
+    return Path(cassette_dir) / f"{endpoint.strip('/')}_{digest}.json.gz"
+
+
+def save_cassette(cassette_dir: Path, endpoint: str, payload: Dict[str, Any], status: int, body: bytes, elapsed: float) -> Path:
+    path = cassette_path(cassette_dir, endpoint, payload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {"endpoint": endpoint, "request": payload, "status": status,
+              "body": body.decode("utf-8"), "elapsed": round(elapsed, 4)}
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+    return path
+
+
+def load_cassette(cassette_dir: Path, endpoint: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    path = cassette_path(cassette_dir, endpoint, payload)
+    if not path.exists(): return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- Synthesizer ---
+def _haversine(lat1, lon1, lat2, lon2) -> float:
+    R = 6371000
+    dlat, dlon = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * R * math.asin(math.sqrt(a))
+
+
+def _shape_from_payload(payload: Dict[str, Any]) -> List[Tuple[float, float]]:
+    if payload.get("encoded_polyline"):
+        return polyline.decode(payload["encoded_polyline"], 6)
+    return [(p["lat"], p["lon"]) for p in payload.get("shape", [])]
+
+
+def _cell_id(lat: float, lon: float) -> int:
+    key = f"{math.floor(lat / SYNTH_CELL_DEG)}:{math.floor(lon / SYNTH_CELL_DEG)}"
+    return int(hashlib.md5(key.encode()).hexdigest()[:12], 16)
+
+
+def synth_height(lat: float, lon: float) -> float:
+    return round(80 + 60 * math.sin(lat * 120.0) + 40 * math.cos(lon * 90.0) + 10 * math.sin((lat + lon) * 700.0), 1)
+
+
+def synth_route(payload: Dict[str, Any]) -> Dict[str, Any]:
+    locs = payload.get("locations", [])
+    if len(locs) < 2:
+        return {"error_code": 150, "error": "Insufficient number of locations provided", "status_code": 400}
+    legs, total_len, total_time = [], 0.0, 0.0
+    for a, b in zip(locs, locs[1:]):
+        d = _haversine(a["lat"], a["lon"], b["lat"], b["lon"])
+        n = max(1, int(d / SYNTH_ROUTE_STEP_M))
+        pts = [(a["lat"] + (b["lat"] - a["lat"]) * k / n, a["lon"] + (b["lon"] - a["lon"]) * k / n) for k in range(n + 1)]
+        length = round(d / 1000.0, 3)
+        t = round(length / SYNTH_SPEED_KMH * 3600, 3)
+        legs.append({"shape": polyline.encode(pts, 6), "summary": {"length": length, "time": t}})
+        total_len, total_time = total_len + length, total_time + t
+    return {"trip": {"legs": legs, "summary": {"length": round(total_len, 3), "time": round(total_time, 3)}, "status": 0}}
+
+
+def _smooth_shape(shape: List[Tuple[float, float]], window: int = SYNTH_SMOOTH_WINDOW) -> List[Tuple[float, float]]:
+    """중앙 이동평균. GPS 노이즈/스파이크가 '도로'에서 떨어진 것처럼 보이게 하는 합성 매칭 결과"""
+    half, n = window // 2, len(shape)
+    out = []
+    for i in range(n):
+        lo, hi = max(0, i - half), min(n, i + half + 1)
+        out.append((sum(p[0] for p in shape[lo:hi]) / (hi - lo), sum(p[1] for p in shape[lo:hi]) / (hi - lo)))
+    return out
+
+
+def synth_trace(payload: Dict[str, Any], unmatched_rate: float = 0.0) -> Dict[str, Any]:
+    shape = _shape_from_payload(payload)
+    if not shape:
+        return {"error_code": 126, "error": "No shape provided", "status_code": 400}
+    # 입력을 이동평균으로 '스냅'한 shape를 매칭 결과로 사용 → 스파이크는 distance_from_trace_point가 커져 repair 대상이 됨
+    shape_in, shape = shape, _smooth_shape(shape)
+    edges, matched = [], []
+    start, cell = 0, _cell_id(*shape[0])
+    for i, (lat, lon) in enumerate(shape):
+        c = _cell_id(lat, lon)
+        if c != cell and i > start:
+            edges.append((start, i, cell))
+            start, cell = i, c
+        dist = _haversine(shape_in[i][0], shape_in[i][1], lat, lon)
+        # 셀 해시 기준으로 일부 구간을 unmatched 처리 (청크가 달라도 같은 구간은 항상 같은 결과)
+        kind = "unmatched" if (c % 10000) < unmatched_rate * 10000 else "matched"
+        matched.append({"type": kind, "lat": lat, "lon": lon, "edge_index": len(edges), "distance_from_trace_point": round(dist, 1)})
+    end = max(start, len(shape) - 1)
+    edges.append((start, end, cell))
+    out_edges = []
+    for s, e, c in edges:
+        surface, use = SURFACES[c % len(SURFACES)]
+        out_edges.append({"id": c, "way_id": c // 7, "use": use, "surface": surface, "density": c % 16,
+                          "begin_shape_index": s, "end_shape_index": e})
+    return {"shape": polyline.encode(shape, 6), "edges": out_edges, "matched_points": matched, "units": "kilometers"}
+
+
+def synth_height_response(payload: Dict[str, Any]) -> Dict[str, Any]:
+    shape = _shape_from_payload(payload)
+    return {"height": [synth_height(lat, lon) for lat, lon in shape]}
+
+
+SYNTHESIZERS = {"/route": synth_route, "/trace_attributes": synth_trace, "/height": synth_height_response}
+
+
+# --- Server ---
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "ValhallaStub/1.0"
+    config: StubConfig
+    rng: random.Random
+    lock: threading.Lock
+
+    def log_message(self, fmt, *args):  # 요청마다 stderr 로그 남기지 않음
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, key: str):
+        with self.lock: self.config.stats[key] += 1
+
+    def do_GET(self):
+        if self.path.startswith("/status"):
+            return self._send(200, json.dumps({"version": "stub", "stats": self.config.stats}).encode())
+        self._send(404, b'{"error": "not found"}')
+
+    def do_POST(self):
+        endpoint = self.path.split("?", 1)[0]
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            return self._send(400, b'{"error": "invalid json"}')
+        cfg = self.config
+
+        # 장애 주입 (결정적 RNG)
+        with self.lock:
+            roll_fail, roll_timeout, jitter = self.rng.random(), self.rng.random(), self.rng.uniform(-1, 1)
+        if roll_timeout < cfg.timeout_rate:
+            self._count("failed")
+            time.sleep(cfg.hang_s)
+            return self._send(504, b'{"error": "injected timeout"}')
+        n_points = len(payload.get("shape") or payload.get("locations") or [])
+        delay = (cfg.latency_ms + cfg.latency_per_point_ms * n_points + cfg.jitter_ms * jitter) / 1000.0
+        if delay > 0: time.sleep(delay)
+        if roll_fail < cfg.fail_rate:
+            self._count("failed")
+            return self._send(503, b'{"error": "injected failure"}')
+
+        if cfg.upstream:
+            started = time.monotonic()
+            try:
+                resp = httpx.post(f"{cfg.upstream}{endpoint}", content=raw, headers={"Content-Type": "application/json"}, timeout=120.0)
+            except httpx.HTTPError as e:
+                return self._send(502, json.dumps({"error": f"upstream: {e}"}).encode())
+            save_cassette(cfg.cassette_dir, endpoint, payload, resp.status_code, resp.content, time.monotonic() - started)
+            self._count("recorded")
+            return self._send(resp.status_code, resp.content)
+
+        record = load_cassette(cfg.cassette_dir, endpoint, payload)
+        if record is not None:
+            self._count("replayed")
+            return self._send(record["status"], record["body"].encode("utf-8"))
+
+        if cfg.synthesize and endpoint in SYNTHESIZERS:
+            body = synth_trace(payload, cfg.unmatched_rate) if endpoint == "/trace_attributes" else SYNTHESIZERS[endpoint](payload)
+            self._count("synthesized")
+            return self._send(body.get("status_code", 200), json.dumps(body).encode())
+
+        self._count("missing")
+        self._send(404, json.dumps({"error": "no cassette", "endpoint": endpoint}).encode())
+
+
+def make_server(config: StubConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    handler = type("BoundStubHandler", (StubHandler,), {
+        "config": config, "rng": random.Random(config.seed), "lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """백그라운드 스레드에서 스텁 서버 시작. (server, base_url) 반환, 종료는 server.shutdown()"""
+    server = make_server(config or StubConfig(synthesize=True), host, port)
+    threading.Thread(target=server.serve_forever, daemon=True, name="valhalla-stub").start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valhalla record/replay stub server")
+    parser.add_argument("mode", choices=["record", "serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8012)
+    parser.add_argument("--cassettes", type=Path, default=DEFAULT_CASSETTE_DIR, help="카세트 디렉터리")
+    parser.add_argument("--upstream", default="http://localhost:8002", help="record 모드: 실제 Valhalla URL")
+    parser.add_argument("--synthesize", action="store_true", help="serve 모드: 카세트가 없으면 합성 응답")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-per-point-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-s", type=float, default=120.0)
+    parser.add_argument("--unmatched-rate", type=float, default=0.0, help="합성 trace의 unmatched 셀 비율")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        cassette_dir=args.cassettes,
+        upstream=args.upstream if args.mode == "record" else None,
+        synthesize=args.synthesize,
+        latency_ms=args.latency_ms, latency_per_point_ms=args.latency_per_point_ms, jitter_ms=args.jitter_ms,
+        fail_rate=args.fail_rate, timeout_rate=args.timeout_rate, hang_s=args.hang_s, unmatched_rate=args.unmatched_rate, seed=args.seed,
+    )
+    server = make_server(config, args.host, args.port)
+    print(f"Valhalla stub ({args.mode}) on http://{args.host}:{args.port}  cassettes={args.cassettes}")
+    if config.upstream: print(f"  upstream: {config.upstream}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"stats: {config.stats}")
+
+
+if __name__ == "__main__":
+    main()
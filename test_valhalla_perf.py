@@ -1,8 +1,10 @@
+import os
 import requests
 import time
 import json
 
-VALHALLA_URL = "http://localhost:8002"
+# 실제 Valhalla 또는 scripts/valhalla_stub.py (record/serve) 주소
+VALHALLA_URL = os.environ.get("VALHALLA_URL", "http://localhost:8002")
 
 def run_benchmark():
     # 1. Route Request (Seoul -> Busan)
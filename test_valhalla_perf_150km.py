@@ -1,7 +1,9 @@
+import os
 import requests
 import time
 
-VALHALLA_URL = "http://localhost:8002"
+# 실제 Valhalla 또는 scripts/valhalla_stub.py (record/serve) 주소
+VALHALLA_URL = os.environ.get("VALHALLA_URL", "http://localhost:8002")
 
 def run_benchmark():
     # 1. Route Request (Seoul -> Chungju, approx 150km)